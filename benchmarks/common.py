@@ -0,0 +1,97 @@
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Callable, Dict, Iterator, List, Optional
+
+CURRENCIES = ['EUR', 'USD', 'GBP', 'CHF', 'JPY']
+ACTIVE_STATUSES = ['ON_HOLD', 'PENDING', 'ACCEPTED']
+# Weighted: nearly all old bookings end up completed or cancelled
+FINAL_STATUSES = ['COMPLETED'] * 40 + ['CANCELLED'] * 9 + ['EXPIRED', 'REJECTED']
+END_DATE = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def setup_django(database_url: Optional[str] = None) -> str:
+    # Never touch the configured database: default to a throwaway SQLite file
+    if not database_url:
+        database_url = f"sqlite:///{tempfile.mkdtemp(prefix='bookings-bench-')}/bench.sqlite3"
+    os.environ['DATABASE_URL'] = database_url
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bookingapi.settings')
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    os.environ.setdefault('EXTERNAL_API_KEY', 'benchmark')
+    os.environ.setdefault('EXTERNAL_API_URL', 'http://127.0.0.1:1')
+    os.environ.setdefault('DJANGO_LOG_LEVEL', 'WARNING')
+
+    import django
+    django.setup()
+    return database_url
+
+
+def generate_bookings(count: int, days: int = 365, seed: int = 1) -> Iterator[Dict]:
+    # Bookings spread evenly over `days`; anything older than 30 days has reached a final status
+    rnd = random.Random(seed)
+    span = days * 24 * 3600
+    for i in range(count):
+        booking_created = END_DATE - timedelta(seconds=rnd.randrange(span))
+        recent = END_DATE - booking_created < timedelta(days=30)
+        yield {
+            'id': f'bench-{i}',
+            'code': f'BENCH{i}',
+            'status': rnd.choice(ACTIVE_STATUSES if recent else FINAL_STATUSES),
+            'experience': f'Experience {rnd.randrange(200)}',
+            'rate': rnd.choice(['Adult', 'Child', 'Family', 'Private']),
+            'booking_created': booking_created,
+            'participants': rnd.randint(1, 8),
+            'original_currency': rnd.choice(CURRENCIES),
+            'price_original_currency': Decimal(rnd.randrange(1000, 500000)) / 100,
+        }
+
+
+def load_bookings(count: int, batch_size: int = 5000, **kwargs) -> None:
+    from bookings.models import Booking
+
+    batch = []
+    for data in generate_bookings(count, **kwargs):
+        booking = Booking(**data)
+        booking.set_compact_fields()
+        batch.append(booking)
+        if len(batch) >= batch_size:
+            Booking.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Booking.objects.bulk_create(batch)
+
+
+def analyze() -> None:
+    from django.db import connection
+
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def measure(fn: Callable[[], object], repeat: int = 5) -> Dict[str, float]:
+    fn()  # warm up caches
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return {
+        'median_ms': round(statistics.median(timings), 3),
+        'min_ms': round(min(timings), 3),
+        'max_ms': round(max(timings), 3),
+    }
+
+
+def percentiles(timings_ms: List[float]) -> Dict[str, float]:
+    timings_ms = sorted(timings_ms)
+    if not timings_ms:
+        return {}
+
+    def at(fraction):
+        return round(timings_ms[min(len(timings_ms) - 1, int(fraction * len(timings_ms)))], 3)
+
+    return {'p50_ms': at(0.5), 'p99_ms': at(0.99), 'max_ms': round(timings_ms[-1], 3)}
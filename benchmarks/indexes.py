@@ -0,0 +1,88 @@
+"""
+Query plans and timings of the hot Booking queries without and with the
+indexes declared on Booking (bookings/migrations/0002_booking_indexes.py).
+
+    python -m benchmarks.indexes --rows 1000000 > indexes.json
+
+Runs against a throwaway SQLite database unless --database-url is given.
+Production runs on PostgreSQL, so pass a postgres:// URL for representative
+plans: SQLite cannot match the partial index predicate against bound
+parameters and plans active_sweep through another index instead.
+"""
+import argparse
+import json
+import sys
+from datetime import timedelta
+
+from benchmarks.common import END_DATE, analyze, load_bookings, measure, setup_django
+
+
+def hot_queries():
+    from django.db.models import Q, Sum
+
+    from bookings.models import Booking, INACTIVE_STATUSES
+
+    day = END_DATE - timedelta(days=100)
+    week = (day, day + timedelta(days=7))
+    in_day = Booking.objects.filter(booking_created__gte=day, booking_created__lte=day + timedelta(days=1))
+    in_week = Booking.objects.filter(booking_created__gte=week[0], booking_created__lte=week[1])
+    cursor = Q(booking_created__lt=day) | Q(booking_created=day, id__lt='bench-0')
+
+    return {
+        'range_one_day': in_day,
+        'totals_one_week': in_week.order_by().values('original_currency').annotate(
+            total_minor=Sum('price_minor')
+        ),
+        'latest_booking': Booking.objects.order_by('-booking_created')[:1],
+        'keyset_page': Booking.objects.filter(cursor).order_by('-booking_created', '-id')[:100],
+        'active_sweep': Booking.objects.exclude(status__in=INACTIVE_STATUSES).order_by(
+            'booking_created'
+        ).values_list('id', flat=True),
+    }
+
+
+def run(repeat: int):
+    results = {}
+    for name, query in hot_queries().items():
+        results[name] = {
+            'plan': query.explain(),
+            **measure(lambda: list(query.all()), repeat),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    setup_django(args.database_url)
+    from django.core.management import call_command
+    from django.db import connection
+
+    from bookings.models import Booking
+
+    call_command('migrate', verbosity=0)
+    with connection.schema_editor() as editor:
+        for index in Booking._meta.indexes:
+            editor.remove_index(Booking, index)
+
+    print(f'Loading {args.rows} bookings...', file=sys.stderr)
+    load_bookings(args.rows)
+    analyze()
+    before = run(args.repeat)
+
+    with connection.schema_editor() as editor:
+        for index in Booking._meta.indexes:
+            editor.add_index(Booking, index)
+    analyze()
+    after = run(args.repeat)
+
+    json.dump({'rows': args.rows, 'before': before, 'after': after}, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Load test of the WSGI bookings view (/bookings/) against its native async
+twin (/async/bookings/). Start both against the same database and Redis, e.g.
+
+    gunicorn bookingapi.wsgi -w 2 --threads 8 -b 127.0.0.1:8000
+    uvicorn bookingapi.asgi:application --workers 2 --port 8001
+
+then
+
+    python -m benchmarks.load --api-key KEY \\
+        --target wsgi=http://127.0.0.1:8000/bookings/ \\
+        --target asgi=http://127.0.0.1:8001/async/bookings/ > load.json
+
+Each concurrency level keeps that many clients busy; --read-delay makes every
+client read responses slowly, in 1 KiB pieces, which is where a thread per
+request runs out first. Neither server is part of requirements.txt.
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import percentiles
+
+
+def request_once(url: str, api_key: str, read_delay: float) -> float:
+    started = time.perf_counter()
+    request = urllib.request.Request(url, headers={'X-API-KEY': api_key})
+    with urllib.request.urlopen(request, timeout=120) as response:
+        while response.read(1024):
+            if read_delay:
+                time.sleep(read_delay)
+    return (time.perf_counter() - started) * 1000
+
+
+def run(url: str, api_key: str, concurrency: int, requests: int, read_delay: float):
+    timings = []
+    errors = 0
+    lock = threading.Lock()
+
+    def worker(_):
+        nonlocal errors
+        try:
+            elapsed = request_once(url, api_key, read_delay)
+        except (urllib.error.URLError, OSError):
+            with lock:
+                errors += 1
+            return
+        with lock:
+            timings.append(elapsed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, range(requests)))
+    duration = time.perf_counter() - started
+
+    return {
+        'concurrency': concurrency,
+        'requests': requests,
+        'errors': errors,
+        'requests_per_second': round(len(timings) / duration, 1),
+        **percentiles(timings),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', action='append', required=True, help='name=url of a bookings endpoint')
+    parser.add_argument('--api-key', required=True)
+    parser.add_argument('--query', default='currency=USD&date[gt]=2024-06-01&date[lt]=2024-06-08')
+    parser.add_argument('--concurrency', default='10,50,200', help='comma separated client counts')
+    parser.add_argument('--requests', type=int, default=1000, help='requests per concurrency level')
+    parser.add_argument('--read-delay', type=float, default=0.0, help='seconds between 1 KiB reads')
+    args = parser.parse_args()
+
+    results = {}
+    for target in args.target:
+        name, url = target.split('=', 1)
+        url = f"{url}?{args.query}"
+        results[name] = []
+        for concurrency in map(int, args.concurrency.split(',')):
+            print(f'{name}: {concurrency} clients...', file=sys.stderr)
+            results[name].append(run(url, args.api_key, concurrency, args.requests, args.read_delay))
+
+    json.dump({'query': args.query, 'read_delay': args.read_delay, 'results': results}, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
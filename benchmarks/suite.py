@@ -0,0 +1,208 @@
+"""
+Reproducible benchmarks of the read path and the sync pipeline, as JSON so
+runs on different commits can be compared:
+
+    python -m benchmarks.suite --rows 100000 > results.json
+
+- read: p50/p99 latency and peak traced memory of /bookings/ (full list,
+  totalsOnly and stream=true) over date windows of several widths, with the
+  response cache disabled unless --cache is given
+- export: rows/sec and peak traced memory of /bookings/export/ over the
+  widest window, in every available file format
+- sync: rows/sec of a full sync, of a re-sync where nothing changed and of an
+  incremental sync, all against a local fake upstream API (benchmarks/upstream.py)
+
+Runs against a throwaway SQLite database unless --database-url is given.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from contextlib import ExitStack
+from datetime import timedelta
+from unittest.mock import patch
+
+from benchmarks.common import END_DATE, analyze, generate_bookings, load_bookings, percentiles, setup_django
+from benchmarks.upstream import FakeUpstream
+
+WINDOWS_DAYS = [1, 7, 30, 365]
+MODES = {
+    'full': {},
+    'totals_only': {'totalsOnly': 'true'},
+    'stream': {'stream': 'true'},
+}
+
+
+def get_response(client, params, path='/bookings/'):
+    from django.conf import settings
+
+    response = client.get(path, params, HTTP_X_API_KEY=settings.EXTERNAL_API_KEY)
+    assert response.status_code == 200, response.content
+    return response.getvalue()
+
+
+def measure_requests(client, params, repeat, path='/bookings/'):
+    get_response(client, params, path)  # warm up
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        get_response(client, params, path)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    tracemalloc.start()
+    body = get_response(client, params, path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {**percentiles(timings), 'peak_memory_kib': round(peak / 1024, 1), 'response_bytes': len(body)}
+
+
+def load(rows):
+    from bookings.rollups import rebuild_rollups
+
+    load_bookings(rows)
+    rebuild_rollups()
+    analyze()
+
+
+def bench_read(repeat):
+    from django.test import Client
+
+    client = Client()
+    results = {}
+    for days in WINDOWS_DAYS:
+        window = {
+            'currency': 'USD',
+            'date[gt]': (END_DATE - timedelta(days=days)).isoformat(),
+            'date[lt]': END_DATE.isoformat(),
+        }
+        for mode, params in MODES.items():
+            print(f'read: {days} days, {mode}...', file=sys.stderr)
+            results[f'{days}d_{mode}'] = {'days': days, 'mode': mode, **measure_requests(client, {**window, **params}, repeat)}
+    return results
+
+
+def bench_export(repeat):
+    from django.test import Client
+
+    from bookings.export import pyarrow
+
+    client = Client()
+    window = {
+        'currency': 'USD',
+        'date[gt]': (END_DATE - timedelta(days=WINDOWS_DAYS[-1])).isoformat(),
+        'date[lt]': END_DATE.isoformat(),
+    }
+    formats = ['csv', 'ndjson'] + (['parquet'] if pyarrow is not None else [])
+    count = len(get_response(client, {**window, 'fileFormat': 'ndjson'}, '/bookings/export/').splitlines())
+    results = {}
+    for file_format in formats:
+        print(f'export: {file_format}...', file=sys.stderr)
+        params = {**window, 'fileFormat': file_format}
+        timing = measure_requests(client, params, repeat, '/bookings/export/')
+        results[file_format] = {
+            'rows': count,
+            'rows_per_second': round(count / (timing['p50_ms'] / 1000), 1),
+            **timing,
+        }
+    return results
+
+
+def timed(fn):
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+def bench_sync(rows, incremental_rows, page_size):
+    from bookings.models import Booking
+    from bookings.tasks import sync_all_bookings, sync_latest_bookings
+
+    Booking.objects.all().delete()
+    # Upstream holds `rows` bookings, then `incremental_rows` newer ones show up
+    bookings = list(generate_bookings(rows + incremental_rows, seed=2))
+    bookings.sort(key=lambda booking: booking['booking_created'])
+    upstream = FakeUpstream(bookings[:rows], page_size=page_size).start()
+    try:
+        with patch('bookings.tasks.external_api_url', upstream.url):
+            full = timed(lambda: sync_all_bookings(is_sync=True))
+            unchanged = timed(lambda: sync_all_bookings(is_sync=True))
+            upstream.add(bookings[rows:])
+            incremental = timed(sync_latest_bookings)
+    finally:
+        upstream.stop()
+
+    assert Booking.objects.count() == rows + incremental_rows
+    return {
+        'page_size': page_size,
+        'full': {'rows': rows, 'seconds': round(full, 3), 'rows_per_second': round(rows / full, 1)},
+        'unchanged': {'rows': rows, 'seconds': round(unchanged, 3), 'rows_per_second': round(rows / unchanged, 1)},
+        'incremental': {
+            'rows': incremental_rows,
+            'seconds': round(incremental, 3),
+            'rows_per_second': round(incremental_rows / incremental, 1),
+        },
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100_000, help='bookings in the database for the read benchmarks')
+    parser.add_argument('--repeat', type=int, default=50, help='requests per read benchmark')
+    parser.add_argument('--sync-rows', type=int, default=20_000)
+    parser.add_argument('--incremental-rows', type=int, default=2_000)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--export-repeat', type=int, default=5, help='requests per export benchmark')
+    parser.add_argument('--only', choices=['read', 'export', 'sync'])
+    parser.add_argument('--cache', action='store_true', help='keep the configured response cache')
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    # Measure the endpoint itself: no rate limit and, by default, no Redis
+    os.environ.setdefault('API_RATE_LIMIT', '0')
+    os.environ.setdefault('ALLOWED_HOSTS', 'testserver')
+    setup_django(args.database_url)
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.test.utils import override_settings
+
+    call_command('migrate', verbosity=0)
+    results = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'database': settings.DATABASES['default']['ENGINE'],
+        'args': vars(args),
+    }
+    with ExitStack() as stack:
+        if not args.cache:
+            stack.enter_context(override_settings(
+                CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+            ))
+        if args.only in (None, 'read', 'export'):
+            load(args.rows)
+        if args.only in (None, 'read'):
+            results['read'] = bench_read(args.repeat)
+        if args.only in (None, 'export'):
+            results['export'] = bench_export(args.export_repeat)
+        if args.only in (None, 'sync'):
+            print('sync...', file=sys.stderr)
+            results['sync'] = bench_sync(args.sync_rows, args.incremental_rows, args.page_size)
+
+    json.dump(results, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
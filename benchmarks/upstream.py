@@ -0,0 +1,94 @@
+"""
+Local stand-in for the upstream bookings API, serving synthetic bookings in
+its format: paginated lists with `count`/`next`/`results`, `bookingCreated[gt]`
+filtering and single bookings at /<id>.
+"""
+import json
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List
+from urllib.parse import parse_qs, urlparse
+
+
+def to_upstream(booking: Dict) -> Dict:
+    # generate_bookings() rows in the upstream shape; upstream sends naive UTC timestamps
+    return {
+        'id': booking['id'],
+        'bookingCode': booking['code'],
+        'bookingStatus': booking['status'],
+        'experience': {'name': booking['experience']},
+        'rateName': booking['rate'],
+        'bookingCreated': booking['booking_created'].astimezone(timezone.utc).replace(tzinfo=None).isoformat(),
+        'ratesQuantity': [{'quantity': booking['participants']}],
+        'price': {'finalRetailPrice': {
+            'currency': booking['original_currency'],
+            'amount': float(booking['price_original_currency']),
+        }},
+    }
+
+
+class UpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+        booking_id = url.path.strip('/')
+        if booking_id:
+            booking = self.server.upstream.by_id.get(booking_id)
+            return self._send(200 if booking else 404, booking or {'detail': 'Not found'})
+        self._send(200, self.server.upstream.page(query))
+
+    def _send(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeUpstream:
+    def __init__(self, bookings: Iterable[Dict] = (), page_size: int = 100):
+        self.page_size = page_size
+        self.bookings: List[Dict] = []
+        self.by_id: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self.add(bookings)
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), UpstreamHandler)
+        self.server.upstream = self
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+
+    def add(self, bookings: Iterable[Dict]) -> None:
+        with self._lock:
+            for booking in bookings:
+                booking = to_upstream(booking)
+                self.by_id[booking['id']] = booking
+                self.bookings.append(booking)
+            self.bookings.sort(key=lambda booking: booking['bookingCreated'])
+
+    def page(self, query: Dict[str, str]) -> Dict:
+        bookings = self.bookings
+        if query.get('bookingCreated[gt]'):
+            since = datetime.fromisoformat(query['bookingCreated[gt]'])
+            if since.tzinfo:
+                since = since.astimezone(timezone.utc).replace(tzinfo=None)
+            bookings = [booking for booking in bookings if booking['bookingCreated'] > since.isoformat()]
+
+        page = int(query.get('page', 1))
+        page_size = int(query.get('pageSize', self.page_size))
+        results = bookings[(page - 1) * page_size:page * page_size]
+        has_next = page * page_size < len(bookings)
+        return {'count': len(bookings), 'next': f'?page={page + 1}' if has_next else None, 'results': results}
+
+    def start(self) -> 'FakeUpstream':
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
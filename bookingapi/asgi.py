@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bookingapi.settings')
 
 application = get_asgi_application()
+
+# Load the exchange rate table while the worker boots rather than on its first request
+from bookings.rates import get_rate_table  # noqa: E402
+
+get_rate_table()
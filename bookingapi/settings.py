@@ -95,14 +95,27 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Metrics: each web and worker process shares its counters through the cache at most every
+# METRICS_PUBLISH_INTERVAL seconds; processes silent for METRICS_TTL seconds drop out of /metrics/
+METRICS_PUBLISH_INTERVAL = env.int('METRICS_PUBLISH_INTERVAL', default=15)
+METRICS_TTL = env.int('METRICS_TTL', default=10 * 60)
+# /metrics/ answers scrapers sending `Authorization: Bearer METRICS_TOKEN`, or connecting from
+# one of METRICS_ALLOWED_IPS, and nobody else
+METRICS_TOKEN = env('METRICS_TOKEN', default=None)
+METRICS_ALLOWED_IPS = env.list('METRICS_ALLOWED_IPS', default=['127.0.0.1', '::1'])
+
+# Application log; by default in the project directory, whichever directory the process starts in
+LOG_FILE = env('LOG_FILE', default=os.path.join(BASE_DIR, 'general.log'))
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
     "handlers": {
         "console": {"class": "logging.StreamHandler"},
+        # Written by a background thread so logging never blocks a request on disk I/O
         "file": {
-            "class": "logging.FileHandler",
-            "filename": "general.log",
+            "class": "bookings.log.BackgroundFileHandler",
+            "filename": LOG_FILE,
             "formatter": "verbose",
         },
     },
@@ -120,6 +133,80 @@ LOGGING = {
     },
 }
 
+# Response cache; configure Redis with maxmemory-policy allkeys-lru so stale entries are evicted first
+CACHES = {
+    'default': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': env('CACHE_URL', default='redis://localhost:6379/1'),
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            'SOCKET_CONNECT_TIMEOUT': 1,
+            'SOCKET_TIMEOUT': 1,
+            # Serve from the database if Redis is unavailable
+            'IGNORE_EXCEPTIONS': True,
+        },
+    }
+}
+BOOKINGS_CACHE_TTL = env.int('BOOKINGS_CACHE_TTL', default=300)
+
+# Client API keys are cached in-process for this many seconds (so revoking one takes up to as long)
+API_KEY_CACHE_TTL = env.int('API_KEY_CACHE_TTL', default=60)
+API_KEY_CACHE_SIZE = env.int('API_KEY_CACHE_SIZE', default=10000)
+# Unknown keys get their own, smaller cache so random keys cannot evict the known ones
+API_KEY_UNKNOWN_CACHE_SIZE = env.int('API_KEY_UNKNOWN_CACHE_SIZE', default=1000)
+# Parsed /bookings/ query parameters (valid or not) kept per process, least recently used evicted first
+REQUEST_CACHE_SIZE = env.int('REQUEST_CACHE_SIZE', default=1024)
+# /bookings/ rate limit in cost units per minute per API key (0 disables). A request costs one unit
+# plus one per API_RATE_LIMIT_COST_DAYS days of date window, up to API_RATE_LIMIT_MAX_COST
+API_RATE_LIMIT = env.int('API_RATE_LIMIT', default=120)
+API_RATE_LIMIT_COST_DAYS = env.int('API_RATE_LIMIT_COST_DAYS', default=30)
+API_RATE_LIMIT_MAX_COST = env.int('API_RATE_LIMIT_MAX_COST', default=20)
+
+# /bookings/ keyset pagination and streaming
+BOOKINGS_DEFAULT_PAGE_SIZE = env.int('BOOKINGS_DEFAULT_PAGE_SIZE', default=100)
+BOOKINGS_MAX_PAGE_SIZE = env.int('BOOKINGS_MAX_PAGE_SIZE', default=1000)
+BOOKINGS_STREAM_CHUNK_SIZE = env.int('BOOKINGS_STREAM_CHUNK_SIZE', default=2000)
+# Encode /bookings/ responses with orjson when it is installed (same bytes as DRF's renderer)
+BOOKINGS_FAST_JSON = env.bool('BOOKINGS_FAST_JSON', default=True)
+# Answer totals from BookingDailyRollup (kept up to date by the sync) plus the partial days at
+# either end of the window; run `manage.py rebuild_rollups` after turning this on
+BOOKINGS_DAILY_ROLLUPS = env.bool('BOOKINGS_DAILY_ROLLUPS', default=True)
+
+# Upstream bookings API client
+EXTERNAL_API_TIMEOUT = env.float('EXTERNAL_API_TIMEOUT', default=30.0)
+EXTERNAL_API_POOL_SIZE = env.int('EXTERNAL_API_POOL_SIZE', default=10)
+# Requests per second (and burst) allowed towards upstream, shared by all workers through Redis
+UPSTREAM_RATE_LIMIT = env.float('UPSTREAM_RATE_LIMIT', default=10.0)
+UPSTREAM_RATE_BURST = env.int('UPSTREAM_RATE_BURST', default=20)
+UPSTREAM_MAX_RETRIES = env.int('UPSTREAM_MAX_RETRIES', default=5)
+# Celery page fan-out: at most SYNC_MAX_PARALLELISM pages per wave, fewer when upstream latency
+# exceeds SYNC_TARGET_LATENCY seconds or it answered 429 within SYNC_THROTTLE_COOLDOWN seconds
+SYNC_MAX_PARALLELISM = env.int('SYNC_MAX_PARALLELISM', default=8)
+SYNC_TARGET_LATENCY = env.float('SYNC_TARGET_LATENCY', default=1.0)
+SYNC_THROTTLE_COOLDOWN = env.int('SYNC_THROTTLE_COOLDOWN', default=5 * 60)
+# Query parameter upstream uses for page size; page size is only adapted when this is set
+EXTERNAL_API_PAGE_SIZE_PARAM = env('EXTERNAL_API_PAGE_SIZE_PARAM', default=None)
+SYNC_MIN_PAGE_SIZE = env.int('SYNC_MIN_PAGE_SIZE', default=20)
+SYNC_MAX_PAGE_SIZE = env.int('SYNC_MAX_PAGE_SIZE', default=200)
+# Pages downloaded in parallel by the synchronous (management command) sync
+SYNC_FETCH_CONCURRENCY = env.int('SYNC_FETCH_CONCURRENCY', default=4)
+
+# update_active_bookings: bookings refreshed per bulk update, parallel upstream requests
+# and how long one chunk may take before the lock expires (it is extended before every chunk)
+ACTIVE_BOOKINGS_CHUNK_SIZE = env.int('ACTIVE_BOOKINGS_CHUNK_SIZE', default=500)
+ACTIVE_BOOKINGS_FETCH_CONCURRENCY = env.int('ACTIVE_BOOKINGS_FETCH_CONCURRENCY', default=8)
+ACTIVE_BOOKINGS_LOCK_TIMEOUT = env.int('ACTIVE_BOOKINGS_LOCK_TIMEOUT', default=15 * 60)
+
+# sync_latest_bookings re-reads this many seconds before its watermark to catch late arrivals
+INCREMENTAL_SYNC_OVERLAP = env.int('INCREMENTAL_SYNC_OVERLAP', default=15 * 60)
+# Extended before every page, so it bounds a single page rather than the whole run
+INCREMENTAL_SYNC_LOCK_TIMEOUT = env.int('INCREMENTAL_SYNC_LOCK_TIMEOUT', default=30 * 60)
+
+# ECB history file backing the exchange rate table; defaults to the one bundled with CurrencyConverter
+CURRENCY_RATES_FILE = env('CURRENCY_RATES_FILE', default=None)
+# How often (seconds) workers check the rates file for a newer version
+CURRENCY_RATES_CHECK_INTERVAL = env.int('CURRENCY_RATES_CHECK_INTERVAL', default=60)
+
 CELERY_BROKER_URL = env('CELERY_BROKER_URL', default='redis://localhost')
 CELERY_RESULT_BACKEND = env('CELERY_RESULT_BACKEND', default='redis://localhost') 
 CELERY_ACCEPT_CONTENT = ['json']
@@ -133,10 +220,11 @@ CELERY_BEAT_SCHEDULE = {
     },
     'sync_all_bookings': {
         'task': 'bookings.tasks.sync_all_bookings',
-        'schedule': 30 * 60.0,  # Run every 30 minutes
+        'schedule': 24 * 60 * 60.0,  # Daily reconciliation; sync_latest_bookings keeps up in between
     },
     'update_active_bookings': {
         'task': 'bookings.tasks.update_active_bookings',
         'schedule': 5 * 60.0,  # Run every 5 minutes
+        'options': {'expires': 5 * 60.0},  # Drop runs that are still queued when the next one is due
     },
 }
@@ -16,9 +16,13 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path
-from bookings import views
+from bookings import async_views, views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('bookings/', views.fetch),
+    path('bookings/analytics/', views.analytics),
+    path('bookings/export/', views.export),
+    path('async/bookings/', async_views.fetch),
+    path('metrics/', views.metrics),
 ]
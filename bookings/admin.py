@@ -1,3 +1,13 @@
 from django.contrib import admin
 
-# Register your models here.
+from bookings.models import APIKey
+
+
+@admin.register(APIKey)
+class APIKeyAdmin(admin.ModelAdmin):
+    # Keys are created with `manage.py create_api_key`; here they can only be renamed or revoked
+    list_display = ('name', 'is_active', 'rate_limit', 'created_at')
+    readonly_fields = ('key_hash', 'created_at')
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,139 @@
+import logging
+from decimal import Decimal
+from itertools import islice
+from typing import Any, AsyncIterator, Dict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework import exceptions, status
+from rest_framework.throttling import BaseThrottle
+
+from bookings.auth import APIKeyAuthentication
+from bookings.cache import acache_response, aget_cached_response, aget_version
+from bookings.conversion import ROW_FIELDS, convert_bookings, convert_rows, convert_totals
+from bookings.metrics import REQUEST_STAGE_SECONDS, RESPONSE_CACHE, instrument_view
+from bookings.pagination import apaginate
+from bookings.queries import filter_bookings
+from bookings.renderers import dumps
+from bookings.request import Request
+from bookings.rollups import merge_totals
+from bookings.throttling import get_throttle_delay
+from bookings.views import STREAM_ERROR, encode_chunk, encode_totals, sum_bookings, totals_queries
+
+logger = logging.getLogger(__name__)
+
+
+@instrument_view
+async def fetch(request):
+    """
+    Native async twin of views.fetch with the same parameters and JSON bodies,
+    for running under an ASGI server: waiting on the database, Redis or a slow
+    client does not hold a thread.
+    """
+    if request.method != 'GET':
+        return _json({'detail': f'Method "{request.method}" not allowed.'}, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    try:
+        _, api_key = await APIKeyAuthentication().aauthenticate(request)
+    except exceptions.AuthenticationFailed as e:
+        # DRF answers 403 because the authentication class sends no WWW-Authenticate header
+        return _json({'detail': e.detail}, status.HTTP_403_FORBIDDEN)
+
+    # The Redis client is blocking, so the throttle runs off the event loop
+    ident = BaseThrottle().get_ident(request)
+    delay = await sync_to_async(get_throttle_delay, thread_sensitive=False)(api_key, request.GET, ident)
+    if delay > 0:
+        throttled = exceptions.Throttled(delay)
+        response = _json({'detail': throttled.detail}, throttled.status_code)
+        response['Retry-After'] = str(throttled.wait)
+        return response
+
+    logger.info(f"Request: {request.GET}")
+
+    try:
+        with REQUEST_STAGE_SECONDS.time(stage='parse'):
+            req = Request.from_params(request.GET)
+    except ValueError as e:
+        logger.warning(f"Invalid request parameters: {str(e)}")
+        return _json({'error': str(e)}, status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.error(f"Unexpected error processing request: {str(e)}", exc_info=True)
+        return _json(
+            {'error': 'An unexpected error occurred while processing your request'},
+            status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+    if req.group_by:
+        return _json({'error': 'groupBy is only supported by /bookings/analytics/'}, status.HTTP_400_BAD_REQUEST)
+
+    try:
+        if req.stream:
+            return StreamingHttpResponse(astream_bookings(req), content_type='application/json')
+
+        version = await aget_version()
+        data = await aget_cached_response(req, version)
+        RESPONSE_CACHE.inc(result='miss' if data is None else 'hit')
+        if data is None:
+            data = await aget_response_data(req)
+            await acache_response(req, data, version)
+        return _json(data)
+    except Exception as e:
+        logger.error(f"Error processing bookings: {str(e)}", exc_info=True)
+        return _json(
+            {'error': 'An error occurred while processing the bookings'},
+            status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+async def aget_response_data(req: Request) -> Dict[str, Any]:
+    if req.totals_only:
+        return await aget_booking_totals(req)
+    if req.limit:
+        with REQUEST_STAGE_SECONDS.time(stage='query'):
+            bookings, next_cursor = await apaginate(filter_bookings(req), req.cursor, req.limit)
+        with REQUEST_STAGE_SECONDS.time(stage='convert'):
+            bookings = convert_bookings(bookings, req)
+        return {
+            'bookings': bookings,
+            **(await aget_booking_totals(req) if req.cursor is None else {}),
+            'nextCursor': next_cursor
+        }
+
+    with REQUEST_STAGE_SECONDS.time(stage='query'):
+        rows = [row async for row in filter_bookings(req).values_list(*ROW_FIELDS)]
+    with REQUEST_STAGE_SECONDS.time(stage='convert'):
+        return sum_bookings(convert_rows(rows, req), req)
+
+
+async def aget_booking_totals(req: Request) -> Dict[str, Any]:
+    with REQUEST_STAGE_SECONDS.time(stage='query'):
+        rows = [row for query in totals_queries(req) async for row in query]
+    with REQUEST_STAGE_SECONDS.time(stage='convert'):
+        return convert_totals(merge_totals(rows), req)
+
+
+async def astream_bookings(req: Request) -> AsyncIterator[bytes]:
+    chunk_size = settings.BOOKINGS_STREAM_CHUNK_SIZE
+    # values_list().aiterator() runs its query on the event loop thread in Django 5.2, so the
+    # chunks of the server-side cursor are pulled through sync_to_async, as aiterator() would
+    rows = filter_bookings(req).values_list(*ROW_FIELDS).iterator(chunk_size=chunk_size)
+    next_chunk = sync_to_async(lambda: list(islice(rows, chunk_size)))
+    subtotals = {}
+    first = True
+
+    yield b'{"bookings":['
+    try:
+        while chunk := await next_chunk():
+            yield encode_chunk(chunk, req, subtotals, first)
+            first = False
+        yield encode_totals(subtotals, req)
+    except Exception as e:
+        logger.error(f"Error streaming bookings: {str(e)}", exc_info=True)
+        yield STREAM_ERROR
+
+
+def _json(data: Any, status_code: int = status.HTTP_200_OK) -> HttpResponse:
+    with REQUEST_STAGE_SECONDS.time(stage='serialize'):
+        content = dumps(data)
+    return HttpResponse(content, status=status_code, content_type='application/json')
@@ -1,22 +1,125 @@
+import hmac
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
 from rest_framework import authentication
 from rest_framework import exceptions
 
 from django.conf import settings
 
+from bookings.models import APIKey
+
+# Marks a key hash that is not in the in-process cache
+MISSING = object()
+
+
+class APIKeyStore:
+    """
+    In-process TTL cache in front of the APIKey table, keyed by key hash, that
+    evicts the least recently used entry when full. Unknown keys are cached in
+    a separate, smaller LRU, so retried bad keys don't reach the database and a
+    client sending random keys can only churn that one, never push the known
+    keys out.
+    """
+
+    def __init__(self):
+        self._known: OrderedDict[str, Tuple[float, APIKey]] = OrderedDict()
+        self._unknown: OrderedDict[str, float] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, key_hash: str) -> Optional[APIKey]:
+        api_key = self._get(key_hash)
+        if api_key is MISSING:
+            api_key = APIKey.objects.filter(key_hash=key_hash, is_active=True).first()
+            self._set(key_hash, api_key)
+        return api_key
+
+    async def alookup(self, key_hash: str) -> Optional[APIKey]:
+        api_key = self._get(key_hash)
+        if api_key is MISSING:
+            api_key = await APIKey.objects.filter(key_hash=key_hash, is_active=True).afirst()
+            self._set(key_hash, api_key)
+        return api_key
+
+    def clear(self):
+        with self._lock:
+            self._known.clear()
+            self._unknown.clear()
+
+    def _get(self, key_hash: str):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._known.get(key_hash)
+            if entry and entry[0] > now:
+                self._known.move_to_end(key_hash)
+                return entry[1]
+            expires = self._unknown.get(key_hash)
+            if expires and expires > now:
+                self._unknown.move_to_end(key_hash)
+                return None
+        return MISSING
+
+    def _set(self, key_hash: str, api_key: Optional[APIKey]) -> None:
+        expires = time.monotonic() + settings.API_KEY_CACHE_TTL
+        with self._lock:
+            if api_key is None:
+                self._known.pop(key_hash, None)
+                self._put(self._unknown, key_hash, expires, settings.API_KEY_UNKNOWN_CACHE_SIZE)
+            else:
+                self._unknown.pop(key_hash, None)
+                self._put(self._known, key_hash, (expires, api_key), settings.API_KEY_CACHE_SIZE)
+
+    @staticmethod
+    def _put(entries: OrderedDict, key_hash: str, value, size: int) -> None:
+        entries[key_hash] = value
+        entries.move_to_end(key_hash)
+        while len(entries) > size:
+            entries.popitem(last=False)
+
+
+api_key_store = APIKeyStore()
+
 
 class APIKeyAuthentication(authentication.BaseAuthentication):
     def authenticate(self, request):
-        # Case-insensitive header lookup
-        api_key = None
-        for header, value in request.headers.items():
-            if header.lower() == 'x-api-key':
-                api_key = value
-                break
+        key_hash = self._get_key_hash(request)
+        if self._is_legacy_key(key_hash):
+            return (None, None)
+        return (None, self._check(key_hash, api_key_store.lookup(key_hash)))
+
+    async def aauthenticate(self, request):
+        # For async views: same checks, without blocking the event loop on a cache miss
+        key_hash = self._get_key_hash(request)
+        if self._is_legacy_key(key_hash):
+            return (None, None)
+        return (None, self._check(key_hash, await api_key_store.alookup(key_hash)))
+
+    @staticmethod
+    def _get_key_hash(request) -> str:
+        api_key = request.META.get('HTTP_X_API_KEY')
         
         if not api_key:
             raise exceptions.AuthenticationFailed('No API key provided')
-            
-        if api_key != getattr(settings, 'EXTERNAL_API_KEY', None):
+        return APIKey.hash_key(api_key)
+
+    @staticmethod
+    def _is_legacy_key(key_hash: str) -> bool:
+        legacy_key = getattr(settings, 'EXTERNAL_API_KEY', None)
+        return bool(legacy_key) and hmac.compare_digest(key_hash, APIKey.hash_key(legacy_key))
+
+    @staticmethod
+    def _check(key_hash: str, client: Optional[APIKey]) -> APIKey:
+        if client is None or not hmac.compare_digest(key_hash, client.key_hash):
             raise exceptions.AuthenticationFailed('Invalid API key')
-            
-        return (None, None)
+        return client
+
+
+def is_metrics_scraper(request) -> bool:
+    # The scrape endpoint exposes per-key traffic, so it takes its own token instead of an API key
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if token and header.startswith('Bearer ') and hmac.compare_digest(header[len('Bearer '):], token):
+        return True
+    return request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
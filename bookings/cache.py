@@ -0,0 +1,76 @@
+import dataclasses
+import hashlib
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from bookings.request import Request
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'bookings:version'
+
+
+def _new_version() -> int:
+    # Time based so a lost version key never brings back responses cached under an old one
+    return int(time.time() * 1000)
+
+
+def get_version() -> int:
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, _new_version(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+async def aget_version() -> int:
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        await cache.aadd(VERSION_KEY, _new_version(), timeout=None)
+        version = await cache.aget(VERSION_KEY)
+    return version
+
+
+def get_cache_key(req: Request, version: int) -> str:
+    digest = hashlib.sha256(repr(dataclasses.astuple(req)).encode()).hexdigest()
+    return f"bookings:response:{version}:{digest}"
+
+
+def get_cached_response(req: Request, version: Optional[int]) -> Optional[Dict[str, Any]]:
+    # `version` is read once per request, before computing, and passed to cache_response as well
+    if version is None:
+        return None
+    return cache.get(get_cache_key(req, version))
+
+
+def cache_response(req: Request, data: Dict[str, Any], version: Optional[int]) -> None:
+    # Stored under the version read before the data was computed, so a sync finishing in between
+    # leaves it orphaned instead of serving pre-sync data under the new version
+    if version is None:
+        return
+    cache.set(get_cache_key(req, version), data, timeout=settings.BOOKINGS_CACHE_TTL)
+
+
+async def aget_cached_response(req: Request, version: Optional[int]) -> Optional[Dict[str, Any]]:
+    if version is None:
+        return None
+    return await cache.aget(get_cache_key(req, version))
+
+
+async def acache_response(req: Request, data: Dict[str, Any], version: Optional[int]) -> None:
+    if version is None:
+        return
+    await cache.aset(get_cache_key(req, version), data, timeout=settings.BOOKINGS_CACHE_TTL)
+
+
+def invalidate_bookings_cache() -> None:
+    # Bumping the version orphans every cached response; Redis evicts them by TTL/LRU
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, _new_version(), timeout=None)
+    logger.info("Invalidated cached bookings responses")
@@ -0,0 +1,103 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, Optional, Tuple
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from bookings.scheduling import get_upstream_bucket, record_upstream_latency, record_upstream_throttled
+
+
+class TransientUpstreamError(requests.HTTPError):
+    # 429 and 5xx responses: worth retrying later, after `retry_after` seconds when upstream says so
+    def __init__(self, *args, retry_after: Optional[float] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.retry_after = retry_after
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    # Created lazily so every Celery worker process gets its own keep-alive pool after fork
+    global _session
+
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=settings.EXTERNAL_API_POOL_SIZE,
+                    pool_maxsize=settings.EXTERNAL_API_POOL_SIZE,
+                )
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+    return _session
+
+
+def get_json(url: str, params: Optional[dict] = None, headers: Optional[dict] = None) -> Any:
+    # Every worker draws from the same Redis token bucket before calling upstream
+    get_upstream_bucket().wait()
+
+    started = time.monotonic()
+    res = get_session().get(url=url, params=params, headers=headers, timeout=settings.EXTERNAL_API_TIMEOUT)
+    record_upstream_latency(time.monotonic() - started)
+
+    if res.status_code == 429 or res.status_code >= 500:
+        if res.status_code == 429:
+            record_upstream_throttled()
+        raise TransientUpstreamError(
+            f"{res.status_code} response from {url}",
+            retry_after=_parse_retry_after(res.headers.get('Retry-After')),
+            response=res,
+        )
+    res.raise_for_status()
+    return res.json()
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    # Only the delay-seconds form; HTTP dates fall back to exponential backoff
+    try:
+        return max(float(value), 0.0) if value else None
+    except ValueError:
+        return None
+
+
+def fetch_concurrently(
+    fetch: Callable[[Any], Any],
+    items: Iterable[Any],
+    max_workers: int,
+) -> Iterator[Tuple[Any, Any, Optional[Exception]]]:
+    """
+    Yields (item, result, error) in the order of `items` while up to
+    `max_workers` fetches run ahead in background threads, so the caller can
+    write one result to the database while the next ones are downloading.
+    """
+    items = iter(items)
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='bookings-fetch')
+    pending = deque()
+
+    def submit_next():
+        for item in items:
+            pending.append((item, executor.submit(fetch, item)))
+            return
+
+    try:
+        # Bounded read-ahead keeps memory flat however many items there are
+        for _ in range(max_workers * 2):
+            submit_next()
+
+        while pending:
+            item, future = pending.popleft()
+            submit_next()
+            try:
+                yield item, future.result(), None
+            except Exception as e:
+                yield item, None, e
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
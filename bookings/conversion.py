@@ -0,0 +1,254 @@
+import logging
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, Hashable, Iterable, List, Sequence, Tuple
+
+from currency_converter import RateNotFoundError
+from django.utils import timezone
+
+from bookings.models import Booking
+from bookings.rates import get_rate_table
+from bookings.request import Request
+
+logger = logging.getLogger(__name__)
+
+
+def get_conversion_rates(currencies: Iterable[str], requested_currency: str) -> Dict[str, Decimal]:
+    table = get_rate_table()
+    rates = {}
+    for currency in set(currencies):
+        try:
+            rates[currency] = table.cross_rate(currency, requested_currency)
+        except (RateNotFoundError, ValueError) as e:
+            raise ValueError(f"No conversion rate from {currency} to {requested_currency}: {str(e)}")
+    return rates
+
+
+def get_conversion_rate_sets(currencies: Iterable[str], req: Request) -> Dict[str, Tuple[Decimal, ...]]:
+    # Per original currency, its cross-rates to each of req.currencies in order
+    currencies = set(currencies)
+    rates = [get_conversion_rates(currencies, requested) for requested in req.currencies]
+    return {currency: tuple(requested_rates[currency] for requested_rates in rates) for currency in currencies}
+
+
+def get_dated_conversion_rate_sets(
+    pairs: Iterable[Tuple[str, date]], req: Request
+) -> Dict[Tuple[str, date], Tuple[Decimal, ...]]:
+    # Per (original currency, day), its cross-rates on that day; each distinct pair is looked up once
+    table = get_rate_table()
+    rates = {}
+    for currency, day in set(pairs):
+        try:
+            rates[currency, day] = tuple(table.cross_rate(currency, requested, day) for requested in req.currencies)
+        except (RateNotFoundError, ValueError) as e:
+            raise ValueError(f"No conversion rate from {currency} on {day}: {str(e)}")
+    return rates
+
+
+def _rate_sets(keys: Iterable[Hashable], req: Request) -> Dict[Hashable, Tuple[Decimal, ...]]:
+    # Keys are currencies, or (currency, day) pairs with rateDate=booking
+    if req.rates_by_booking_date:
+        return get_dated_conversion_rate_sets(keys, req)
+    return get_conversion_rate_sets(keys, req)
+
+
+def convert_bookings(bookings: List[Booking], req: Request) -> List[Dict[str, Any]]:
+    if req.multi_currency or req.rates_by_booking_date:
+        return convert_rows([tuple(getattr(b, field) for field in ROW_FIELDS) for b in bookings], req)
+
+    # One cross-rate per original currency, applied to that currency's bookings as a batch
+    groups = defaultdict(list)
+    for index, booking in enumerate(bookings):
+        groups[booking.original_currency].append(index)
+
+    rates = get_conversion_rates(groups, req.requested_currency)
+    converted = [None] * len(bookings)
+    for currency, indices in groups.items():
+        rate = rates[currency]
+        for index in indices:
+            converted[index] = convert_booking(bookings[index], req, rate)
+    return converted
+
+
+# Booking columns, in the order convert_rows expects them from values_list()
+ROW_FIELDS = (
+    'code', 'experience', 'rate', 'booking_created', 'participants',
+    'original_currency', 'price_original_currency',
+)
+
+
+def convert_rows(rows: List[Tuple], req: Request) -> List[Dict[str, Any]]:
+    # convert_bookings for values_list(*ROW_FIELDS) tuples, skipping model instantiation
+    if req.rates_by_booking_date:
+        return _convert_rows_dated(rows, req)
+    if req.multi_currency:
+        return _convert_rows_multi(rows, req)
+
+    rates = get_conversion_rates({row[5] for row in rows}, req.requested_currency)
+    requested_currency = req.requested_currency
+    cent = Decimal('0.01')
+    return [
+        {
+            'code': code,
+            'experience': experience,
+            'rate': rate,
+            'bookingCreated': booking_created,
+            'participants': participants,
+            'originalCurrency': currency,
+            'priceOriginalCurrency': price,
+            'requestedCurrency': requested_currency,
+            'priceRequestedCurrency': (price * rates[currency]).quantize(cent),
+        }
+        for code, experience, rate, booking_created, participants, currency, price in rows
+    ]
+
+
+def _convert_rows_multi(rows: List[Tuple], req: Request) -> List[Dict[str, Any]]:
+    # Every requested currency in the same pass over the rows
+    rates = get_conversion_rate_sets({row[5] for row in rows}, req)
+    requested_currencies = req.currencies
+    cent = Decimal('0.01')
+    return [
+        {
+            'code': code,
+            'experience': experience,
+            'rate': rate,
+            'bookingCreated': booking_created,
+            'participants': participants,
+            'originalCurrency': currency,
+            'priceOriginalCurrency': price,
+            'priceRequestedCurrencies': dict(zip(
+                requested_currencies, [(price * cross_rate).quantize(cent) for cross_rate in rates[currency]]
+            )),
+        }
+        for code, experience, rate, booking_created, participants, currency, price in rows
+    ]
+
+
+def _convert_rows_dated(rows: List[Tuple], req: Request) -> List[Dict[str, Any]]:
+    # Rates come from the distinct (currency, day) pairs of the rows, not from a lookup per row
+    tz = timezone.get_current_timezone()
+    days = [row[3].astimezone(tz).date() for row in rows]
+    rates = get_dated_conversion_rate_sets(zip([row[5] for row in rows], days), req)
+    requested_currencies = req.currencies
+    multi_currency = req.multi_currency
+    cent = Decimal('0.01')
+    converted = []
+    for (code, experience, rate, booking_created, participants, currency, price), day in zip(rows, days):
+        prices = [(price * cross_rate).quantize(cent) for cross_rate in rates[currency, day]]
+        booking = {
+            'code': code,
+            'experience': experience,
+            'rate': rate,
+            'bookingCreated': booking_created,
+            'participants': participants,
+            'originalCurrency': currency,
+            'priceOriginalCurrency': price,
+        }
+        if multi_currency:
+            booking['priceRequestedCurrencies'] = dict(zip(requested_currencies, prices))
+        else:
+            booking['requestedCurrency'] = requested_currencies[0]
+            booking['priceRequestedCurrency'] = prices[0]
+        converted.append(booking)
+    return converted
+
+
+def add_to_subtotals(subtotals: Dict[Hashable, Decimal], bookings: Iterable[Dict[str, Any]], req: Request) -> None:
+    # Original prices per currency (and day with rateDate=booking), the keys convert_totals takes, so
+    # the full list and stream=true round their totals exactly like totalsOnly and pages do
+    tz = timezone.get_current_timezone()
+    by_day = req.rates_by_booking_date
+    for booking in bookings:
+        currency = booking['originalCurrency']
+        key = (currency, booking['bookingCreated'].astimezone(tz).date()) if by_day else currency
+        subtotals[key] = subtotals.get(key, Decimal(0)) + booking['priceOriginalCurrency']
+
+
+def new_totals(req: Request) -> List[Decimal]:
+    return [Decimal(0)] * (1 + len(req.currencies))
+
+
+def format_totals(totals: Sequence[Decimal], req: Request) -> Dict[str, Any]:
+    return {
+        'totalPriceOriginalCurrency': totals[0].quantize(Decimal('0.01')),
+        **requested_totals(totals[1:], req)
+    }
+
+
+def requested_totals(totals: Sequence[Decimal], req: Request) -> Dict[str, Any]:
+    # One amount for a single requested currency, or an amount per currency when several were requested
+    if req.multi_currency:
+        return {'totalPriceRequestedCurrencies': {
+            currency: total.quantize(Decimal('0.01')) for currency, total in zip(req.currencies, totals)
+        }}
+    return {'totalPriceRequestedCurrency': totals[0].quantize(Decimal('0.01'))}
+
+
+def convert_totals(totals_by_currency: Dict[Hashable, Decimal], req: Request) -> Dict[str, Any]:
+    # Keyed by currency, or by (currency, day) with rateDate=booking. Each subtotal is converted and
+    # rounded once, and every mode reports its requested totals this way
+    rates = _rate_sets(totals_by_currency, req)
+    totals = new_totals(req)
+    for key, total in totals_by_currency.items():
+        totals[0] += total
+        for i, rate in enumerate(rates[key], 1):
+            totals[i] += (total * rate).quantize(Decimal('0.01'))
+    return format_totals(totals, req)
+
+
+def convert_groups(rows: List[Tuple], req: Request) -> Dict[str, Any]:
+    # Rows are (*group_by values, original currency[, day], price sum in hundredths, participants,
+    # bookings), one per currency (and day with rateDate=booking) of a group: each sum is converted
+    # and rounded like convert_totals, then added up
+    size = len(req.group_by)
+    rate_keys = [row[size:-3] if req.rates_by_booking_date else row[size] for row in rows]
+    rates = _rate_sets(rate_keys, req)
+    cent = Decimal('0.01')
+    groups = {}
+    for row, rate_key in zip(rows, rate_keys):
+        key = row[:size]
+        total_minor, participants, count = row[-3:]
+        total = Decimal(total_minor).scaleb(-2)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = [[Decimal(0)] * len(req.currencies), 0, 0]
+        for i, rate in enumerate(rates[rate_key]):
+            group[0][i] += (total * rate).quantize(cent)
+        group[1] += participants
+        group[2] += count
+
+    overall = [sum(totals, Decimal(0)) for totals in zip(*(group[0] for group in groups.values()))]
+    return {
+        'groups': [
+            {
+                **dict(zip(req.group_by, key)),
+                **requested_totals(totals, req),
+                'participants': participants,
+                'bookings': count,
+            }
+            for key, (totals, participants, count) in groups.items()
+        ],
+        **requested_totals(overall or [Decimal(0)] * len(req.currencies), req),
+    }
+
+
+def convert_booking(booking: Booking, req: Request, rate: Decimal) -> Dict[str, Any]:
+    try:
+        price_converted = (booking.price_original_currency * rate).quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError) as e:
+        logger.error(f"Error converting booking {booking.code}: {str(e)}")
+        raise ValueError(f"Invalid currency conversion: {str(e)}")
+
+    return {
+        'code': booking.code,
+        'experience': booking.experience,
+        'rate': booking.rate,
+        'bookingCreated': booking.booking_created,
+        'participants': booking.participants,
+        'originalCurrency': booking.original_currency,
+        'priceOriginalCurrency': booking.price_original_currency,
+        'requestedCurrency': req.requested_currency,
+        'priceRequestedCurrency': price_converted
+    }
@@ -0,0 +1,152 @@
+import csv
+import io
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List
+
+from django.conf import settings
+from django.db.models import QuerySet
+from rest_framework.utils.encoders import JSONEncoder
+
+from bookings.conversion import ROW_FIELDS, convert_rows
+from bookings.metrics import REQUEST_STAGE_SECONDS
+from bookings.renderers import dumps
+from bookings.request import Request
+
+try:
+    import pyarrow
+    import pyarrow.parquet as pq
+except ImportError:
+    pyarrow = None
+
+# Export formats: content type and file extension
+FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+BASE_COLUMNS = [
+    'code', 'experience', 'rate', 'bookingCreated', 'participants', 'originalCurrency', 'priceOriginalCurrency',
+]
+
+_encoder = JSONEncoder()
+
+
+def parse_format(value: str) -> str:
+    value = value or 'csv'
+    if value not in FORMATS:
+        raise ValueError(f"Invalid export format: {value}")
+    if value == 'parquet' and pyarrow is None:
+        raise ValueError("Parquet export requires pyarrow")
+    return value
+
+
+def booking_chunks(query: QuerySet, req: Request) -> Iterator[List[Dict[str, Any]]]:
+    # Converted bookings read through a server-side cursor, one chunk in memory at a time
+    chunk_size = settings.BOOKINGS_STREAM_CHUNK_SIZE
+    rows = query.values_list(*ROW_FIELDS).iterator(chunk_size=chunk_size)
+    while chunk := list(islice(rows, chunk_size)):
+        with REQUEST_STAGE_SECONDS.time(stage='convert'):
+            bookings = convert_rows(chunk, req)
+        yield bookings
+
+
+def export_bookings(chunks: Iterable[List[Dict[str, Any]]], req: Request, file_format: str) -> Iterator[bytes]:
+    writers = {'csv': write_csv, 'ndjson': write_ndjson, 'parquet': write_parquet}
+    return writers[file_format](chunks, req)
+
+
+def columns(req: Request) -> List[str]:
+    if req.multi_currency:
+        return BASE_COLUMNS + [f'priceRequestedCurrency{currency}' for currency in req.currencies]
+    return BASE_COLUMNS + ['requestedCurrency', 'priceRequestedCurrency']
+
+
+def flatten(booking: Dict[str, Any], req: Request) -> List[Any]:
+    values = [booking[column] for column in BASE_COLUMNS]
+    if req.multi_currency:
+        return values + list(booking['priceRequestedCurrencies'].values())
+    return values + [booking['requestedCurrency'], booking['priceRequestedCurrency']]
+
+
+def write_csv(chunks: Iterable[List[Dict[str, Any]]], req: Request) -> Iterator[bytes]:
+    # Decimals as written (12.30, not 12.3); dates as in the JSON responses
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns(req))
+    for bookings in chunks:
+        with REQUEST_STAGE_SECONDS.time(stage='serialize'):
+            for booking in bookings:
+                row = flatten(booking, req)
+                row[3] = _encoder.default(row[3])
+                writer.writerow(row)
+            data = buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        yield data
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def write_ndjson(chunks: Iterable[List[Dict[str, Any]]], req: Request) -> Iterator[bytes]:
+    # One JSON object per line, each exactly as it appears in the /bookings/ response
+    for bookings in chunks:
+        with REQUEST_STAGE_SECONDS.time(stage='serialize'):
+            data = b''.join(dumps(booking) + b'\n' for booking in bookings)
+        yield data
+
+
+class _Sink(io.RawIOBase):
+    # Collects what ParquetWriter writes so it can be streamed out after every row group
+    def __init__(self):
+        super().__init__()
+        self._pieces = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._pieces.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b''.join(self._pieces)
+        self._pieces.clear()
+        return data
+
+
+def write_parquet(chunks: Iterable[List[Dict[str, Any]]], req: Request) -> Iterator[bytes]:
+    # One row group per chunk; the footer follows the last one
+    price = pyarrow.decimal128(18, 2)
+    fields = [
+        ('code', pyarrow.string()),
+        ('experience', pyarrow.string()),
+        ('rate', pyarrow.string()),
+        ('bookingCreated', pyarrow.timestamp('us', tz='UTC')),
+        ('participants', pyarrow.int64()),
+        ('originalCurrency', pyarrow.string()),
+        ('priceOriginalCurrency', price),
+    ]
+    if req.multi_currency:
+        fields += [(f'priceRequestedCurrency{currency}', price) for currency in req.currencies]
+    else:
+        fields += [('requestedCurrency', pyarrow.string()), ('priceRequestedCurrency', price)]
+    schema = pyarrow.schema(fields)
+
+    sink = _Sink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for bookings in chunks:
+            with REQUEST_STAGE_SECONDS.time(stage='serialize'):
+                values = list(zip(*(flatten(booking, req) for booking in bookings)))
+                writer.write_table(pyarrow.Table.from_arrays(
+                    [pyarrow.array(column, type=field.type) for column, field in zip(values, schema)], schema=schema
+                ))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
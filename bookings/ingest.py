@@ -0,0 +1,142 @@
+import hashlib
+import json
+import logging
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Tuple
+
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from bookings.metrics import SYNC_PAGE_STAGE_SECONDS, SYNC_ROWS
+from bookings.models import Booking
+from bookings.rollups import affected_days, refresh_rollups
+
+logger = logging.getLogger(__name__)
+
+# Synced columns; a change in any of them changes the booking's fingerprint
+CONTENT_FIELDS = [
+    'code', 'status', 'experience', 'rate', 'booking_created', 'participants',
+    'original_currency', 'price_original_currency',
+]
+# Columns overwritten when an incoming booking already exists
+UPSERT_FIELDS = CONTENT_FIELDS + ['price_minor', 'fingerprint', 'updated_at']
+
+
+def parse_booking(booking):
+    return {
+        'id': booking['id'],
+        'code': booking['bookingCode'],
+        'status': booking['bookingStatus'],
+        'experience': booking['experience']['name'],
+        'rate': booking['rateName'],
+        'booking_created': timezone.make_aware(datetime.fromisoformat(booking['bookingCreated'].replace('Z', '+00:00'))),
+        'participants': sum(rate['quantity'] for rate in booking['ratesQuantity']),
+        'original_currency': booking['price']['finalRetailPrice']['currency'],
+        # Via str so float amounts such as 4321.07 keep their two decimal places
+        'price_original_currency': Decimal(str(booking['price']['finalRetailPrice']['amount'])),
+    }
+
+
+def build_bookings(results: Iterable[Dict[str, Any]]) -> List[Booking]:
+    with SYNC_PAGE_STAGE_SECONDS.time(stage='parse'):
+        return _build_bookings(results)
+
+
+def _build_bookings(results: Iterable[Dict[str, Any]]) -> List[Booking]:
+    bookings = {}
+    for booking_data in results:
+        try:
+            booking = Booking(**parse_booking(booking_data))
+            # The status vocabulary belongs to the upstream API, so it is stored as received
+            booking.clean_fields(exclude=['status'])
+            booking.set_compact_fields()
+            booking.fingerprint = booking_fingerprint(booking)
+        except Exception as e:
+            logger.error(f"Error processing booking {booking_data.get('id', 'unknown')}: {str(e)}")
+            SYNC_ROWS.inc(result='invalid')
+            continue
+        # A single upsert statement cannot touch the same row twice; the last copy wins
+        bookings[booking.id] = booking
+    return list(bookings.values())
+
+
+def booking_fingerprint(booking: Booking) -> str:
+    content = []
+    for field in CONTENT_FIELDS:
+        value = getattr(booking, field)
+        if isinstance(value, datetime):
+            value = value.astimezone(dt_timezone.utc).isoformat()
+        elif isinstance(value, (Decimal, float)):
+            value = str(Decimal(str(value)).quantize(Decimal('0.01')))
+        content.append(value)
+    return hashlib.sha256(json.dumps(content, separators=(',', ':')).encode()).hexdigest()
+
+
+def partition_changes(bookings: List[Booking]) -> Tuple[List[Booking], List[Booking], int]:
+    # One query for the stored fingerprints of the whole batch
+    stored = dict(
+        Booking.objects.filter(id__in=[booking.id for booking in bookings]).values_list('id', 'fingerprint')
+    )
+    new = [booking for booking in bookings if booking.id not in stored]
+    changed = [booking for booking in bookings if booking.id in stored and stored[booking.id] != booking.fingerprint]
+    return new, changed, len(bookings) - len(new) - len(changed)
+
+
+def ingest_bookings(bookings: List[Booking]) -> Dict[str, int]:
+    new, changed, unchanged = partition_changes(bookings)
+    days = affected_days(new + changed, changed)
+    # Counted from what was written: bookings the one-by-one fallback had to drop are failed
+    written = {booking.id for booking in upsert_bookings(new + changed)}
+    refresh_rollups(days)
+    inserted = sum(booking.id in written for booking in new)
+    updated = sum(booking.id in written for booking in changed)
+    failed = len(new) + len(changed) - inserted - updated
+    return {'inserted': inserted, 'updated': updated, 'unchanged': unchanged, 'failed': failed}
+
+
+def upsert_bookings(bookings: List[Booking]) -> List[Booking]:
+    # Returns the bookings actually written
+    if not bookings:
+        return []
+    try:
+        with transaction.atomic():
+            Booking.objects.bulk_create(
+                bookings,
+                update_conflicts=True,
+                unique_fields=['id'],
+                update_fields=UPSERT_FIELDS,
+            )
+        return bookings
+    except DatabaseError as e:
+        logger.error(f"Bulk upsert of {len(bookings)} bookings failed, retrying one by one: {str(e)}")
+        return _upsert_individually(bookings)
+
+
+def update_bookings(bookings: List[Booking]) -> int:
+    # Only touches bookings that already exist locally
+    if not bookings:
+        return 0
+    now = timezone.now()
+    for booking in bookings:
+        booking.updated_at = now
+    days = affected_days(bookings, bookings)
+    with transaction.atomic():
+        updated = Booking.objects.bulk_update(bookings, UPSERT_FIELDS)
+    refresh_rollups(days)
+    return updated
+
+
+def _upsert_individually(bookings: List[Booking]) -> List[Booking]:
+    written = []
+    for booking in bookings:
+        try:
+            with transaction.atomic():
+                Booking.objects.update_or_create(
+                    id=booking.id,
+                    defaults={field: getattr(booking, field) for field in UPSERT_FIELDS if field != 'updated_at'}
+                )
+            written.append(booking)
+        except DatabaseError as e:
+            logger.error(f"Error processing booking {booking.id}: {str(e)}")
+    return written
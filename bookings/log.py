@@ -0,0 +1,67 @@
+import atexit
+import logging
+import os
+import queue
+import weakref
+from logging.handlers import QueueHandler, QueueListener
+
+# Open handlers, restarted in forked children and drained at exit by the hooks registered once below
+_handlers = weakref.WeakSet()
+
+
+class BackgroundFileHandler(QueueHandler):
+    """
+    Formats records in the calling thread and hands them to a background
+    thread that appends them to `filename`, so a request or task never waits
+    on log I/O. The writer thread is restarted in forked worker processes.
+    """
+
+    def __init__(self, filename, mode='a', encoding=None):
+        super().__init__(queue.SimpleQueue())
+        self.target = logging.FileHandler(filename, mode=mode, encoding=encoding)
+        self.listener = None
+        self.running = False
+        self._start()
+        _handlers.add(self)
+
+    def _start(self):
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+        self.running = True
+
+    def flush_and_stop(self):
+        # Stopping the listener drains whatever is still queued
+        if self.running:
+            self.running = False
+            self.listener.stop()
+
+    def close(self):
+        _handlers.discard(self)
+        self.flush_and_stop()
+        self.target.close()
+        super().close()
+
+
+def _drain_before_fork():
+    # A child inheriting queued records would write them a second time
+    for handler in list(_handlers):
+        if handler.running:
+            handler.listener.stop()
+
+
+def _restart_after_fork():
+    # Writer threads were stopped for the fork and do not exist in the child
+    for handler in list(_handlers):
+        if handler.running:
+            handler._start()
+
+
+def _stop_all():
+    for handler in list(_handlers):
+        handler.flush_and_stop()
+
+
+os.register_at_fork(
+    before=_drain_before_fork, after_in_parent=_restart_after_fork, after_in_child=_restart_after_fork
+)
+atexit.register(_stop_all)
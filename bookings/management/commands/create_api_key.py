@@ -0,0 +1,16 @@
+import secrets
+
+from django.core.management.base import BaseCommand
+from bookings.models import APIKey
+
+
+class Command(BaseCommand):
+    help = 'Creates a client API key; the key is printed once and only its hash is stored'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', help='Who the key is issued to')
+
+    def handle(self, *args, **options):
+        key = secrets.token_urlsafe(32)
+        APIKey.objects.create(name=options['name'], key_hash=APIKey.hash_key(key))
+        self.stdout.write(self.style.SUCCESS(f"API key for {options['name']}: {key}"))
@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from bookings.export import FORMATS, booking_chunks, export_bookings, parse_format
+from bookings.queries import filter_bookings
+from bookings.request import Request
+
+
+class Command(BaseCommand):
+    help = 'Streams bookings to a CSV, NDJSON or Parquet file with prices converted to the given currencies'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--currency', required=True, help='Requested currency, or several separated by commas')
+        parser.add_argument('--since', help='Only bookings created after this ISO datetime')
+        parser.add_argument('--until', help='Only bookings created before this ISO datetime')
+        parser.add_argument('--rate-date', choices=['latest', 'booking'], default='latest')
+        parser.add_argument('--format', choices=list(FORMATS), default='csv')
+        parser.add_argument('--output', default='-', help='File to write, or - for stdout')
+
+    def handle(self, *args, **options):
+        try:
+            req = Request.from_params({
+                'currency': options['currency'],
+                'date[gt]': options['since'],
+                'date[lt]': options['until'],
+                'rateDate': options['rate_date'],
+            })
+            file_format = parse_format(options['format'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        exported = 0
+
+        def counted(chunks):
+            nonlocal exported
+            for bookings in chunks:
+                exported += len(bookings)
+                yield bookings
+
+        started = time.monotonic()
+        if options['output'] == '-':
+            # The bytes go to the stream behind self.stdout, so call_command(stdout=...) captures them
+            self.stdout.flush()
+            stream = self.stdout._out
+            output = getattr(stream, 'buffer', stream)
+        else:
+            output = open(options['output'], 'wb')
+        try:
+            for data in export_bookings(counted(booking_chunks(filter_bookings(req), req)), req, file_format):
+                output.write(data)
+            output.flush()
+        finally:
+            if options['output'] != '-':
+                output.close()
+        elapsed = time.monotonic() - started
+
+        # Progress goes to stderr so stdout can carry the export itself
+        self.stderr.write(self.style.SUCCESS(
+            f'Exported {exported} bookings in {elapsed:.1f}s ({exported / max(elapsed, 1e-9):.0f} rows/sec)'
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from bookings.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the daily booking rollups used for totals from all stored bookings'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding daily booking rollups...')
+        count = rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} daily rollups'))
@@ -0,0 +1,221 @@
+import asyncio
+import os
+import socket
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, List, Sequence, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+# Seconds; the upper bounds of the histogram buckets (+Inf is implied)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+INDEX_KEY = 'bookings:metrics:processes'
+
+Labels = Tuple[str, ...]
+
+
+class Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def _labels(self, labels: Dict[str, str]) -> Labels:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def snapshot(self) -> Dict[Labels, object]:
+        with self._lock:
+            return {labels: self._copy(value) for labels, value in self._values.items()}
+
+    def _copy(self, value):
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels) -> None:
+        # Per-bucket (not cumulative) counts followed by sum and count
+        key = self._labels(labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            counts[bisect_left(self.buckets, value)] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _copy(self, value):
+        return list(value)
+
+
+registry: List[Metric] = []
+
+REQUEST_STAGE_SECONDS = Histogram(
+    'bookings_request_stage_seconds', 'Time spent in each stage of a /bookings/ request.', ['stage']
+)
+REQUESTS = Counter('bookings_requests_total', '/bookings/ responses by HTTP status.', ['status'])
+RESPONSE_CACHE = Counter('bookings_response_cache_total', 'Response cache lookups.', ['result'])
+SYNC_PAGE_STAGE_SECONDS = Histogram(
+    'bookings_sync_page_stage_seconds', 'Time spent fetching, parsing and writing one page of bookings.', ['stage']
+)
+SYNC_ROWS = Counter('bookings_sync_rows_total', 'Synced bookings by outcome.', ['result'])
+
+_process_key = None
+_published_at = 0.0
+_publish_lock = threading.Lock()
+
+
+def instrument_view(view):
+    # Counts responses by status, including those DRF produces before the view body runs
+    if asyncio.iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            response = await view(request, *args, **kwargs)
+            REQUESTS.inc(status=response.status_code)
+            if publish_due():
+                await sync_to_async(publish, thread_sensitive=False)()
+            return response
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        REQUESTS.inc(status=response.status_code)
+        publish()
+        return response
+    return wrapper
+
+
+def snapshot() -> Dict[str, Dict[Labels, object]]:
+    return {metric.name: metric.snapshot() for metric in registry}
+
+
+def get_process_key() -> str:
+    # One entry per process; recomputed after a fork
+    global _process_key
+
+    pid = os.getpid()
+    if _process_key is None or not _process_key.endswith(f':{pid}'):
+        _process_key = f'bookings:metrics:{socket.gethostname()}:{pid}'
+    return _process_key
+
+
+def publish(force: bool = False) -> None:
+    """
+    Shares this process's metrics through the cache at most every
+    METRICS_PUBLISH_INTERVAL seconds, so the scrape endpoint can report web
+    and Celery worker processes together.
+    """
+    global _published_at
+
+    if not force and not publish_due():
+        return
+    if not _publish_lock.acquire(blocking=False):
+        return
+    try:
+        _published_at = time.monotonic()
+        key = get_process_key()
+        cache.set(key, snapshot(), timeout=settings.METRICS_TTL)
+        processes = cache.get(INDEX_KEY) or []
+        if key not in processes:
+            cache.set(INDEX_KEY, processes + [key], timeout=None)
+    finally:
+        _publish_lock.release()
+
+
+def publish_due() -> bool:
+    return time.monotonic() - _published_at >= settings.METRICS_PUBLISH_INTERVAL
+
+
+def collect() -> Dict[str, Dict[Labels, object]]:
+    # Published snapshots of every live process, with this process's current values
+    own_key = get_process_key()
+    processes = cache.get(INDEX_KEY) or []
+    snapshots = cache.get_many([key for key in processes if key != own_key])
+    live = [key for key in processes if key in snapshots or key == own_key]
+    if live != processes:
+        cache.set(INDEX_KEY, live, timeout=None)
+
+    merged = snapshot()
+    for published in snapshots.values():
+        for metric in registry:
+            values = merged[metric.name]
+            for labels, value in published.get(metric.name, {}).items():
+                if metric.kind == 'counter':
+                    values[labels] = values.get(labels, 0) + value
+                elif labels in values:
+                    values[labels] = [a + b for a, b in zip(values[labels], value)]
+                else:
+                    values[labels] = list(value)
+    return merged
+
+
+def render(values: Dict[str, Dict[Labels, object]]) -> str:
+    # Prometheus text exposition format 0.0.4
+    lines = []
+    for metric in registry:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        for labels, value in sorted(values.get(metric.name, {}).items()):
+            pairs = [f'{name}="{_escape(label)}"' for name, label in zip(metric.labelnames, labels)]
+            if metric.kind == 'counter':
+                lines.append(f'{metric.name}{_format_labels(pairs)} {_format_value(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets + (float('inf'),), value):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else _format_value(bound)
+                bucket_labels = _format_labels(pairs + ['le="%s"' % le])
+                lines.append(f'{metric.name}_bucket{bucket_labels} {cumulative}')
+            lines.append(f'{metric.name}_sum{_format_labels(pairs)} {_format_value(value[-2])}')
+            lines.append(f'{metric.name}_count{_format_labels(pairs)} {value[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+def _format_labels(pairs: List[str]) -> str:
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
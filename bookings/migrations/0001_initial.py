@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-18 08:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Booking',
+            fields=[
+                ('id', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('code', models.CharField(blank=True, max_length=50, null=True)),
+                ('status', models.CharField(choices=[('ON_HOLD', 'ON_HOLD'), ('PENDING', 'PENDING'), ('ACCEPTED', 'ACCEPTED'), ('COMPLETED', 'COMPLETED'), ('CANCELLED', 'CANCELLED'), ('EXPIRED', 'EXPIRED'), ('REJECTED', 'REJECTED')], max_length=20)),
+                ('experience', models.CharField(max_length=255)),
+                ('rate', models.CharField(max_length=100)),
+                ('booking_created', models.DateTimeField()),
+                ('participants', models.PositiveIntegerField()),
+                ('original_currency', models.CharField(max_length=3)),
+                ('price_original_currency', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-booking_created'],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-18 08:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['booking_created', 'id'], name='booking_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['booking_created', 'original_currency', 'price_original_currency', 'status'], name='booking_created_totals_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(condition=models.Q(('status__in', ['CANCELLED', 'COMPLETED']), _negated=True), fields=['booking_created'], name='booking_active_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-18 08:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0003_booking_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncState',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('watermark', models.DateTimeField(blank=True, null=True)),
+                ('run_id', models.CharField(blank=True, default='', max_length=32)),
+                ('run_since', models.DateTimeField(blank=True, null=True)),
+                ('run_newest', models.DateTimeField(blank=True, null=True)),
+                ('last_page', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 08:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0005_apikey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apikey',
+            name='rate_limit',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-18 08:56
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollups(apps, schema_editor):
+    Booking = apps.get_model('bookings', 'Booking')
+    BookingDailyRollup = apps.get_model('bookings', 'BookingDailyRollup')
+
+    rows = Booking.objects.order_by().annotate(day=TruncDate('booking_created')).values(
+        'day', 'original_currency', 'status'
+    ).annotate(
+        total_price=Sum('price_original_currency'),
+        participants=Sum('participants'),
+        count=Count('id'),
+    )
+    BookingDailyRollup.objects.bulk_create((BookingDailyRollup(**row) for row in rows), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0006_apikey_rate_limit'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('original_currency', models.CharField(max_length=3)),
+                ('status', models.CharField(max_length=20)),
+                ('total_price', models.DecimalField(decimal_places=2, max_digits=18)),
+                ('participants', models.PositiveBigIntegerField()),
+                ('count', models.PositiveIntegerField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'original_currency', 'status'), name='booking_rollup_unique')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
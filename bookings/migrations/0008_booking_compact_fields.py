@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-18 09:11
+
+from django.db import migrations, models
+from django.db.models import BigIntegerField, F
+from django.db.models.functions import Cast, Round
+
+
+def backfill_price_minor(apps, schema_editor):
+    Booking = apps.get_model('bookings', 'Booking')
+    # One set-based UPDATE; rounded first because SQLite multiplies decimals as floats
+    Booking.objects.update(price_minor=Cast(Round(F('price_original_currency') * 100), BigIntegerField()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0007_bookingdailyrollup'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='booking',
+            name='booking_created_totals_idx',
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='price_minor',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_price_minor, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['booking_created', 'original_currency', 'price_minor', 'status'], name='booking_created_totals_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-18 09:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0008_booking_compact_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingRollupLock',
+            fields=[
+                ('day', models.DateField(primary_key=True, serialize=False)),
+            ],
+        ),
+    ]
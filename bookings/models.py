@@ -1,4 +1,10 @@
-from django.db import models
+import hashlib
+from decimal import Decimal
+
+from django.db import models, transaction
+
+# Final statuses; bookings in any other status are still refreshed from upstream
+INACTIVE_STATUSES = ['CANCELLED', 'COMPLETED']
 
 
 class Booking(models.Model):
@@ -21,12 +27,119 @@ class Booking(models.Model):
     participants = models.PositiveIntegerField()
     original_currency = models.CharField(max_length=3)
     price_original_currency = models.DecimalField(max_digits=10, decimal_places=2)
+    # Hash of the synced content, used to skip writes when upstream sends an unchanged booking
+    fingerprint = models.CharField(max_length=64, blank=True, default='')
+    # The price in hundredths, kept in step by set_compact_fields, so totals are summed exactly in SQL
+    price_minor = models.BigIntegerField(default=0)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return f"{self.code or 'No code'} - {self.experience}"
+
+    def save(self, *args, **kwargs):
+        # Rollups of the day the booking was stored under and of its new day follow the write; the sync
+        # writes with bulk_create() and bulk_update() instead and refreshes them per page
+        from bookings.rollups import affected_days, refresh_rollups
+
+        self.set_compact_fields()
+        with transaction.atomic():
+            days = affected_days([self], [self])
+            super().save(*args, **kwargs)
+            refresh_rollups(days)
+
+    def delete(self, *args, **kwargs):
+        from bookings.rollups import affected_days, refresh_rollups
+
+        with transaction.atomic():
+            days = affected_days([self], [self])
+            deleted = super().delete(*args, **kwargs)
+            refresh_rollups(days)
+        return deleted
+
+    def set_compact_fields(self) -> None:
+        # bulk_create() and bulk_update() skip save(), so ingest calls this itself
+        self.price_minor = to_minor(self.price_original_currency)
     
     class Meta:
         ordering = ['-booking_created']
+        indexes = [
+            # Date range filters, latest-booking lookup and keyset pagination
+            models.Index(fields=['booking_created', 'id'], name='booking_created_id_idx'),
+            # Covers the per-currency totals aggregate so it never touches the table
+            models.Index(
+                fields=['booking_created', 'original_currency', 'price_minor', 'status'],
+                name='booking_created_totals_idx',
+            ),
+            # Only bookings that can still change, as swept by update_active_bookings
+            models.Index(
+                fields=['booking_created'],
+                condition=~models.Q(status__in=INACTIVE_STATUSES),
+                name='booking_active_idx',
+            ),
+        ]
+
+
+def to_minor(amount) -> int:
+    # Prices have two decimal places in every currency, so hundredths are exact
+    return int(Decimal(str(amount)).quantize(Decimal('0.01')).scaleb(2))
+
+
+class BookingDailyRollup(models.Model):
+    # Booking totals per day (in TIME_ZONE), currency and status, maintained by bookings/rollups.py
+    day = models.DateField()
+    original_currency = models.CharField(max_length=3)
+    status = models.CharField(max_length=20)
+    total_price = models.DecimalField(max_digits=18, decimal_places=2)
+    participants = models.PositiveBigIntegerField()
+    count = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f"{self.day} {self.original_currency} {self.status}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'original_currency', 'status'], name='booking_rollup_unique'),
+        ]
+
+
+class BookingRollupLock(models.Model):
+    # One row per rolled-up day, locked while refresh_rollups recomputes that day
+    day = models.DateField(primary_key=True)
+
+    def __str__(self):
+        return str(self.day)
+
+
+class SyncState(models.Model):
+    # Checkpoint of an incremental sync: committed watermark plus progress of the run in flight
+    name = models.CharField(max_length=50, primary_key=True)
+    watermark = models.DateTimeField(null=True, blank=True)
+    run_id = models.CharField(max_length=32, blank=True, default='')
+    # bookingCreated[gt] of the run's next query, moved up to its last committed booking after every page
+    run_since = models.DateTimeField(null=True, blank=True)
+    run_newest = models.DateTimeField(null=True, blank=True)
+    # Pages already committed from run_since; only non-zero while a whole page shares one creation instant
+    last_page = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} - {self.watermark}"
+
+
+class APIKey(models.Model):
+    # Only a SHA-256 of the key is stored; the key itself is shown once when created
+    name = models.CharField(max_length=100)
+    key_hash = models.CharField(max_length=64, unique=True)
+    is_active = models.BooleanField(default=True)
+    # Cost units per minute on /bookings/; empty uses API_RATE_LIMIT, 0 means unlimited
+    rate_limit = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+    @staticmethod
+    def hash_key(key):
+        return hashlib.sha256(key.encode()).hexdigest()
@@ -0,0 +1,55 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from django.db.models import Q, QuerySet
+
+from bookings.models import Booking
+
+Cursor = Tuple[datetime, str]
+
+# Keyset order; id breaks ties between bookings created at the same instant
+KEYSET_ORDERING = ('-booking_created', '-id')
+
+
+def encode_cursor(booking: Booking) -> str:
+    payload = json.dumps([booking.booking_created.isoformat(), booking.id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        booking_created, booking_id = json.loads(payload)
+        return datetime.fromisoformat(booking_created), str(booking_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def paginate(query: QuerySet, cursor: Optional[Cursor], limit: int) -> Tuple[List[Booking], Optional[str]]:
+    # Fetch one extra row to know whether another page exists
+    return _page(list(_keyset_query(query, cursor)[:limit + 1]), limit)
+
+
+async def apaginate(query: QuerySet, cursor: Optional[Cursor], limit: int) -> Tuple[List[Booking], Optional[str]]:
+    return _page([booking async for booking in _keyset_query(query, cursor)[:limit + 1]], limit)
+
+
+def _keyset_query(query: QuerySet, cursor: Optional[Cursor]) -> QuerySet:
+    query = query.order_by(*KEYSET_ORDERING)
+    if cursor:
+        booking_created, booking_id = cursor
+        query = query.filter(
+            Q(booking_created__lt=booking_created) |
+            Q(booking_created=booking_created, id__lt=booking_id)
+        )
+    return query
+
+
+def _page(bookings: List[Booking], limit: int) -> Tuple[List[Booking], Optional[str]]:
+    if len(bookings) <= limit:
+        return bookings, None
+    bookings = bookings[:limit]
+    return bookings, encode_cursor(bookings[-1])
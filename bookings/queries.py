@@ -0,0 +1,13 @@
+from django.db.models import QuerySet
+
+from bookings.models import Booking
+from bookings.request import Request
+
+
+def filter_bookings(req: Request) -> QuerySet:
+    query = Booking.objects.all()
+    if req.start_time:
+        query = query.filter(booking_created__gte=req.start_time)
+    if req.end_time:
+        query = query.filter(booking_created__lte=req.end_time)
+    return query
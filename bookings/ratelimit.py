@@ -0,0 +1,101 @@
+import logging
+import time
+from typing import Optional
+
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+# Refills `rate` tokens per second up to `capacity`, using the Redis clock so all workers agree.
+# Returns the seconds to wait before `requested` tokens are available (0 when they were taken).
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local wait = 0
+if tokens >= requested then
+    tokens = tokens - requested
+else
+    wait = (requested - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+
+# Generic cell rate algorithm: the key holds the theoretical arrival time (TAT) of the next request.
+# Admits `cost` units when that does not push TAT more than `burst` units ahead of now. Returns the
+# seconds until the request would be admitted (0 when it was admitted and counted).
+GCRA_SCRIPT = """
+local interval = 1 / tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local tat = math.max(tonumber(redis.call('GET', KEYS[1])) or now, now)
+local new_tat = tat + cost * interval
+local allow_at = new_tat - burst * interval
+if allow_at > now then
+    return tostring(allow_at - now)
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000) + 1)
+return '0'
+"""
+
+
+class RedisLimiter:
+    # Runs `script` atomically in Redis and returns its wait time in seconds. The registered script
+    # is shared per class, so limiters are cheap enough to create per request.
+    script = None
+    _registered = None
+    _warned = False
+
+    def __init__(self, key: str, rate: float, capacity: int):
+        self.key = key
+        self.rate = rate
+        self.capacity = capacity
+
+    def _get_script(self):
+        cls = type(self)
+        if cls._registered is None:
+            cls._registered = get_redis_connection('default').register_script(cls.script)
+        return cls._registered
+
+    def acquire(self, tokens: int = 1) -> float:
+        # Fails open: without Redis the limit is not enforced rather than blocking callers
+        try:
+            return float(self._get_script()(keys=[self.key], args=[self.rate, self.capacity, tokens]))
+        except (RedisError, NotImplementedError) as e:
+            if not type(self)._warned:
+                logger.warning(f"Rate limiter {self.key} unavailable, not limiting: {str(e)}")
+                type(self)._warned = True
+            return 0.0
+
+
+class TokenBucket(RedisLimiter):
+    script = TOKEN_BUCKET_SCRIPT
+
+    def wait(self, tokens: int = 1, timeout: Optional[float] = None) -> bool:
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            delay = self.acquire(tokens)
+            if delay <= 0:
+                return True
+            if deadline is not None and time.monotonic() + delay > deadline:
+                return False
+            time.sleep(delay)
+
+
+class GCRA(RedisLimiter):
+    script = GCRA_SCRIPT
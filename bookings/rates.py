@@ -0,0 +1,178 @@
+import logging
+import math
+import os
+import threading
+import time
+from array import array
+from datetime import date, datetime
+from decimal import Context, Decimal
+from io import BytesIO
+from typing import Dict, Iterable, Optional
+from zipfile import ZipFile
+
+from currency_converter import CURRENCY_FILE, RateNotFoundError
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_CURRENCY = 'EUR'
+COEFFICIENT_PRECISION = Decimal('0.0001')
+# Significant digits of a cross-rate; only converted amounts are rounded to cents
+CROSS_RATE_CONTEXT = Context(prec=12)
+
+
+class RateTable:
+    """
+    EUR reference rates from an ECB history file, stored as one compact
+    float array per currency indexed by day offset. Holidays and weekends
+    inside a currency's range carry the previous business day's rate.
+    """
+
+    def __init__(self, first_date: date, last_date: date, rates: Dict[str, array]):
+        self.first_date = first_date
+        self.last_date = last_date
+        self._rates = rates
+
+    @classmethod
+    def from_file(cls, path: str) -> 'RateTable':
+        with open(path, 'rb') as f:
+            content = f.read()
+
+        if path.endswith('.zip'):
+            zip_file = ZipFile(BytesIO(content))
+            lines = [
+                line
+                for name in zip_file.namelist()
+                for line in zip_file.read(name).decode('utf-8').splitlines()
+            ]
+        else:
+            lines = content.decode('utf-8').splitlines()
+        return cls.from_lines(lines)
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[str]) -> 'RateTable':
+        lines = iter(lines)
+        header = [currency.strip() for currency in next(lines).strip().split(',')[1:]]
+
+        rows = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            values = line.split(',')
+            rows.append((date.fromisoformat(values[0].strip()), values[1:]))
+        if not rows:
+            raise ValueError("Rates file contains no data")
+
+        first_date = min(day for day, _ in rows)
+        last_date = max(day for day, _ in rows)
+        size = (last_date - first_date).days + 1
+
+        rates = {}
+        for index, currency in enumerate(header):
+            if not currency:
+                continue
+            values = array('d', [math.nan]) * size
+            for day, row in rows:
+                value = row[index].strip() if index < len(row) else ''
+                if value and value != 'N/A':
+                    values[(day - first_date).days] = float(value)
+            cls._fill_missing(values)
+            rates[currency] = values
+
+        return cls(first_date, last_date, rates)
+
+    @staticmethod
+    def _fill_missing(values: array) -> None:
+        known = [i for i, value in enumerate(values) if not math.isnan(value)]
+        if not known:
+            return
+        last_value = values[known[0]]
+        for i in range(known[0], known[-1] + 1):
+            if math.isnan(values[i]):
+                values[i] = last_value
+            else:
+                last_value = values[i]
+
+    @property
+    def currencies(self):
+        return set(self._rates) | {REFERENCE_CURRENCY}
+
+    def rate(self, currency: str, day: Optional[date] = None) -> Decimal:
+        if currency == REFERENCE_CURRENCY:
+            return Decimal(1)
+        if currency not in self._rates:
+            raise ValueError(f"{currency} is not a supported currency")
+
+        if isinstance(day, datetime):
+            day = day.date()
+        if day is None or day > self.last_date:
+            day = self.last_date
+        offset = (day - self.first_date).days
+        value = self._rates[currency][offset] if offset >= 0 else math.nan
+        if math.isnan(value):
+            raise RateNotFoundError(f"{currency} has no rate for {day}")
+        return Decimal(repr(value))
+
+    def coefficient(self, currency: str, day: Optional[date] = None) -> Decimal:
+        return self.rate(currency, day).quantize(COEFFICIENT_PRECISION)
+
+    def cross_rate(self, from_currency: str, to_currency: str, day: Optional[date] = None) -> Decimal:
+        # Not rounded to decimal places: 1 IDR is 0.0000539 EUR
+        if from_currency == to_currency:
+            return Decimal(1)
+        return CROSS_RATE_CONTEXT.divide(self.rate(to_currency, day), self.rate(from_currency, day))
+
+
+_table: Optional[RateTable] = None
+_table_path: Optional[str] = None
+_table_mtime: Optional[float] = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def _rates_file() -> str:
+    return getattr(settings, 'CURRENCY_RATES_FILE', None) or CURRENCY_FILE
+
+
+def get_rate_table() -> RateTable:
+    global _checked_at
+
+    interval = getattr(settings, 'CURRENCY_RATES_CHECK_INTERVAL', 60)
+    if _table is not None and time.monotonic() - _checked_at < interval:
+        return _table
+
+    with _lock:
+        if _table is None or time.monotonic() - _checked_at >= interval:
+            path = _table_path or _rates_file()
+            mtime = _get_mtime(path)
+            if _table is None or (mtime is not None and mtime != _table_mtime):
+                _load(path, mtime)
+            _checked_at = time.monotonic()
+    return _table
+
+
+def refresh_rate_table(path: Optional[str] = None) -> RateTable:
+    # Swaps the process-wide table; requests already holding the old one finish with it
+    path = path or _rates_file()
+    with _lock:
+        _load(path, _get_mtime(path))
+    return _table
+
+
+def _get_mtime(path: str) -> Optional[float]:
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def _load(path: str, mtime: Optional[float]) -> None:
+    global _table, _table_path, _table_mtime, _checked_at
+
+    started = time.monotonic()
+    _table = RateTable.from_file(path)
+    _table_path = path
+    _table_mtime = mtime
+    _checked_at = time.monotonic()
+    logger.info(f"Loaded exchange rates from {path} up to {_table.last_date} in {_checked_at - started:.3f}s")
@@ -1,26 +1,131 @@
-from currency_converter import CurrencyConverter, RateNotFoundError
+import threading
+from collections import OrderedDict
+from currency_converter import RateNotFoundError
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple, Union
 from dataclasses import dataclass
 from decimal import Decimal
 
-@dataclass
+from django.conf import settings
+from django.utils import timezone
+
+from bookings.pagination import Cursor, decode_cursor
+from bookings.rates import RateTable, get_rate_table
+
+# The query parameters a Request is parsed from
+PARAMS = ('currency', 'date[gt]', 'date[lt]', 'totalsOnly', 'limit', 'cursor', 'stream', 'groupBy', 'rateDate')
+
+# groupBy dimensions of the analytics endpoint; at most one of the time buckets
+GROUP_BY_DIMENSIONS = ('day', 'week', 'month', 'experience', 'status', 'rate', 'originalCurrency')
+TIME_DIMENSIONS = ('day', 'week', 'month')
+# Most currencies one request may convert to (currency=USD,GBP,EUR)
+MAX_CURRENCIES = 10
+
+
+class ParsedRequestCache:
+    """
+    Bounded LRU cache of parsed requests (or the error message they failed
+    with), keyed by their raw parameters. Emptied when the rate table is
+    swapped, since a parsed request carries its exchange rate.
+    """
+
+    def __init__(self):
+        self._entries: OrderedDict = OrderedDict()
+        self._table: Optional[RateTable] = None
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple, table: RateTable) -> Optional[Union['Request', str]]:
+        with self._lock:
+            if table is not self._table:
+                self._entries.clear()
+                self._table = table
+                return None
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: Tuple, table: RateTable, entry: Union['Request', str]) -> None:
+        with self._lock:
+            if table is not self._table:
+                return
+            self._entries[key] = entry
+            if len(self._entries) > settings.REQUEST_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._table = None
+
+
+parsed_requests = ParsedRequestCache()
+
+
+@dataclass(frozen=True, slots=True)
 class Request:
     requested_currency: str
     coefficient: Decimal
     start_time: Optional[datetime]
     end_time: Optional[datetime]
+    totals_only: bool = False
+    limit: Optional[int] = None
+    cursor: Optional[Cursor] = None
+    stream: bool = False
+    group_by: Tuple[str, ...] = ()
+    # Every requested currency in order, requested_currency first; empty means just requested_currency
+    requested_currencies: Tuple[str, ...] = ()
+    # rateDate=booking: convert at the rates of each booking's day instead of the latest ones
+    rates_by_booking_date: bool = False
+
+    @property
+    def currencies(self) -> Tuple[str, ...]:
+        return self.requested_currencies or (self.requested_currency,)
+
+    @property
+    def multi_currency(self) -> bool:
+        return len(self.currencies) > 1
 
     @classmethod
     def from_params(cls, params: Dict[str, str]) -> 'Request':
+        # Page size settings are part of the key so overriding them never serves a stale parse
+        key = tuple(params.get(name) for name in PARAMS) + (
+            settings.BOOKINGS_DEFAULT_PAGE_SIZE, settings.BOOKINGS_MAX_PAGE_SIZE
+        )
+        try:
+            hash(key)
+        except TypeError:
+            return cls._parse(params)
+
+        table = get_rate_table()
+        entry = parsed_requests.get(key, table)
+        if entry is None:
+            try:
+                entry = cls._parse(params)
+            except ValueError as e:
+                entry = str(e)
+            parsed_requests.set(key, table, entry)
+        if isinstance(entry, str):
+            raise ValueError(entry)
+        return entry
+
+    @classmethod
+    def _parse(cls, params: Dict[str, str]) -> 'Request':
         if 'currency' not in params:
             raise ValueError("Currency parameter is required")
         if not isinstance(params['currency'], str):
             raise ValueError("Currency must be a string")
-        requested_currency = params['currency'].upper()
+        requested_currencies = tuple(dict.fromkeys(
+            currency.strip().upper() for currency in params['currency'].split(',')
+        ))
+        if len(requested_currencies) > MAX_CURRENCIES:
+            raise ValueError(f"At most {MAX_CURRENCIES} currencies can be requested")
+        requested_currency = requested_currencies[0]
         
         try:
             coefficient = cls._get_currency_coefficient(requested_currency)
+            for currency in requested_currencies[1:]:
+                cls._get_currency_coefficient(currency)
         except ValueError as e:
             raise ValueError(str(e))
         
@@ -31,20 +136,38 @@ class Request:
             raise ValueError(str(e))
         if start_time and end_time and start_time > end_time:
             raise ValueError("Start time must be before end time")
+
+        totals_only = cls._parse_bool('totalsOnly', params.get('totalsOnly'))
+        stream = cls._parse_bool('stream', params.get('stream'))
+        limit = cls._parse_limit(params.get('limit'))
+        cursor = decode_cursor(params['cursor']) if params.get('cursor') else None
+        if cursor and not limit:
+            limit = settings.BOOKINGS_DEFAULT_PAGE_SIZE
+        if stream and limit:
+            raise ValueError("Streaming cannot be combined with pagination")
+        rates_by_booking_date = cls._parse_rate_date(params.get('rateDate'))
+        group_by = cls._parse_group_by(params.get('groupBy'))
+        if group_by and (totals_only or stream or limit):
+            raise ValueError("groupBy cannot be combined with totalsOnly, stream or pagination")
             
         return cls(
             requested_currency=requested_currency,
             coefficient=coefficient,
             start_time=start_time,
-            end_time=end_time
+            end_time=end_time,
+            totals_only=totals_only,
+            limit=limit,
+            cursor=cursor,
+            stream=stream,
+            group_by=group_by,
+            requested_currencies=requested_currencies,
+            rates_by_booking_date=rates_by_booking_date
         )
     
     @staticmethod
     def _get_currency_coefficient(currency: str) -> Decimal:
         try:
-            c = CurrencyConverter()
-            rate = c.convert(1, "EUR", currency)
-            return Decimal(str(rate)).quantize(Decimal('0.0001'))
+            return get_rate_table().coefficient(currency)
         except RateNotFoundError:
             raise ValueError(f"Invalid currency: {currency}")
     
@@ -54,6 +177,52 @@ class Request:
             return None
 
         try:
-            return datetime.fromisoformat(date_str)
+            value = datetime.fromisoformat(date_str)
         except ValueError:
             raise ValueError(f"Invalid date format: {date_str}")
+        # Naive dates are read in TIME_ZONE, as the ORM would, so they compare with dates carrying an offset
+        return timezone.make_aware(value) if timezone.is_naive(value) else value
+
+    @staticmethod
+    def _parse_bool(name: str, value: Optional[str]) -> bool:
+        if not value:
+            return False
+        if value.lower() in ('true', '1'):
+            return True
+        if value.lower() in ('false', '0'):
+            return False
+        raise ValueError(f"Invalid {name} value: {value}")
+
+    @staticmethod
+    def _parse_limit(value: Optional[str]) -> Optional[int]:
+        if not value:
+            return None
+        try:
+            limit = int(value)
+        except ValueError:
+            raise ValueError(f"Invalid limit: {value}")
+        if limit < 1 or limit > settings.BOOKINGS_MAX_PAGE_SIZE:
+            raise ValueError(f"Limit must be between 1 and {settings.BOOKINGS_MAX_PAGE_SIZE}")
+        return limit
+
+    @staticmethod
+    def _parse_rate_date(value: Optional[str]) -> bool:
+        if not value or value == 'latest':
+            return False
+        if value == 'booking':
+            return True
+        raise ValueError(f"Invalid rateDate value: {value}")
+
+    @staticmethod
+    def _parse_group_by(value: Optional[str]) -> Tuple[str, ...]:
+        if not value:
+            return ()
+        group_by = tuple(name.strip() for name in value.split(','))
+        for name in group_by:
+            if name not in GROUP_BY_DIMENSIONS:
+                raise ValueError(f"Invalid groupBy value: {name}")
+        if len(set(group_by)) != len(group_by):
+            raise ValueError("groupBy dimensions must not repeat")
+        if len([name for name in group_by if name in TIME_DIMENSIONS]) > 1:
+            raise ValueError("groupBy accepts only one of day, week and month")
+        return group_by
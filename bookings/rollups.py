@@ -0,0 +1,181 @@
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Set
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q, QuerySet, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from bookings.models import Booking, BookingDailyRollup, BookingRollupLock
+
+ROLLUP_FIELDS = ['total_price', 'participants', 'count']
+
+
+def day_start(day: date) -> datetime:
+    return datetime.combine(day, time.min, tzinfo=timezone.get_current_timezone())
+
+
+def local_day(value: datetime) -> date:
+    return timezone.localtime(value).date()
+
+
+def affected_days(bookings: List[Booking], existing: List[Booking]) -> Set[date]:
+    # Days the bookings are written to, plus the days `existing` bookings are stored under now
+    if not settings.BOOKINGS_DAILY_ROLLUPS:
+        return set()
+    days = {local_day(booking.booking_created) for booking in bookings}
+    if existing:
+        stored = Booking.objects.filter(id__in=[booking.id for booking in existing]).values_list(
+            'booking_created', flat=True
+        )
+        days.update(local_day(booking_created) for booking_created in stored)
+    return days
+
+
+def refresh_rollups(days: Iterable[date]) -> None:
+    """
+    Recomputes the rollups of `days` from their bookings. Runs in the caller's
+    transaction, after its booking writes, and holds each day's lock row until
+    that transaction ends: a concurrent page touching the same day waits, then
+    aggregates with this one's bookings committed, instead of overwriting the
+    day with totals that miss them.
+    """
+    days = set(days)
+    if not days:
+        return
+
+    with transaction.atomic():
+        _lock_days(days)
+        # Contiguous days are read with one range each, so the aggregate never spans untouched days
+        ranges = Q()
+        for first, last in _day_runs(sorted(days)):
+            ranges |= Q(booking_created__gte=day_start(first), booking_created__lt=day_start(last + timedelta(days=1)))
+        rollups = [rollup for rollup in _aggregate(Booking.objects.filter(ranges)) if rollup.day in days]
+
+        BookingDailyRollup.objects.filter(day__in=days).delete()
+        # Upserted in case rebuild_rollups, which takes no day locks, wrote the same rows meanwhile
+        BookingDailyRollup.objects.bulk_create(
+            rollups,
+            update_conflicts=True,
+            unique_fields=['day', 'original_currency', 'status'],
+            update_fields=ROLLUP_FIELDS,
+        )
+
+
+def _lock_days(days: Set[date]) -> None:
+    # Lock rows are created on first use and taken in day order, so two refreshes cannot deadlock.
+    # SQLite ignores select_for_update(), but it only ever runs one writing transaction at a time
+    days = sorted(days)
+    BookingRollupLock.objects.bulk_create([BookingRollupLock(day=day) for day in days], ignore_conflicts=True)
+    list(BookingRollupLock.objects.select_for_update().filter(day__in=days).order_by('day').values_list('day'))
+
+
+def rebuild_rollups() -> int:
+    with transaction.atomic():
+        BookingDailyRollup.objects.all().delete()
+        rollups = BookingDailyRollup.objects.bulk_create(_aggregate(Booking.objects.all()), batch_size=1000)
+    return len(rollups)
+
+
+def totals_queries(start_time: Optional[datetime], end_time: Optional[datetime], by_day: bool = False) -> List[QuerySet]:
+    """
+    Per-currency totals of bookings created within [start_time, end_time],
+    as querysets of {'original_currency', 'total'} rows to be added up: the
+    rollups of the days fully inside the window plus the raw bookings of the
+    partial days at either end. With `by_day` the rows are per currency and
+    day, and carry a 'day' as well.
+    """
+    start_time = _aware(start_time)
+    end_time = _aware(end_time)
+    first_day = None
+    if start_time:
+        first_day = local_day(start_time)
+        if day_start(first_day) < start_time:
+            first_day += timedelta(days=1)
+    # A day is covered once the window reaches the start of the next one
+    last_day = local_day(end_time) - timedelta(days=1) if end_time else None
+
+    bookings = Booking.objects.order_by()
+    if first_day and last_day and first_day > last_day:
+        return [booking_totals(bookings.filter(_window(start_time, end_time)), by_day)]
+
+    rollups = BookingDailyRollup.objects.order_by()
+    if first_day:
+        rollups = rollups.filter(day__gte=first_day)
+    if last_day:
+        rollups = rollups.filter(day__lte=last_day)
+    fields = ['original_currency', 'day'] if by_day else ['original_currency']
+    queries = [_currency_totals(rollups.values(*fields), 'total_price')]
+    if start_time and day_start(first_day) > start_time:
+        queries.append(booking_totals(
+            bookings.filter(booking_created__gte=start_time, booking_created__lt=day_start(first_day)), by_day
+        ))
+    if end_time:
+        queries.append(booking_totals(
+            bookings.filter(booking_created__gte=day_start(last_day + timedelta(days=1)), booking_created__lte=end_time),
+            by_day
+        ))
+    return queries
+
+
+def booking_totals(query: QuerySet, by_day: bool = False) -> QuerySet:
+    # Grouped straight from Booking rows, with days in TIME_ZONE like the rollups. Summed as
+    # integer hundredths, which is exact in SQL, so the rows carry total_minor instead of total
+    if by_day:
+        query = query.annotate(day=TruncDate('booking_created')).values('original_currency', 'day')
+    else:
+        query = query.values('original_currency')
+    return query.annotate(total_minor=Sum('price_minor'))
+
+
+def merge_totals(rows: Iterable[Dict]) -> Dict:
+    # Keyed by currency, or by (currency, day) for rows grouped by day
+    totals = {}
+    for row in rows:
+        key = (row['original_currency'], row['day']) if 'day' in row else row['original_currency']
+        total = row['total'] if 'total' in row else Decimal(row['total_minor']).scaleb(-2)
+        totals[key] = totals.get(key, Decimal(0)) + total
+    return totals
+
+
+def _currency_totals(query: QuerySet, field: str) -> QuerySet:
+    return query.annotate(total=Sum(field))
+
+
+def _window(start_time: Optional[datetime], end_time: Optional[datetime]) -> Q:
+    window = Q()
+    if start_time:
+        window &= Q(booking_created__gte=start_time)
+    if end_time:
+        window &= Q(booking_created__lte=end_time)
+    return window
+
+
+def _aware(value: Optional[datetime]) -> Optional[datetime]:
+    # Naive request dates are read in TIME_ZONE, as the ORM does when filtering
+    if value is not None and timezone.is_naive(value):
+        return timezone.make_aware(value)
+    return value
+
+
+def _aggregate(query: QuerySet) -> List[BookingDailyRollup]:
+    rows = query.order_by().annotate(day=TruncDate('booking_created')).values(
+        'day', 'original_currency', 'status'
+    ).annotate(
+        total_minor=Sum('price_minor'),
+        participants=Sum('participants'),
+        count=Count('id'),
+    )
+    return [BookingDailyRollup(total_price=Decimal(row.pop('total_minor')).scaleb(-2), **row) for row in rows]
+
+
+def _day_runs(days: List[date]):
+    first = last = days[0]
+    for day in days[1:]:
+        if day != last + timedelta(days=1):
+            yield first, last
+            first = day
+        last = day
+    yield first, last
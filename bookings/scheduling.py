@@ -0,0 +1,67 @@
+import math
+from dataclasses import dataclass
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from bookings.ratelimit import TokenBucket
+
+LATENCY_KEY = 'bookings:upstream:latency'
+THROTTLED_KEY = 'bookings:upstream:throttled'
+# Weight of the newest sample in the latency moving average
+LATENCY_SMOOTHING = 0.2
+
+_upstream_bucket: Optional[TokenBucket] = None
+
+
+@dataclass
+class FanOutPlan:
+    parallelism: int
+    interval: float
+    page_size: Optional[int]
+
+
+def get_upstream_bucket() -> TokenBucket:
+    global _upstream_bucket
+
+    if _upstream_bucket is None:
+        _upstream_bucket = TokenBucket(
+            'bookings:upstream:bucket', settings.UPSTREAM_RATE_LIMIT, settings.UPSTREAM_RATE_BURST
+        )
+    return _upstream_bucket
+
+
+def record_upstream_latency(seconds: float) -> None:
+    # Shared through the cache so every worker schedules from the same picture
+    average = cache.get(LATENCY_KEY)
+    if average is not None:
+        seconds = average + LATENCY_SMOOTHING * (seconds - average)
+    cache.set(LATENCY_KEY, seconds, timeout=3600)
+
+
+def record_upstream_throttled() -> None:
+    cache.set(THROTTLED_KEY, True, timeout=settings.SYNC_THROTTLE_COOLDOWN)
+
+
+def plan_fan_out() -> FanOutPlan:
+    target = settings.SYNC_TARGET_LATENCY
+    latency = cache.get(LATENCY_KEY) or target
+    # Back off in proportion to how far upstream latency is above target, and halve after a 429
+    load = max(latency / target, 1.0)
+    parallelism = settings.SYNC_MAX_PARALLELISM / load
+    if cache.get(THROTTLED_KEY):
+        parallelism /= 2
+
+    page_size = None
+    if settings.EXTERNAL_API_PAGE_SIZE_PARAM:
+        page_size = int(min(
+            settings.SYNC_MAX_PAGE_SIZE,
+            max(settings.SYNC_MIN_PAGE_SIZE, settings.SYNC_MAX_PAGE_SIZE / load)
+        ))
+
+    return FanOutPlan(
+        parallelism=max(1, math.floor(parallelism)),
+        interval=max(1.0, latency * 1.5),
+        page_size=page_size,
+    )
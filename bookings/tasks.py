@@ -1,20 +1,67 @@
 import logging
-import requests
 import math
-from datetime import datetime
-from django.utils import timezone
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import islice
+from django.core.cache import cache
 from django.db import transaction
 
 from django.conf import settings
 from celery import shared_task
+from celery.signals import task_postrun
+import requests
 
-from bookings.models import Booking
+from bookings.cache import invalidate_bookings_cache
+from bookings.client import TransientUpstreamError, fetch_concurrently, get_json
+from bookings.ingest import build_bookings, ingest_bookings, parse_booking, partition_changes, update_bookings
+from bookings.metrics import SYNC_PAGE_STAGE_SECONDS, SYNC_ROWS, publish
+from bookings.models import Booking, INACTIVE_STATUSES, SyncState
+from bookings.scheduling import plan_fan_out
 
 logger = logging.getLogger(__name__)
 
 external_api_url = settings.EXTERNAL_API_URL
 external_api_key = settings.EXTERNAL_API_KEY
 
+ACTIVE_BOOKINGS_LOCK_KEY = 'bookings:lock:update_active_bookings'
+INCREMENTAL_SYNC_LOCK_KEY = 'bookings:lock:sync_latest_bookings'
+INCREMENTAL_SYNC_STATE = 'latest'
+
+
+class TaskLock:
+    # Truthy while acquired; extend() pushes the expiry `timeout` seconds out again
+    def __init__(self, key, timeout):
+        self.key = key
+        self.timeout = timeout
+        self.run_id = uuid.uuid4().hex
+        self.acquired = False
+
+    def __bool__(self):
+        return self.acquired
+
+    def extend(self):
+        # False once the lock expired or another run holds it, so this run can stop instead of overlapping
+        return cache.get(self.key) == self.run_id and cache.touch(self.key, self.timeout)
+
+
+@contextmanager
+def task_lock(key, timeout):
+    # Redis SET NX lock; yields a falsy TaskLock when another run holds it
+    lock = TaskLock(key, timeout)
+    lock.acquired = cache.add(key, lock.run_id, timeout=timeout)
+    try:
+        yield lock
+    finally:
+        if lock.acquired and cache.get(key) == lock.run_id:
+            cache.delete(key)
+
+
+@task_postrun.connect
+def publish_task_metrics(**kwargs):
+    # Lets /metrics/ on the web processes report this worker's counters too
+    publish()
+
 
 @shared_task
 def sync_all_bookings(is_sync=False):
@@ -23,12 +70,86 @@ def sync_all_bookings(is_sync=False):
 
 @shared_task
 def sync_latest_bookings():
-    latest_booking = Booking.objects.order_by('-booking_created').first()
-    base_params = {}
-    if latest_booking:
-        booking_created_gt = latest_booking.booking_created.isoformat()
-        base_params['bookingCreated[gt]'] = booking_created_gt
-        process_sync_pages(base_params, False)
+    with task_lock(INCREMENTAL_SYNC_LOCK_KEY, settings.INCREMENTAL_SYNC_LOCK_TIMEOUT) as lock:
+        if not lock:
+            logger.info("Previous incremental sync still running, skipping")
+            return
+        run_incremental_sync(lock)
+
+
+def run_incremental_sync(lock=None):
+    state, _ = SyncState.objects.get_or_create(name=INCREMENTAL_SYNC_STATE)
+    if state.run_id:
+        logger.info(f"Resuming incremental sync {state.run_id} from {state.run_since or 'the beginning'}")
+    else:
+        start_incremental_run(state)
+
+    while True:
+        # The checkpoint lets the next run resume from the last committed booking
+        if lock is not None and not lock.extend():
+            logger.warning(f"Incremental sync {state.run_id} lost its lock, stopping at {state.run_since}")
+            return
+        params = {'page': state.last_page + 1}
+        if state.run_since:
+            params['bookingCreated[gt]'] = state.run_since.isoformat()
+        response = fetch_bookings_page(params)
+        results = response.get('results', [])
+        if not results:
+            break
+
+        bookings = build_bookings(results)
+        with transaction.atomic():
+            stats = process_bookings(bookings)
+            advance_incremental_run(state, bookings)
+            state.save()
+        log_page_stats(params, stats)
+
+        if 'next' in response and not response['next']:
+            break
+
+    finish_incremental_run(state)
+
+
+def advance_incremental_run(state, bookings):
+    # Upstream lists bookings oldest first, so every booking up to the newest one of a committed page
+    # is stored. The next query starts from that booking instead of counting pages, which shift when
+    # bookings change upstream mid-run; it starts just before it so bookings created at the same
+    # instant are re-read (and skipped as unchanged) rather than missed
+    newest = max((booking.booking_created for booking in bookings), default=None)
+    since = newest - timedelta(microseconds=1) if newest else None
+    if since and (not state.run_since or since > state.run_since):
+        state.run_since = since
+        state.last_page = 0
+    else:
+        # A whole page created at the checkpoint instant: step past it by page number
+        state.last_page += 1
+    if newest and (not state.run_newest or newest > state.run_newest):
+        state.run_newest = newest
+
+
+def start_incremental_run(state):
+    since = state.watermark
+    if not since:
+        latest_booking = Booking.objects.order_by('-booking_created').first()
+        since = latest_booking.booking_created if latest_booking else None
+
+    # Re-read an overlap window so bookings that show up late upstream are not missed
+    state.run_id = uuid.uuid4().hex
+    state.run_since = since - timedelta(seconds=settings.INCREMENTAL_SYNC_OVERLAP) if since else None
+    state.run_newest = since
+    state.last_page = 0
+    state.save()
+    logger.info(f"Starting incremental sync {state.run_id} from {state.run_since or 'the beginning'}")
+
+
+def finish_incremental_run(state):
+    logger.info(f"Finished incremental sync {state.run_id}, watermark {state.run_newest}")
+    state.watermark = state.run_newest
+    state.run_id = ''
+    state.run_since = None
+    state.run_newest = None
+    state.last_page = 0
+    state.save()
 
 
 def process_sync_pages(base_params, is_sync=False):
@@ -38,88 +159,148 @@ def process_sync_pages(base_params, is_sync=False):
         items_per_page = len(response.get('results', []))
         
         if items_per_page > 0:
-            total_pages = math.ceil(total_items / items_per_page)
-
-            for page in range(1, total_pages + 1):
-                params = base_params.copy()
-                params['page'] = page
-                if is_sync:
-                    process_bookings_page(params=params)
-                else:
-                    process_bookings_page.delay(params=params)
-                
+            if is_sync:
+                total_pages = math.ceil(total_items / items_per_page)
+                pages = [{**base_params, 'page': page} for page in range(1, total_pages + 1)]
+                process_pages_concurrently(pages)
+            else:
+                schedule_pages(base_params, total_items, items_per_page)
+
     except Exception as e:
         logger.error(f"Error in bookings synchronization: {str(e)}")
         raise
 
 
+def schedule_pages(base_params, total_items, items_per_page):
+    # The page size is fixed for the whole sync because it decides the page numbers
+    plan = plan_fan_out()
+    if plan.page_size:
+        base_params = {**base_params, settings.EXTERNAL_API_PAGE_SIZE_PARAM: plan.page_size}
+        items_per_page = plan.page_size
+    total_pages = math.ceil(total_items / items_per_page)
+
+    logger.info(f"Scheduling {total_pages} bookings pages in waves")
+    schedule_page_wave(base_params, 1, total_pages)
+
+
 @shared_task
-def process_bookings_page(params):
+def schedule_page_wave(base_params, first_page, total_pages):
+    # Enqueues one wave sized from the current upstream latency and throttling, and the next wave
+    # once this one is due. Countdowns stay one interval long, well within the broker's
+    # visibility_timeout, and a slowdown mid-sync shrinks the waves still to come
+    plan = plan_fan_out()
+    last_page = min(first_page + plan.parallelism - 1, total_pages)
+
+    logger.info(f"Scheduling bookings pages {first_page}-{last_page} of {total_pages}")
+    for page in range(first_page, last_page + 1):
+        process_bookings_page.apply_async(kwargs={'params': {**base_params, 'page': page}})
+    if last_page < total_pages:
+        schedule_page_wave.apply_async(args=(base_params, last_page + 1, total_pages), countdown=plan.interval)
+
+
+@shared_task(
+    bind=True,
+    autoretry_for=(TransientUpstreamError, requests.ConnectionError, requests.Timeout),
+    retry_backoff=True,
+    retry_backoff_max=10 * 60,
+    retry_jitter=True,
+    max_retries=settings.UPSTREAM_MAX_RETRIES,
+)
+def process_bookings_page(self, params):
     try:
         response = fetch_bookings_page(params)
         with transaction.atomic():
-            process_bookings_from_response(response)
+            stats = process_bookings_from_response(response)
+        log_page_stats(params, stats)
+    except TransientUpstreamError as e:
+        logger.warning(f"Upstream unavailable for bookings page {params.get('page', 1)}: {str(e)}")
+        if e.retry_after:
+            raise self.retry(exc=e, countdown=e.retry_after)
+        raise
     except Exception as e:
         logger.error(f"Error processing bookings page {params.get('page', 1)}: {str(e)}")
         raise
 
 
+def process_pages_concurrently(pages):
+    # Downloads run ahead on a thread pool while this thread writes each page in order
+    for params, response, error in fetch_concurrently(fetch_bookings_page, pages, settings.SYNC_FETCH_CONCURRENCY):
+        if error:
+            logger.error(f"Error processing bookings page {params.get('page', 1)}: {str(error)}")
+            raise error
+        with transaction.atomic():
+            stats = process_bookings_from_response(response)
+        log_page_stats(params, stats)
+
+
+def log_page_stats(params, stats):
+    logger.info(
+        f"Bookings page {params.get('page', 1)}: {stats['inserted']} inserted, "
+        f"{stats['updated']} updated, {stats['unchanged']} unchanged, {stats['failed']} failed"
+    )
+
+
 def fetch_bookings_page(params):
-    res = requests.get(url=external_api_url, params=params, headers={'x-api-key': external_api_key})
-    res.raise_for_status()
-    
-    return res.json()
+    with SYNC_PAGE_STAGE_SECONDS.time(stage='fetch'):
+        return get_json(external_api_url, params=params, headers={'x-api-key': external_api_key})
 
 
 def process_bookings_from_response(response):
-    for booking_data in response['results']:
-        try:
-            parsed_booking = parse_booking(booking_data)
-            booking, created = Booking.objects.update_or_create(
-                id=parsed_booking['id'],
-                defaults=parsed_booking
-            )
-
-        except Exception as e:
-            logger.error(f"Error processing booking {booking_data.get('id', 'unknown')}: {str(e)}")
-            continue
+    return process_bookings(build_bookings(response['results']))
+
+
+def process_bookings(bookings):
+    # Malformed records were already logged and skipped; new and changed bookings are written in one statement
+    with SYNC_PAGE_STAGE_SECONDS.time(stage='write'):
+        stats = ingest_bookings(bookings)
+    for result, count in stats.items():
+        SYNC_ROWS.inc(count, result=result)
+    if stats['inserted'] or stats['updated']:
+        transaction.on_commit(invalidate_bookings_cache)
+    return stats
 
 
 @shared_task
 def update_active_bookings():
-    active_bookings = Booking.objects.exclude(
-        status__in=['CANCELLED', 'COMPLETED']
-    ).order_by('booking_created')
-
-    for booking in active_bookings:
-        try:
-            booking_data = fetch_single_booking(booking.id)
-            parsed_booking = parse_booking(booking_data)
-            
-            with transaction.atomic():
-                Booking.objects.filter(id=booking.id).update(**parsed_booking)
-                
-        except Exception as e:
-            logger.error(f"Error updating booking {booking.id}: {str(e)}")
-            continue
+    # A run that outlives the schedule makes the next one skip; the lock is extended before every
+    # chunk, so its timeout only has to cover one chunk
+    with task_lock(ACTIVE_BOOKINGS_LOCK_KEY, settings.ACTIVE_BOOKINGS_LOCK_TIMEOUT) as lock:
+        if not lock:
+            logger.info("Previous active bookings update still running, skipping")
+            return
+
+        chunk_size = settings.ACTIVE_BOOKINGS_CHUNK_SIZE
+        active_ids = Booking.objects.exclude(
+            status__in=INACTIVE_STATUSES
+        ).order_by('booking_created').values_list('id', flat=True).iterator(chunk_size=chunk_size)
 
+        updated = 0
+        while chunk := list(islice(active_ids, chunk_size)):
+            if not lock.extend():
+                logger.warning(f"Active bookings update lost its lock, stopping after {updated} updates")
+                break
+            updated += refresh_bookings(chunk)
 
-def parse_booking(booking):
-    return {
-        'id': booking['id'],
-        'code': booking['bookingCode'],
-        'status': booking['bookingStatus'],
-        'experience': booking['experience']['name'],
-        'rate': booking['rateName'],
-        'booking_created': timezone.make_aware(datetime.fromisoformat(booking['bookingCreated'].replace('Z', '+00:00'))),
-        'participants': sum(rate['quantity'] for rate in booking['ratesQuantity']),
-        'original_currency': booking['price']['finalRetailPrice']['currency'],
-        'price_original_currency': booking['price']['finalRetailPrice']['amount'],
-    }
+        if updated:
+            invalidate_bookings_cache()
+
+
+def refresh_bookings(booking_ids):
+    results = []
+    fetched = fetch_concurrently(fetch_single_booking, booking_ids, settings.ACTIVE_BOOKINGS_FETCH_CONCURRENCY)
+    for booking_id, booking_data, error in fetched:
+        if error:
+            logger.error(f"Error updating booking {booking_id}: {str(error)}")
+            continue
+        results.append(booking_data)
+
+    try:
+        _, changed, _ = partition_changes(build_bookings(results))
+        return update_bookings(changed)
+    except Exception as e:
+        logger.error(f"Error updating {len(results)} active bookings: {str(e)}")
+        return 0
 
 
 def fetch_single_booking(booking_id):
-    url = f"{external_api_url}/{booking_id}"
-    res = requests.get(url=url, headers={'x-api-key': external_api_key})
-    res.raise_for_status()
-    return res.json()
+    return get_json(f"{external_api_url}/{booking_id}", headers={'x-api-key': external_api_key})
@@ -0,0 +1,6 @@
+# Keeps tests independent of a running Redis
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
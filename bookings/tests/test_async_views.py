@@ -0,0 +1,100 @@
+import json
+from decimal import Decimal
+from unittest.mock import patch
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from . import TEST_CACHES
+from ..models import Booking
+from ..rollups import rebuild_rollups
+
+
+@override_settings(EXTERNAL_API_KEY='test-api-key-123', CACHES=TEST_CACHES, BOOKINGS_STREAM_CHUNK_SIZE=2)
+class AsyncBookingViewsTest(TestCase):
+    headers = {'X-API-KEY': 'test-api-key-123'}
+
+    def setUp(self):
+        cache.clear()
+        self.sync_client = APIClient()
+        self.sync_client.credentials(HTTP_X_API_KEY='test-api-key-123')
+        now = timezone.now()
+        for i, currency in enumerate(['USD', 'GBP', 'EUR', 'USD', 'CHF']):
+            Booking.objects.create(
+                id=f'test{i}',
+                code=f'BOOK{i}',
+                status='PENDING',
+                experience=f'Experience {i}',
+                rate='Standard',
+                booking_created=now - timezone.timedelta(hours=i),
+                participants=i + 1,
+                original_currency=currency,
+                price_original_currency=Decimal('10.50') * (i + 1),
+            )
+        rebuild_rollups()
+
+    async def assertSameAsSyncView(self, params):
+        expected = await sync_to_async(self.sync_client.get)('/bookings/', params)
+        await cache.aclear()
+        response = await self.async_client.get('/async/bookings/', params, headers=self.headers)
+
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.content, expected.content)
+        return response
+
+    async def test_matches_sync_view(self):
+        for params in (
+            {'currency': 'EUR'},
+            {'currency': 'USD', 'totalsOnly': 'true'},
+            {'currency': 'GBP', 'limit': 2},
+            {'currency': 'XYZ'},
+            {'currency': 'USD,GBP,EUR'},
+            {'currency': 'USD,CHF', 'totalsOnly': 'true'},
+            {'currency': 'GBP,EUR', 'limit': 2},
+            {'currency': 'USD', 'rateDate': 'booking'},
+            {'currency': 'USD,EUR', 'rateDate': 'booking', 'totalsOnly': 'true'},
+        ):
+            with self.subTest(params=params):
+                await self.assertSameAsSyncView(params)
+
+    async def test_pages_follow_cursor(self):
+        first = await self.assertSameAsSyncView({'currency': 'EUR', 'limit': 3})
+        cursor = first.json()['nextCursor']
+        second = await self.assertSameAsSyncView({'currency': 'EUR', 'limit': 3, 'cursor': cursor})
+        self.assertEqual([b['code'] for b in second.json()['bookings']], ['BOOK3', 'BOOK4'])
+
+    async def test_cached_response(self):
+        await self.async_client.get('/async/bookings/', {'currency': 'EUR'}, headers=self.headers)
+        await Booking.objects.filter(id='test0').adelete()
+
+        response = await self.async_client.get('/async/bookings/', {'currency': 'EUR'}, headers=self.headers)
+        self.assertEqual(len(response.json()['bookings']), 5)
+
+    async def test_streaming_matches_regular_response(self):
+        regular = await self.async_client.get('/async/bookings/', {'currency': 'GBP'}, headers=self.headers)
+        streamed = await self.async_client.get(
+            '/async/bookings/', {'currency': 'GBP', 'stream': 'true'}, headers=self.headers
+        )
+
+        self.assertTrue(streamed.streaming)
+        self.assertEqual(b''.join([chunk async for chunk in streamed.streaming_content]), regular.content)
+
+    async def test_streaming_ends_with_error_when_it_fails(self):
+        with patch('bookings.views.convert_rows', side_effect=[[], RuntimeError('boom')]):
+            streamed = await self.async_client.get(
+                '/async/bookings/', {'currency': 'GBP', 'stream': 'true'}, headers=self.headers
+            )
+            data = json.loads(b''.join([chunk async for chunk in streamed.streaming_content]))
+
+        self.assertEqual(data['error'], 'An unexpected error occurred while streaming bookings')
+        self.assertNotIn('totalPriceOriginalCurrency', data)
+
+    async def test_requires_api_key(self):
+        expected = await sync_to_async(APIClient().get)('/bookings/', {'currency': 'EUR'})
+        response = await self.async_client.get('/async/bookings/', {'currency': 'EUR'})
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.content, expected.content)
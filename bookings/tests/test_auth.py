@@ -1,7 +1,9 @@
+from unittest.mock import patch
 from django.test import TestCase, RequestFactory, override_settings
 from django.conf import settings
 from rest_framework import exceptions
-from ..auth import APIKeyAuthentication
+from ..auth import APIKeyAuthentication, api_key_store
+from ..models import APIKey
 
 
 @override_settings(EXTERNAL_API_KEY='test-api-key-123')
@@ -9,41 +11,102 @@ class APIKeyAuthenticationTest(TestCase):
     def setUp(self):
         self.auth = APIKeyAuthentication()
         self.factory = RequestFactory()
+        api_key_store.clear()
+        self.addCleanup(api_key_store.clear)
 
     def test_authentication_with_valid_key(self):
-        request = self.factory.get('/')
-        request.headers = {'x-api-key': 'test-api-key-123'}
+        request = self.factory.get('/', HTTP_X_API_KEY='test-api-key-123')
         
         result = self.auth.authenticate(request)
         self.assertEqual(result, (None, None))
 
     def test_authentication_without_key(self):
         request = self.factory.get('/')
-        request.headers = {}
         
         with self.assertRaises(exceptions.AuthenticationFailed) as context:
             self.auth.authenticate(request)
         self.assertEqual(str(context.exception), 'No API key provided')
 
     def test_authentication_with_invalid_key(self):
-        request = self.factory.get('/')
-        request.headers = {'x-api-key': 'invalid-key'}
+        request = self.factory.get('/', HTTP_X_API_KEY='invalid-key')
         
         with self.assertRaises(exceptions.AuthenticationFailed) as context:
             self.auth.authenticate(request)
         self.assertEqual(str(context.exception), 'Invalid API key')
 
     def test_authentication_with_wrong_header_case(self):
-        request = self.factory.get('/')
-        request.headers = {'X-API-KEY': 'test-api-key-123'}
+        request = self.factory.get('/', headers={'X-API-KEY': 'test-api-key-123'})
         
         result = self.auth.authenticate(request)
         self.assertEqual(result, (None, None))
 
     def test_authentication_with_empty_key(self):
-        request = self.factory.get('/')
-        request.headers = {'x-api-key': ''}
+        request = self.factory.get('/', HTTP_X_API_KEY='')
         
         with self.assertRaises(exceptions.AuthenticationFailed) as context:
             self.auth.authenticate(request)
-        self.assertEqual(str(context.exception), 'No API key provided') 
\ No newline at end of file
+        self.assertEqual(str(context.exception), 'No API key provided')
+
+    def test_authentication_with_stored_key(self):
+        api_key = APIKey.objects.create(name='partner', key_hash=APIKey.hash_key('partner-key'))
+        request = self.factory.get('/', HTTP_X_API_KEY='partner-key')
+
+        self.assertEqual(self.auth.authenticate(request), (None, api_key))
+        # Served from the in-process cache afterwards
+        with self.assertNumQueries(0):
+            self.assertEqual(self.auth.authenticate(request), (None, api_key))
+
+    def test_authentication_with_revoked_key(self):
+        APIKey.objects.create(name='partner', key_hash=APIKey.hash_key('partner-key'), is_active=False)
+        request = self.factory.get('/', HTTP_X_API_KEY='partner-key')
+
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.auth.authenticate(request)
+
+    def test_unknown_keys_are_cached(self):
+        request = self.factory.get('/', HTTP_X_API_KEY='invalid-key')
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.auth.authenticate(request)
+
+        with self.assertNumQueries(0), self.assertRaises(exceptions.AuthenticationFailed):
+            self.auth.authenticate(request)
+
+    def test_cached_keys_expire(self):
+        api_key = APIKey.objects.create(name='partner', key_hash=APIKey.hash_key('partner-key'))
+        request = self.factory.get('/', HTTP_X_API_KEY='partner-key')
+        self.auth.authenticate(request)
+        api_key.is_active = False
+        api_key.save()
+
+        with patch('bookings.auth.time.monotonic', return_value=10 ** 9):
+            with self.assertRaises(exceptions.AuthenticationFailed):
+                self.auth.authenticate(request)
+
+    @override_settings(API_KEY_CACHE_SIZE=2, API_KEY_UNKNOWN_CACHE_SIZE=2)
+    def test_cache_evicts_least_recently_used(self):
+        for name in ('first', 'second', 'third'):
+            APIKey.objects.create(name=name, key_hash=APIKey.hash_key(f'{name}-key'))
+        first = self.factory.get('/', HTTP_X_API_KEY='first-key')
+        second = self.factory.get('/', HTTP_X_API_KEY='second-key')
+        self.auth.authenticate(first)
+        self.auth.authenticate(second)
+        self.auth.authenticate(first)
+        self.auth.authenticate(self.factory.get('/', HTTP_X_API_KEY='third-key'))
+
+        with self.assertNumQueries(0):
+            self.auth.authenticate(first)
+        with self.assertNumQueries(1):
+            self.auth.authenticate(second)
+
+    @override_settings(API_KEY_CACHE_SIZE=2, API_KEY_UNKNOWN_CACHE_SIZE=2)
+    def test_unknown_keys_do_not_evict_known_ones(self):
+        APIKey.objects.create(name='partner', key_hash=APIKey.hash_key('partner-key'))
+        request = self.factory.get('/', HTTP_X_API_KEY='partner-key')
+        self.auth.authenticate(request)
+
+        for i in range(10):
+            with self.assertRaises(exceptions.AuthenticationFailed):
+                self.auth.authenticate(self.factory.get('/', HTTP_X_API_KEY=f'random-{i}'))
+
+        with self.assertNumQueries(0):
+            self.auth.authenticate(request)
@@ -0,0 +1,112 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlparse
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from requests import HTTPError
+from . import TEST_CACHES
+from ..client import TransientUpstreamError, fetch_concurrently, get_json
+from ..scheduling import THROTTLED_KEY
+from ..models import Booking
+from ..tasks import sync_all_bookings
+
+PAGE_SIZE = 3
+TOTAL_BOOKINGS = 10
+
+
+def make_booking(i):
+    return {
+        'id': f'stub-{i}',
+        'bookingCode': f'STUB{i}',
+        'bookingStatus': 'PENDING',
+        'experience': {'name': 'Stub Experience'},
+        'rateName': 'Standard',
+        'bookingCreated': f'2024-04-{i + 1:02d}T10:00:00',
+        'ratesQuantity': [{'quantity': 1}],
+        'price': {'finalRetailPrice': {'currency': 'EUR', 'amount': 10.0 + i}},
+    }
+
+
+class StubBookingsHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        self.server.client_ports.add(self.client_address[1])
+        url = urlparse(self.path)
+        if url.path == '/missing':
+            return self._send(404, {'detail': 'Not found'})
+        if url.path == '/throttled':
+            return self._send(429, {'detail': 'Slow down'}, {'Retry-After': '7'})
+        page = int(parse_qs(url.query).get('page', ['1'])[0])
+        start = (page - 1) * PAGE_SIZE
+        results = [make_booking(i) for i in range(start, min(start + PAGE_SIZE, TOTAL_BOOKINGS))]
+        self._send(200, {'count': TOTAL_BOOKINGS, 'results': results})
+
+    def _send(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ClientTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubBookingsHandler)
+        cls.server.requests = []
+        cls.server.client_ports = set()
+        cls.url = f'http://127.0.0.1:{cls.server.server_port}'
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.requests.clear()
+        self.server.client_ports.clear()
+
+    def test_get_json_reuses_connections(self):
+        for page in range(1, 4):
+            self.assertEqual(get_json(self.url, params={'page': page})['count'], TOTAL_BOOKINGS)
+        self.assertEqual(len(self.server.client_ports), 1)
+
+    def test_get_json_raises_for_status(self):
+        with self.assertRaises(HTTPError):
+            get_json(f'{self.url}/missing')
+
+    def test_get_json_raises_transient_error_when_throttled(self):
+        with self.assertRaises(TransientUpstreamError) as context:
+            get_json(f'{self.url}/throttled')
+        self.assertEqual(context.exception.retry_after, 7.0)
+        self.assertTrue(cache.get(THROTTLED_KEY))
+
+    def test_fetch_concurrently_keeps_order_and_reports_errors(self):
+        urls = [f'{self.url}?page=1', f'{self.url}/missing', f'{self.url}?page=2']
+        results = list(fetch_concurrently(get_json, urls, max_workers=2))
+
+        self.assertEqual([item for item, _, _ in results], urls)
+        self.assertEqual(results[0][1]['results'][0]['id'], 'stub-0')
+        self.assertIsInstance(results[1][2], HTTPError)
+        self.assertEqual(results[2][1]['results'][0]['id'], 'stub-3')
+
+    def test_sync_all_bookings_against_stub_server(self):
+        with patch('bookings.tasks.external_api_url', self.url):
+            sync_all_bookings(is_sync=True)
+
+        self.assertEqual(Booking.objects.count(), TOTAL_BOOKINGS)
+        self.assertEqual(Booking.objects.get(id='stub-9').code, 'STUB9')
@@ -0,0 +1,146 @@
+import csv
+import io
+import json
+import os
+import tempfile
+from decimal import Decimal
+from unittest.mock import patch
+import pyarrow.parquet as pq
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from . import TEST_CACHES
+from ..models import Booking
+
+
+@override_settings(EXTERNAL_API_KEY='test-api-key-123', CACHES=TEST_CACHES, BOOKINGS_STREAM_CHUNK_SIZE=2)
+class ExportTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_X_API_KEY='test-api-key-123')
+        now = timezone.now()
+        for i, currency in enumerate(['USD', 'GBP', 'EUR', 'USD', 'CHF']):
+            Booking.objects.create(
+                id=f'test{i}', code=f'BOOK{i}', status='PENDING', experience=f'Experience, "{i}"',
+                rate='Standard', booking_created=now - timezone.timedelta(hours=i, microseconds=i),
+                participants=i + 1, original_currency=currency,
+                price_original_currency=Decimal('10.30') * (i + 1)
+            )
+
+    def export(self, params):
+        response = self.client.get('/bookings/export/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        chunks = list(response.streaming_content)
+        return response, chunks
+
+    def test_csv_matches_bookings_response(self):
+        params = {'currency': 'EUR', 'date[gt]': (timezone.now() - timezone.timedelta(hours=3, minutes=30)).isoformat()}
+        expected = self.client.get('/bookings/', params).json()['bookings']
+        response, chunks = self.export(params)
+
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="bookings.csv"')
+        # One piece per chunk of two bookings
+        self.assertEqual(len(chunks), 2)
+        rows = list(csv.DictReader(io.StringIO(b''.join(chunks).decode())))
+        self.assertEqual([row['code'] for row in rows], [b['code'] for b in expected])
+        for row, booking in zip(rows, expected):
+            self.assertEqual(row['experience'], booking['experience'])
+            self.assertEqual(row['bookingCreated'], booking['bookingCreated'])
+            self.assertEqual(Decimal(row['priceRequestedCurrency']), Decimal(str(booking['priceRequestedCurrency'])))
+        self.assertEqual(rows[2]['priceOriginalCurrency'], '30.90')
+
+    def test_csv_with_several_currencies(self):
+        _, chunks = self.export({'currency': 'USD,GBP', 'fileFormat': 'csv'})
+        rows = list(csv.reader(io.StringIO(b''.join(chunks).decode())))
+        self.assertEqual(rows[0][-2:], ['priceRequestedCurrencyUSD', 'priceRequestedCurrencyGBP'])
+        self.assertEqual(rows[1][-2], '10.30')
+        self.assertEqual(len(rows), 6)
+
+    def test_empty_csv_has_header(self):
+        _, chunks = self.export({'currency': 'EUR', 'date[gt]': '2000-01-01', 'date[lt]': '2000-01-02'})
+        self.assertEqual(b''.join(chunks).decode().splitlines(), [
+            'code,experience,rate,bookingCreated,participants,originalCurrency,priceOriginalCurrency,'
+            'requestedCurrency,priceRequestedCurrency'
+        ])
+
+    def test_ndjson_lines_match_bookings_response(self):
+        expected = self.client.get('/bookings/', {'currency': 'GBP', 'rateDate': 'booking'}).json()['bookings']
+        response, chunks = self.export({'currency': 'GBP', 'rateDate': 'booking', 'fileFormat': 'ndjson'})
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual([json.loads(line) for line in b''.join(chunks).splitlines()], expected)
+
+    def test_format_from_accept_header(self):
+        response = self.client.get('/bookings/export/', {'currency': 'EUR'}, HTTP_ACCEPT='text/csv')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(len(list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))), 5)
+
+        response = self.client.get('/bookings/export/', {'currency': 'EUR'}, HTTP_ACCEPT='application/x-ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 5)
+
+    def test_errors_are_json_whatever_the_accept_header(self):
+        response = self.client.get('/bookings/export/', {'currency': 'XYZ'}, HTTP_ACCEPT='text/csv')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('error', response.json())
+
+    def test_invalid_requests(self):
+        for params in (
+            {'currency': 'EUR', 'fileFormat': 'xlsx'},
+            {'currency': 'EUR', 'totalsOnly': 'true'},
+            {'currency': 'EUR', 'limit': 10},
+            {'currency': 'XYZ'},
+        ):
+            response = self.client.get('/bookings/export/', params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def test_parquet_without_pyarrow(self):
+        with patch('bookings.export.pyarrow', None):
+            response = self.client.get('/bookings/export/', {'currency': 'EUR', 'fileFormat': 'parquet'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_parquet_round_trip(self):
+        expected = self.client.get('/bookings/', {'currency': 'USD,EUR'}).json()['bookings']
+        response, chunks = self.export({'currency': 'USD,EUR', 'fileFormat': 'parquet'})
+
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="bookings.parquet"')
+        table = pq.read_table(io.BytesIO(b''.join(chunks)))
+        # One row group per chunk of two bookings
+        self.assertEqual(pq.ParquetFile(io.BytesIO(b''.join(chunks))).num_row_groups, 3)
+        self.assertEqual(table.column('code').to_pylist(), [b['code'] for b in expected])
+        self.assertEqual(table.column('priceOriginalCurrency')[0].as_py(), Decimal('10.30'))
+        self.assertEqual(
+            table.column('priceRequestedCurrencyUSD').to_pylist(),
+            [Decimal(str(b['priceRequestedCurrencies']['USD'])) for b in expected]
+        )
+
+    def test_command_writes_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bookings.ndjson')
+            stderr = io.StringIO()
+            call_command('export_bookings', '--currency', 'CHF', '--format', 'ndjson', '--output', path, stderr=stderr)
+            with open(path, 'rb') as f:
+                lines = f.read().splitlines()
+
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(json.loads(lines[0])['requestedCurrency'], 'CHF')
+        self.assertIn('Exported 5 bookings', stderr.getvalue())
+
+    def test_command_writes_to_stdout(self):
+        stdout = io.BytesIO()
+        call_command('export_bookings', '--currency', 'EUR', stdout=stdout, stderr=io.StringIO())
+        rows = list(csv.DictReader(io.StringIO(stdout.getvalue().decode())))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['requestedCurrency'], 'EUR')
+
+    def test_command_rejects_invalid_currency(self):
+        with self.assertRaises(CommandError):
+            call_command('export_bookings', '--currency', 'XYZ', '--output', os.devnull)
@@ -0,0 +1,147 @@
+import logging
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from . import TEST_CACHES
+from .. import log, metrics
+from ..log import BackgroundFileHandler
+from ..metrics import INDEX_KEY, Counter, Histogram, collect, publish, render, snapshot
+from ..models import Booking
+from ..tasks import process_bookings_from_response
+
+
+@override_settings(EXTERNAL_API_KEY='test-api-key-123', CACHES=TEST_CACHES, METRICS_PUBLISH_INTERVAL=3600)
+class MetricsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        for metric in metrics.registry:
+            metric.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_X_API_KEY='test-api-key-123')
+        Booking.objects.create(
+            id='test1', code='BOOK1', status='PENDING', experience='Tour', rate='Standard',
+            booking_created=timezone.now() - timedelta(hours=1), participants=2,
+            original_currency='USD', price_original_currency=Decimal('100.00')
+        )
+
+    def test_render_prometheus_text(self):
+        registry = list(metrics.registry)
+        try:
+            counter = Counter('test_events_total', 'Events.', ['kind'])
+            histogram = Histogram('test_duration_seconds', 'Durations.', buckets=(0.1, 1.0))
+            counter.inc(kind='a"b')
+            counter.inc(2, kind='a"b')
+            histogram.observe(0.05)
+            histogram.observe(0.5)
+            histogram.observe(5)
+            text = render({'test_events_total': counter.snapshot(), 'test_duration_seconds': histogram.snapshot()})
+        finally:
+            metrics.registry[:] = registry
+
+        self.assertIn('# TYPE test_events_total counter\ntest_events_total{kind="a\\"b"} 3\n', text)
+        self.assertIn(
+            '# TYPE test_duration_seconds histogram\n'
+            'test_duration_seconds_bucket{le="0.1"} 1\n'
+            'test_duration_seconds_bucket{le="1.0"} 2\n'
+            'test_duration_seconds_bucket{le="+Inf"} 3\n'
+            'test_duration_seconds_sum 5.55\n'
+            'test_duration_seconds_count 3\n',
+            text
+        )
+
+    def test_fetch_records_stages_and_statuses(self):
+        self.client.get('/bookings/', {'currency': 'EUR'})
+        self.client.get('/bookings/', {'currency': 'EUR'})
+        self.client.get('/bookings/', {'currency': 'XYZ'})
+        APIClient().get('/bookings/', {'currency': 'EUR'})
+
+        values = snapshot()
+        stages = values['bookings_request_stage_seconds']
+        self.assertEqual(stages[('parse',)][-1], 3)
+        self.assertEqual(stages[('query',)][-1], 1)
+        self.assertEqual(stages[('convert',)][-1], 1)
+        # Every response body is serialized, the 403 included
+        self.assertEqual(stages[('serialize',)][-1], 4)
+        self.assertEqual(values['bookings_requests_total'], {('200',): 2, ('400',): 1, ('403',): 1})
+        self.assertEqual(values['bookings_response_cache_total'], {('miss',): 1, ('hit',): 1})
+
+    def test_scrape_endpoint_merges_published_processes(self):
+        self.client.get('/bookings/', {'currency': 'EUR'})
+        # Another process (a Celery worker, say) published a page of synced bookings
+        cache.set('bookings:metrics:worker:1', {'bookings_sync_rows_total': {('inserted',): 5}})
+        cache.set(INDEX_KEY, ['bookings:metrics:worker:1', 'bookings:metrics:gone:2'])
+
+        response = self.client.get('/metrics/')
+
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        text = response.content.decode()
+        self.assertIn('bookings_requests_total{status="200"} 1\n', text)
+        self.assertIn('bookings_sync_rows_total{result="inserted"} 5\n', text)
+        self.assertEqual(cache.get(INDEX_KEY), ['bookings:metrics:worker:1'])
+
+    @override_settings(METRICS_TOKEN='scrape-token', METRICS_ALLOWED_IPS=['10.0.0.5'])
+    def test_scrape_endpoint_requires_token_or_allowed_address(self):
+        client = APIClient()
+        self.assertEqual(client.get('/metrics/').status_code, 403)
+        self.assertEqual(client.get('/metrics/', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(client.get('/metrics/', HTTP_AUTHORIZATION='Bearer scrape-token').status_code, 200)
+        self.assertEqual(client.get('/metrics/', REMOTE_ADDR='10.0.0.5').status_code, 200)
+        # An API key is not enough
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+
+    def test_published_snapshot_is_not_counted_twice(self):
+        self.client.get('/bookings/', {'currency': 'EUR'})
+        publish(force=True)
+        self.assertEqual(collect()['bookings_requests_total'], {('200',): 1})
+
+    def test_sync_records_page_stages_and_rows(self):
+        booking = {
+            'id': '123', 'bookingCode': 'ABC123', 'bookingStatus': 'PENDING',
+            'experience': {'name': 'Tour'}, 'rateName': 'Standard', 'bookingCreated': '2024-04-11T10:00:00',
+            'ratesQuantity': [{'quantity': 2}], 'price': {'finalRetailPrice': {'currency': 'USD', 'amount': 10.5}},
+        }
+        process_bookings_from_response({'results': [booking, {'id': 'broken'}]})
+        process_bookings_from_response({'results': [booking]})
+
+        values = snapshot()
+        self.assertEqual(values['bookings_sync_page_stage_seconds'][('parse',)][-1], 2)
+        self.assertEqual(values['bookings_sync_page_stage_seconds'][('write',)][-1], 2)
+        self.assertEqual(
+            values['bookings_sync_rows_total'],
+            {('inserted',): 1, ('updated',): 0, ('unchanged',): 1, ('failed',): 0, ('invalid',): 1}
+        )
+
+
+class BackgroundFileHandlerTest(TestCase):
+    def test_writes_records_from_a_background_thread(self):
+        path = os.path.join(tempfile.mkdtemp(), 'test.log')
+        handler = BackgroundFileHandler(path)
+        handler.setFormatter(logging.Formatter('{levelname}: {message}', style='{'))
+        logger = logging.getLogger('bookings.tests.background')
+        logger.addHandler(handler)
+        logger.propagate = False
+        try:
+            logger.warning('first')
+            logger.warning('second %s', 'message')
+        finally:
+            logger.removeHandler(handler)
+            handler.close()
+
+        with open(path) as f:
+            self.assertEqual(f.read(), 'WARNING: first\nWARNING: second message\n')
+
+    def test_close_stops_the_writer_once(self):
+        handler = BackgroundFileHandler(os.path.join(tempfile.mkdtemp(), 'test.log'))
+        self.assertTrue(handler.running)
+        self.assertIn(handler, log._handlers)
+
+        handler.close()
+        handler.flush_and_stop()
+
+        self.assertFalse(handler.running)
+        self.assertNotIn(handler, log._handlers)
@@ -1,6 +1,7 @@
 from django.test import TestCase
 from django.core.exceptions import ValidationError
 from django.utils import timezone
+from decimal import Decimal
 from ..models import Booking
 
 
@@ -88,4 +89,13 @@ class BookingModelTest(TestCase):
         booking_data['experience'] = 'a' * 256
         with self.assertRaises(ValidationError):
             booking = Booking.objects.create(**booking_data)
-            booking.full_clean() 
\ No newline at end of file
+            booking.full_clean() 
+
+    def test_price_minor_follows_price(self):
+        booking = Booking.objects.create(**{**self.valid_booking_data, 'price_original_currency': Decimal('1234.05')})
+        self.assertEqual(booking.price_minor, 123405)
+
+        booking.price_original_currency = Decimal('0.10')
+        booking.save()
+        booking.refresh_from_db()
+        self.assertEqual(booking.price_minor, 10)
@@ -0,0 +1,75 @@
+import os
+import tempfile
+from datetime import date
+from decimal import Decimal
+from django.test import TestCase
+from currency_converter import CurrencyConverter, RateNotFoundError
+from .. import rates
+from ..rates import RateTable, get_rate_table, refresh_rate_table
+
+RATES_CSV = [
+    'Date,USD,GBP,CYP,',
+    '2024-04-08,1.0861,0.8579,N/A,',
+    '2024-04-05,1.0841,0.8566,N/A,',
+    '2024-04-04,1.0852,0.8570,0.5800,',
+]
+
+
+class RateTableTest(TestCase):
+    def setUp(self):
+        self.table = RateTable.from_lines(RATES_CSV)
+
+    def test_latest_rate(self):
+        self.assertEqual(self.table.rate('USD'), Decimal('1.0861'))
+        self.assertEqual(self.table.rate('EUR'), Decimal(1))
+
+    def test_rate_on_date(self):
+        self.assertEqual(self.table.rate('GBP', date(2024, 4, 5)), Decimal('0.8566'))
+
+    def test_weekend_falls_back_to_previous_business_day(self):
+        self.assertEqual(self.table.rate('USD', date(2024, 4, 6)), Decimal('1.0841'))
+        self.assertEqual(self.table.rate('USD', date(2024, 4, 7)), Decimal('1.0841'))
+
+    def test_date_after_last_uses_latest(self):
+        self.assertEqual(self.table.rate('USD', date(2030, 1, 1)), Decimal('1.0861'))
+
+    def test_missing_rate(self):
+        with self.assertRaises(RateNotFoundError):
+            self.table.rate('CYP')
+        with self.assertRaises(RateNotFoundError):
+            self.table.rate('USD', date(2024, 1, 1))
+
+    def test_unsupported_currency(self):
+        with self.assertRaises(ValueError):
+            self.table.rate('XYZ')
+
+    def test_cross_rate(self):
+        self.assertEqual(self.table.cross_rate('GBP', 'USD'), Decimal('1.26599836811'))
+        self.assertEqual(self.table.cross_rate('USD', 'USD'), Decimal(1))
+
+    def test_cross_rate_from_weak_currency_keeps_significant_digits(self):
+        table = RateTable.from_lines(['Date,IDR,USD,', '2024-04-08,17000.0,1.0800,'])
+        self.assertEqual(table.cross_rate('IDR', 'EUR'), Decimal('0.0000588235294118'))
+        self.assertEqual(table.cross_rate('IDR', 'USD'), Decimal('0.0000635294117647'))
+
+    def test_matches_currency_converter(self):
+        converter = CurrencyConverter()
+        table = get_rate_table()
+        for currency in ['USD', 'GBP', 'JPY', 'CHF', 'HUF']:
+            expected = Decimal(str(converter.convert(1, 'EUR', currency))).quantize(Decimal('0.0001'))
+            self.assertEqual(table.coefficient(currency), expected)
+
+
+class RefreshRateTableTest(TestCase):
+    def tearDown(self):
+        refresh_rate_table(rates.CURRENCY_FILE)
+
+    def test_refresh_swaps_table(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write('\n'.join(RATES_CSV))
+        try:
+            refresh_rate_table(f.name)
+            self.assertEqual(get_rate_table().last_date, date(2024, 4, 8))
+            self.assertEqual(get_rate_table().coefficient('USD'), Decimal('1.0861'))
+        finally:
+            os.unlink(f.name)
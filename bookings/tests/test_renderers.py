@@ -0,0 +1,73 @@
+import random
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from django.test import TestCase, override_settings
+from rest_framework.exceptions import ErrorDetail
+from rest_framework.renderers import JSONRenderer
+from ..conversion import ROW_FIELDS, convert_bookings, convert_rows
+from ..models import Booking
+from ..renderers import FastJSONRenderer, dumps, orjson
+from ..request import Request
+
+
+def sample_payload():
+    rnd = random.Random(7)
+    prices = [Decimal(rnd.randrange(0, 10 ** 10)) / 100 for _ in range(2000)]
+    prices += [Decimal('0.00'), Decimal('0.01'), Decimal('0.10'), Decimal('99999999.99'), Decimal('-12.50')]
+    created = [
+        datetime(2024, 4, 11, 10, 0, tzinfo=dt_timezone.utc),
+        datetime(2024, 4, 11, 10, 0, 0, 123456, tzinfo=dt_timezone.utc),
+        datetime(2024, 4, 11, 10, 0, tzinfo=dt_timezone(timedelta(hours=2))),
+        datetime(2024, 4, 11, 10, 0),
+    ]
+    return {
+        'bookings': [
+            {
+                'code': None if i % 11 == 0 else f'CODE{i}',
+                'experience': ['Tour', 'Visite guidée à Zürich', 'ツアー', 'Line\u2028break\u2029', 'Tab\tquote"\\'][i % 5],
+                'bookingCreated': created[i % len(created)],
+                'participants': i,
+                'priceOriginalCurrency': price,
+                'priceRequestedCurrency': (price * Decimal('1.0837')).quantize(Decimal('0.01')),
+            }
+            for i, price in enumerate(prices)
+        ],
+        'day': date(2024, 4, 11),
+        'error': ErrorDetail('Invalid API key', code='authentication_failed'),
+        'nextCursor': None,
+    }
+
+
+class FastJSONTest(TestCase):
+    def test_dumps_matches_drf_renderer(self):
+        payload = sample_payload()
+        expected = JSONRenderer().render(payload)
+        for fast in (True, False):
+            with self.subTest(fast=fast), override_settings(BOOKINGS_FAST_JSON=fast):
+                self.assertEqual(dumps(payload), expected)
+                self.assertEqual(FastJSONRenderer().render(payload), expected)
+
+    def test_uses_orjson_when_installed(self):
+        if orjson is None:
+            self.skipTest('orjson is not installed')
+        with override_settings(BOOKINGS_FAST_JSON=True):
+            self.assertEqual(dumps({'ok': True}), orjson.dumps({'ok': True}))
+
+    def test_indented_output_is_left_to_drf(self):
+        payload = {'price': Decimal('1.50')}
+        self.assertEqual(
+            FastJSONRenderer().render(payload, 'application/json; indent=2'),
+            JSONRenderer().render(payload, 'application/json; indent=2'),
+        )
+
+    def test_convert_rows_matches_convert_bookings(self):
+        for i, currency in enumerate(['USD', 'GBP', 'EUR', 'USD']):
+            Booking.objects.create(
+                id=f'b{i}', code=f'CODE{i}', status='PENDING', experience='Tour', rate='Standard',
+                booking_created=datetime(2024, 4, 11, i, tzinfo=dt_timezone.utc), participants=i + 1,
+                original_currency=currency, price_original_currency=Decimal('19.99') * (i + 1),
+            )
+        req = Request(requested_currency='CHF', coefficient=Decimal('1'), start_time=None, end_time=None)
+        rows = list(Booking.objects.values_list(*ROW_FIELDS))
+
+        self.assertEqual(convert_rows(rows, req), convert_bookings(list(Booking.objects.all()), req))
@@ -0,0 +1,62 @@
+import os
+import tempfile
+from dataclasses import FrozenInstanceError
+from decimal import Decimal
+from unittest.mock import patch
+from django.test import TestCase, override_settings
+from .. import rates
+from ..rates import refresh_rate_table
+from ..request import Request, parsed_requests
+from .test_rates import RATES_CSV
+
+
+class RequestCacheTest(TestCase):
+    def setUp(self):
+        parsed_requests.clear()
+
+    def test_identical_params_reuse_parsed_request(self):
+        params = {'currency': 'usd', 'date[gt]': '2024-04-01T00:00:00', 'ignored': 'x'}
+        req = Request.from_params(params)
+
+        self.assertIs(Request.from_params({**params, 'ignored': 'y'}), req)
+        self.assertIsNot(Request.from_params({**params, 'limit': '5'}), req)
+        self.assertEqual(req.requested_currency, 'USD')
+        with self.assertRaises(FrozenInstanceError):
+            req.limit = 5
+        self.assertEqual(hash(req), hash(Request.from_params({**params, 'currency': 'USD'})))
+
+    def test_invalid_params_are_cached(self):
+        with patch.object(Request, '_parse', wraps=Request._parse) as parse:
+            for _ in range(3):
+                with self.assertRaisesMessage(ValueError, 'XYZ is not a supported currency'):
+                    Request.from_params({'currency': 'XYZ'})
+        self.assertEqual(parse.call_count, 1)
+
+    @override_settings(REQUEST_CACHE_SIZE=2)
+    def test_least_recently_used_is_evicted(self):
+        with patch.object(Request, '_parse', wraps=Request._parse) as parse:
+            for currency in ('USD', 'GBP', 'USD', 'CHF', 'USD', 'GBP'):
+                Request.from_params({'currency': currency})
+        # GBP was evicted by CHF, USD never was
+        self.assertEqual(parse.call_count, 4)
+
+    def test_page_size_settings_are_part_of_the_key(self):
+        params = {'currency': 'EUR', 'cursor': 'WyIyMDI0LTA0LTA4VDEwOjAwOjAwKzAwOjAwIiwiaWQiXQ'}
+        with override_settings(BOOKINGS_DEFAULT_PAGE_SIZE=10):
+            self.assertEqual(Request.from_params(params).limit, 10)
+        with override_settings(BOOKINGS_DEFAULT_PAGE_SIZE=20):
+            self.assertEqual(Request.from_params(params).limit, 20)
+
+    def test_rate_table_refresh_empties_cache(self):
+        before = Request.from_params({'currency': 'USD'})
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write('\n'.join(RATES_CSV))
+        try:
+            refresh_rate_table(f.name)
+            after = Request.from_params({'currency': 'USD'})
+        finally:
+            os.unlink(f.name)
+            refresh_rate_table(rates.CURRENCY_FILE)
+
+        self.assertEqual(after.coefficient, Decimal('1.0861'))
+        self.assertNotEqual(before.coefficient, after.coefficient)
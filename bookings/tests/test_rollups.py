@@ -0,0 +1,144 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from django.core.management import call_command
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from ..ingest import build_bookings, ingest_bookings, update_bookings
+from ..models import Booking, BookingDailyRollup, BookingRollupLock
+from ..rollups import local_day, merge_totals, rebuild_rollups, refresh_rollups, totals_queries
+
+START = datetime(2024, 4, 1, tzinfo=dt_timezone.utc)
+
+
+def upstream_booking(i, hours, currency='USD', status='PENDING', amount='10.25'):
+    return {
+        'id': f'b{i}',
+        'bookingCode': f'CODE{i}',
+        'bookingStatus': status,
+        'experience': {'name': 'Experience'},
+        'rateName': 'Standard',
+        'bookingCreated': (START + timedelta(hours=hours)).replace(tzinfo=None).isoformat(),
+        'ratesQuantity': [{'quantity': 2}],
+        'price': {'finalRetailPrice': {'currency': currency, 'amount': amount}},
+    }
+
+
+@override_settings(BOOKINGS_DAILY_ROLLUPS=True)
+class DailyRollupTest(TestCase):
+    def setUp(self):
+        # Five days of bookings every seven hours, including some exactly at midnight
+        currencies = ['USD', 'GBP', 'EUR']
+        ingest_bookings(build_bookings(
+            upstream_booking(i, i * 7 if i % 5 else i * 24 // 5, currencies[i % 3], amount=f'{10 + i}.25')
+            for i in range(18)
+        ))
+
+    def rollup_rows(self):
+        return sorted(BookingDailyRollup.objects.values_list(
+            'day', 'original_currency', 'status', 'total_price', 'participants', 'count'
+        ))
+
+    def assert_matches_rebuild(self):
+        incremental = self.rollup_rows()
+        rebuild_rollups()
+        self.assertEqual(self.rollup_rows(), incremental)
+
+    def raw_totals(self, start_time, end_time):
+        query = Booking.objects.order_by()
+        if start_time:
+            query = query.filter(booking_created__gte=start_time)
+        if end_time:
+            query = query.filter(booking_created__lte=end_time)
+        return {
+            row['original_currency']: row['total']
+            for row in query.values('original_currency').annotate(total=Sum('price_original_currency'))
+        }
+
+    def test_ingest_keeps_rollups_equal_to_a_rebuild(self):
+        incremental = self.rollup_rows()
+        self.assertTrue(incremental)
+        rebuild_rollups()
+        self.assertEqual(self.rollup_rows(), incremental)
+
+    def test_changed_bookings_move_between_rollups(self):
+        moved = upstream_booking(3, 100, 'CHF', status='CANCELLED')
+        stats = ingest_bookings(build_bookings([moved]))
+        self.assertEqual(stats['updated'], 1)
+
+        incremental = self.rollup_rows()
+        rebuild_rollups()
+        self.assertEqual(self.rollup_rows(), incremental)
+
+    def test_update_bookings_refreshes_rollups(self):
+        booking = build_bookings([upstream_booking(4, 1, 'GBP', status='COMPLETED', amount='99.99')])
+        update_bookings(booking)
+
+        incremental = self.rollup_rows()
+        rebuild_rollups()
+        self.assertEqual(self.rollup_rows(), incremental)
+
+    def test_saving_and_deleting_bookings_refreshes_rollups(self):
+        booking = Booking.objects.create(
+            id='direct', code='DIRECT', status='PENDING', experience='Experience', rate='Standard',
+            booking_created=START + timedelta(hours=30), participants=1, original_currency='CHF',
+            price_original_currency=Decimal('42.10')
+        )
+        self.assert_matches_rebuild()
+
+        booking.booking_created = START + timedelta(days=3, hours=2)
+        booking.status = 'CANCELLED'
+        booking.save()
+        self.assert_matches_rebuild()
+
+        Booking.objects.get(id='b2').delete()
+        self.assert_matches_rebuild()
+
+    def test_refresh_takes_a_lock_row_per_day(self):
+        days = {local_day(created) for created in Booking.objects.values_list('booking_created', flat=True)}
+        self.assertEqual(set(BookingRollupLock.objects.values_list('day', flat=True)), days)
+
+        refresh_rollups([START.date() - timedelta(days=1)])
+        self.assertEqual(BookingRollupLock.objects.count(), len(days) + 1)
+
+    def test_totals_match_raw_bookings(self):
+        windows = [
+            (None, None),
+            (START, None),
+            (None, START + timedelta(days=3)),
+            (START + timedelta(hours=5), START + timedelta(days=3, hours=2)),
+            (START + timedelta(days=1), START + timedelta(days=2)),
+            (START + timedelta(hours=1), START + timedelta(hours=20)),
+            (START + timedelta(hours=22), START + timedelta(days=1, hours=3)),
+            (START + timedelta(days=9), None),
+        ]
+        for start_time, end_time in windows:
+            with self.subTest(start_time=start_time, end_time=end_time):
+                totals = merge_totals(row for query in totals_queries(start_time, end_time) for row in query)
+                self.assertEqual(totals, self.raw_totals(start_time, end_time))
+
+    def test_naive_window_is_read_in_time_zone(self):
+        start_time, end_time = datetime(2024, 4, 1, 12), datetime(2024, 4, 4)
+        totals = merge_totals(row for query in totals_queries(start_time, end_time) for row in query)
+        self.assertEqual(totals, self.raw_totals(START + timedelta(hours=12), START + timedelta(days=3)))
+
+    def test_full_days_are_not_read_from_bookings(self):
+        day = START + timedelta(days=1)
+        expected = self.raw_totals(day, day + timedelta(days=1))
+        # Deleted behind the rollups' back, so only the rollups still know about them
+        Booking.objects.filter(booking_created__gte=day, booking_created__lt=day + timedelta(days=1)).delete()
+
+        totals = merge_totals(row for query in totals_queries(day, day + timedelta(days=1)) for row in query)
+        self.assertEqual(totals, expected)
+
+    def test_rebuild_command(self):
+        BookingDailyRollup.objects.all().delete()
+        call_command('rebuild_rollups', stdout=open('/dev/null', 'w'))
+        self.assertEqual(
+            BookingDailyRollup.objects.aggregate(count=Sum('count'))['count'], Booking.objects.count()
+        )
+
+    @override_settings(BOOKINGS_DAILY_ROLLUPS=False)
+    def test_not_maintained_when_disabled(self):
+        BookingDailyRollup.objects.all().delete()
+        ingest_bookings(build_bookings([upstream_booking(50, 3)]))
+        self.assertFalse(BookingDailyRollup.objects.exists())
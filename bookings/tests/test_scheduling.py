@@ -0,0 +1,75 @@
+from unittest.mock import patch
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from . import TEST_CACHES
+from ..scheduling import (
+    LATENCY_KEY,
+    THROTTLED_KEY,
+    plan_fan_out,
+    record_upstream_latency,
+    record_upstream_throttled,
+)
+from ..tasks import schedule_page_wave, schedule_pages
+
+
+@override_settings(
+    CACHES=TEST_CACHES,
+    SYNC_MAX_PARALLELISM=8,
+    SYNC_TARGET_LATENCY=1.0,
+    EXTERNAL_API_PAGE_SIZE_PARAM=None,
+    SYNC_MIN_PAGE_SIZE=20,
+    SYNC_MAX_PAGE_SIZE=200,
+)
+class SchedulingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_full_parallelism_when_upstream_is_fast(self):
+        record_upstream_latency(0.2)
+        plan = plan_fan_out()
+        self.assertEqual(plan.parallelism, 8)
+        self.assertEqual(plan.interval, 1.0)
+        self.assertIsNone(plan.page_size)
+
+    def test_parallelism_shrinks_with_latency(self):
+        cache.set(LATENCY_KEY, 4.0)
+        plan = plan_fan_out()
+        self.assertEqual(plan.parallelism, 2)
+        self.assertEqual(plan.interval, 6.0)
+
+    def test_parallelism_halves_after_throttling(self):
+        record_upstream_throttled()
+        self.assertTrue(cache.get(THROTTLED_KEY))
+        self.assertEqual(plan_fan_out().parallelism, 4)
+
+    def test_latency_is_smoothed(self):
+        record_upstream_latency(1.0)
+        record_upstream_latency(2.0)
+        self.assertAlmostEqual(cache.get(LATENCY_KEY), 1.2)
+
+    @override_settings(EXTERNAL_API_PAGE_SIZE_PARAM='pageSize')
+    def test_page_size_adapts_when_configured(self):
+        self.assertEqual(plan_fan_out().page_size, 200)
+        cache.set(LATENCY_KEY, 4.0)
+        self.assertEqual(plan_fan_out().page_size, 50)
+
+    @patch('bookings.tasks.schedule_page_wave.apply_async')
+    @patch('bookings.tasks.process_bookings_page.apply_async')
+    def test_schedule_pages_in_waves(self, mock_apply_async, mock_next_wave):
+        cache.set(LATENCY_KEY, 4.0)
+        schedule_pages({'bookingCreated[gt]': 'x'}, total_items=50, items_per_page=10)
+
+        # Only the first wave is enqueued now; the next one is planned when it is due
+        self.assertEqual([c.kwargs['kwargs']['params']['page'] for c in mock_apply_async.call_args_list], [1, 2])
+        self.assertTrue(all('countdown' not in c.kwargs for c in mock_apply_async.call_args_list))
+        self.assertEqual(mock_apply_async.call_args.kwargs['kwargs']['params']['bookingCreated[gt]'], 'x')
+        mock_next_wave.assert_called_once_with(args=({'bookingCreated[gt]': 'x'}, 3, 5), countdown=6.0)
+
+    @patch('bookings.tasks.schedule_page_wave.apply_async')
+    @patch('bookings.tasks.process_bookings_page.apply_async')
+    def test_each_wave_is_planned_from_current_latency(self, mock_apply_async, mock_next_wave):
+        record_upstream_latency(0.2)
+        schedule_page_wave({}, 3, 5)
+
+        self.assertEqual([c.kwargs['kwargs']['params']['page'] for c in mock_apply_async.call_args_list], [3, 4, 5])
+        mock_next_wave.assert_not_called()
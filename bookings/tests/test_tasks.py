@@ -1,17 +1,25 @@
 from unittest.mock import patch, MagicMock
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from datetime import datetime, timedelta
+from decimal import Decimal
 from bookings.tasks import (
+    ACTIVE_BOOKINGS_LOCK_KEY,
     sync_all_bookings,
     sync_latest_bookings,
     update_active_bookings,
     process_bookings_page,
+    process_bookings_from_response,
     parse_booking
 )
-from bookings.models import Booking
+from bookings.models import Booking, SyncState
+from bookings.tests import TEST_CACHES
 
 
+@override_settings(CACHES=TEST_CACHES)
 class TestBookingTasks(TestCase):
     def setUp(self):
         self.sample_booking_data = {
@@ -35,29 +43,112 @@ class TestBookingTasks(TestCase):
         sync_all_bookings(is_sync=True)
         mock_process_sync_pages.assert_called_once_with({}, is_sync=True)
 
-    @patch('bookings.tasks.process_sync_pages')
-    def test_sync_latest_bookings_with_existing(self, mock_process_sync_pages):
+    def page(self, *ids, next_page=None):
+        return {
+            'count': len(ids),
+            'next': next_page,
+            'results': [
+                {**self.sample_booking_data, 'id': booking_id, 'bookingCreated': f'2024-04-{int(booking_id):02d}T10:00:00'}
+                for booking_id in ids
+            ],
+        }
+
+    @override_settings(INCREMENTAL_SYNC_OVERLAP=3600)
+    @patch('bookings.tasks.fetch_bookings_page')
+    def test_sync_latest_bookings_with_existing(self, mock_fetch_page):
+        latest = timezone.now() - timedelta(days=1)
         Booking.objects.create(
             id='123',
             code='ABC123',
             status='CONFIRMED',
             experience='Test Experience',
             rate='Standard Rate',
-            booking_created=timezone.now() - timedelta(days=1),
+            booking_created=latest,
             participants=2,
             original_currency='USD',
             price_original_currency=100.00
         )
+        mock_fetch_page.return_value = {'count': 0, 'results': []}
 
         sync_latest_bookings()
-        mock_process_sync_pages.assert_called_once()
-        call_args = mock_process_sync_pages.call_args[0][0]
-        self.assertIn('bookingCreated[gt]', call_args)
 
-    @patch('bookings.tasks.process_sync_pages')
-    def test_sync_latest_bookings_without_existing(self, mock_process_sync_pages):
+        params = mock_fetch_page.call_args[0][0]
+        self.assertEqual(params['bookingCreated[gt]'], (latest - timedelta(hours=1)).isoformat())
+        self.assertEqual(params['page'], 1)
+        self.assertEqual(SyncState.objects.get(name='latest').watermark, latest)
+
+    @patch('bookings.tasks.fetch_bookings_page')
+    def test_sync_latest_bookings_without_existing(self, mock_fetch_page):
+        mock_fetch_page.side_effect = [self.page('1', '2', next_page='2'), self.page('3')]
+
+        sync_latest_bookings()
+
+        self.assertNotIn('bookingCreated[gt]', mock_fetch_page.call_args_list[0][0][0])
+        self.assertEqual(Booking.objects.count(), 3)
+        state = SyncState.objects.get(name='latest')
+        self.assertEqual(state.watermark, Booking.objects.get(id='3').booking_created)
+        self.assertEqual(state.run_id, '')
+
+    @patch('bookings.tasks.fetch_bookings_page')
+    def test_sync_latest_bookings_resumes_after_failure(self, mock_fetch_page):
+        mock_fetch_page.side_effect = [self.page('1', next_page='2'), Exception('upstream error')]
+        with self.assertRaises(Exception):
+            sync_latest_bookings()
+        state = SyncState.objects.get(name='latest')
+        checkpoint = Booking.objects.get(id='1').booking_created - timedelta(microseconds=1)
+        self.assertEqual(state.run_since, checkpoint)
+        self.assertIsNone(state.watermark)
+
+        mock_fetch_page.side_effect = [self.page('1', '2', next_page='2'), self.page('2')]
+        sync_latest_bookings()
+
+        self.assertEqual(
+            mock_fetch_page.call_args_list[2][0][0], {'page': 1, 'bookingCreated[gt]': checkpoint.isoformat()}
+        )
+        state.refresh_from_db()
+        self.assertEqual(state.watermark, Booking.objects.get(id='2').booking_created)
+        self.assertEqual(state.last_page, 0)
+
+    @patch('bookings.tasks.fetch_bookings_page')
+    def test_sync_latest_bookings_survives_shifting_pages(self, mock_fetch_page):
+        upstream = self.page('1', '2', '3', '4', '5')['results']
+
+        def fetch(params):
+            since = params.get('bookingCreated[gt]')
+            matching = [
+                b for b in upstream
+                if not since or parse_booking(b)['booking_created'] > datetime.fromisoformat(since)
+            ]
+            start = (params['page'] - 1) * 2
+            # Upstream drops the first booking once it has been read, shifting every later page
+            results = matching[start:start + 2]
+            if upstream[0] in results:
+                upstream.pop(0)
+            return {'count': len(matching), 'next': 'more' if start + 2 < len(matching) else None, 'results': results}
+        mock_fetch_page.side_effect = fetch
+
         sync_latest_bookings()
-        mock_process_sync_pages.assert_not_called()
+
+        self.assertEqual(sorted(Booking.objects.values_list('id', flat=True)), ['1', '2', '3', '4', '5'])
+        state = SyncState.objects.get(name='latest')
+        self.assertEqual(state.watermark, Booking.objects.get(id='5').booking_created)
+
+    @patch('bookings.tasks.fetch_bookings_page')
+    def test_sync_latest_bookings_pages_through_one_instant(self, mock_fetch_page):
+        same = {**self.page('1')['results'][0]}
+        pages = [
+            {'next': 'more', 'results': [{**same, 'id': '10'}, {**same, 'id': '11'}]},
+            {'next': 'more', 'results': [{**same, 'id': '10'}, {**same, 'id': '11'}]},
+            {'next': None, 'results': [{**same, 'id': '12'}]},
+        ]
+        mock_fetch_page.side_effect = pages
+
+        sync_latest_bookings()
+
+        calls = [c[0][0] for c in mock_fetch_page.call_args_list]
+        self.assertEqual([c['page'] for c in calls], [1, 1, 2])
+        self.assertEqual(calls[1]['bookingCreated[gt]'], calls[2]['bookingCreated[gt]'])
+        self.assertEqual(Booking.objects.count(), 3)
 
     @patch('bookings.tasks.fetch_single_booking')
     def test_update_active_bookings(self, mock_fetch_booking):
@@ -81,6 +172,75 @@ class TestBookingTasks(TestCase):
         self.assertEqual(updated_booking.status, 'CONFIRMED')
         self.assertEqual(updated_booking.experience, 'Test Experience')  
 
+    @override_settings(ACTIVE_BOOKINGS_CHUNK_SIZE=2)
+    @patch('bookings.tasks.invalidate_bookings_cache')
+    @patch('bookings.tasks.fetch_single_booking')
+    def test_update_active_bookings_in_chunks(self, mock_fetch_booking, mock_invalidate):
+        for i, status in enumerate(['PENDING', 'ACCEPTED', 'ON_HOLD', 'COMPLETED']):
+            Booking.objects.create(
+                id=str(i), code=f'OLD{i}', status=status, experience='Test Experience', rate='Standard Rate',
+                booking_created=timezone.now(), participants=2, original_currency='USD',
+                price_original_currency=100.00
+            )
+
+        def fetch(booking_id):
+            if booking_id == '1':
+                raise Exception('upstream error')
+            return {**self.sample_booking_data, 'id': booking_id, 'bookingCode': f'NEW{booking_id}'}
+        mock_fetch_booking.side_effect = fetch
+
+        update_active_bookings()
+
+        self.assertEqual(sorted(c.args[0] for c in mock_fetch_booking.call_args_list), ['0', '1', '2'])
+        self.assertEqual(Booking.objects.get(id='0').code, 'NEW0')
+        self.assertEqual(Booking.objects.get(id='1').code, 'OLD1')
+        self.assertEqual(Booking.objects.get(id='2').code, 'NEW2')
+        self.assertEqual(Booking.objects.get(id='3').code, 'OLD3')
+        mock_invalidate.assert_called_once()
+        self.assertIsNone(cache.get(ACTIVE_BOOKINGS_LOCK_KEY))
+
+    @override_settings(ACTIVE_BOOKINGS_CHUNK_SIZE=1, ACTIVE_BOOKINGS_LOCK_TIMEOUT=60)
+    @patch('bookings.tasks.fetch_single_booking')
+    def test_update_active_bookings_extends_lock_and_stops_when_lost(self, mock_fetch_booking):
+        for i in range(3):
+            Booking.objects.create(
+                id=str(i), code=f'OLD{i}', status='PENDING', experience='Test Experience', rate='Standard Rate',
+                booking_created=timezone.now() + timezone.timedelta(minutes=i), participants=2,
+                original_currency='USD', price_original_currency=100.00
+            )
+
+        def fetch(booking_id):
+            if booking_id == '1':
+                # The lock expired while this chunk ran and another run took it
+                cache.set(ACTIVE_BOOKINGS_LOCK_KEY, 'other-run')
+            return {**self.sample_booking_data, 'id': booking_id, 'bookingCode': f'NEW{booking_id}'}
+        mock_fetch_booking.side_effect = fetch
+
+        with patch.object(cache, 'touch', wraps=cache.touch) as touch:
+            update_active_bookings()
+
+        self.assertEqual(touch.call_count, 2)
+        self.assertEqual([c.args[0] for c in mock_fetch_booking.call_args_list], ['0', '1'])
+        self.assertEqual(Booking.objects.get(id='2').code, 'OLD2')
+        # The other run's lock is left alone
+        self.assertEqual(cache.get(ACTIVE_BOOKINGS_LOCK_KEY), 'other-run')
+        cache.delete(ACTIVE_BOOKINGS_LOCK_KEY)
+
+    @patch('bookings.tasks.fetch_single_booking')
+    def test_update_active_bookings_skips_while_locked(self, mock_fetch_booking):
+        Booking.objects.create(
+            id='123', code='ABC123', status='PENDING', experience='Test Experience', rate='Standard Rate',
+            booking_created=timezone.now(), participants=2, original_currency='USD',
+            price_original_currency=100.00
+        )
+        cache.set(ACTIVE_BOOKINGS_LOCK_KEY, 'other-run')
+        try:
+            update_active_bookings()
+        finally:
+            cache.delete(ACTIVE_BOOKINGS_LOCK_KEY)
+
+        mock_fetch_booking.assert_not_called()
+
     def test_parse_booking(self):
         parsed = parse_booking(self.sample_booking_data)
         
@@ -94,6 +254,11 @@ class TestBookingTasks(TestCase):
         self.assertEqual(parsed['price_original_currency'], 100.00)
         self.assertIsInstance(parsed['booking_created'], datetime)
 
+    def test_float_amounts_are_stored_exactly(self):
+        data = {**self.sample_booking_data, 'price': {'finalRetailPrice': {'currency': 'USD', 'amount': 4321.07}}}
+        process_bookings_from_response({'results': [data]})
+        self.assertEqual(Booking.objects.get(id='123').price_original_currency, Decimal('4321.07'))
+
     @patch('bookings.tasks.fetch_bookings_page')
     @patch('bookings.tasks.process_bookings_from_response')
     def test_process_bookings_page(self, mock_process_bookings, mock_fetch_page):
@@ -103,4 +268,76 @@ class TestBookingTasks(TestCase):
 
         process_bookings_page({'page': 1})
 
-        mock_process_bookings.assert_called_once_with(mock_fetch_page.return_value) 
\ No newline at end of file
+        mock_process_bookings.assert_called_once_with(mock_fetch_page.return_value)
+
+    @patch('bookings.tasks.invalidate_bookings_cache')
+    def test_process_bookings_from_response_invalidates_cache(self, mock_invalidate):
+        with self.captureOnCommitCallbacks(execute=True):
+            stats = process_bookings_from_response({'results': [self.sample_booking_data, {'id': 'broken'}]})
+
+        self.assertEqual(stats, {'inserted': 1, 'updated': 0, 'unchanged': 0, 'failed': 0})
+        mock_invalidate.assert_called_once()
+
+    @patch('bookings.tasks.invalidate_bookings_cache')
+    def test_process_bookings_from_response_without_changes(self, mock_invalidate):
+        with self.captureOnCommitCallbacks(execute=True):
+            process_bookings_from_response({'results': [{'id': 'broken'}]})
+
+        mock_invalidate.assert_not_called() 
+
+    def test_process_bookings_from_response_bulk_upsert(self):
+        existing = Booking.objects.create(
+            id='123', code='OLD', status='PENDING', experience='Old Experience', rate='Old Rate',
+            booking_created=timezone.now(), participants=1, original_currency='USD',
+            price_original_currency=10
+        )
+        second = {**self.sample_booking_data, 'id': '456', 'bookingCode': 'DEF456'}
+        malformed = {**self.sample_booking_data, 'id': '789', 'experience': {'name': 'x' * 300}}
+
+        with CaptureQueriesContext(connection) as queries:
+            stats = process_bookings_from_response({'results': [self.sample_booking_data, second, malformed]})
+
+        self.assertEqual(stats, {'inserted': 1, 'updated': 1, 'unchanged': 0, 'failed': 0})
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('INSERT INTO "bookings_booking"')]), 1)
+        updated = Booking.objects.get(id='123')
+        self.assertEqual(updated.code, 'ABC123')
+        self.assertEqual(updated.status, 'CONFIRMED')
+        # The price in hundredths is written by the bulk upsert too
+        self.assertEqual(updated.price_minor, 10000)
+        self.assertEqual(updated.created_at, existing.created_at)
+        self.assertEqual(Booking.objects.get(id='456').code, 'DEF456')
+        self.assertFalse(Booking.objects.filter(id='789').exists())
+
+    @patch('bookings.tasks.invalidate_bookings_cache')
+    def test_process_bookings_from_response_skips_unchanged(self, mock_invalidate):
+        process_bookings_from_response({'results': [self.sample_booking_data]})
+        updated_at = Booking.objects.get(id='123').updated_at
+        changed = {**self.sample_booking_data, 'id': '456'}
+        process_bookings_from_response({'results': [changed]})
+        mock_invalidate.reset_mock()
+
+        changed = {**changed, 'bookingStatus': 'CANCELLED'}
+        with self.captureOnCommitCallbacks(execute=True):
+            stats = process_bookings_from_response({'results': [self.sample_booking_data, changed]})
+
+        self.assertEqual(stats, {'inserted': 0, 'updated': 1, 'unchanged': 1, 'failed': 0})
+        self.assertEqual(Booking.objects.get(id='123').updated_at, updated_at)
+        self.assertEqual(Booking.objects.get(id='456').status, 'CANCELLED')
+        mock_invalidate.assert_called_once()
+
+    @patch('bookings.ingest.Booking.objects.bulk_create', side_effect=DatabaseError('boom'))
+    def test_process_bookings_from_response_falls_back_to_single_writes(self, mock_bulk_create):
+        stats = process_bookings_from_response({'results': [self.sample_booking_data]})
+
+        self.assertEqual(stats['inserted'], 1)
+        self.assertEqual(Booking.objects.get(id='123').code, 'ABC123')
+
+    @patch('bookings.tasks.invalidate_bookings_cache')
+    @patch('bookings.ingest.Booking.objects.update_or_create', side_effect=DatabaseError('boom'))
+    @patch('bookings.ingest.Booking.objects.bulk_create', side_effect=DatabaseError('boom'))
+    def test_bookings_dropped_by_single_writes_count_as_failed(self, mock_bulk_create, mock_update, mock_invalidate):
+        with self.captureOnCommitCallbacks(execute=True):
+            stats = process_bookings_from_response({'results': [self.sample_booking_data]})
+
+        self.assertEqual(stats, {'inserted': 0, 'updated': 0, 'unchanged': 0, 'failed': 1})
+        mock_invalidate.assert_not_called()
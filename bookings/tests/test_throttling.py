@@ -0,0 +1,87 @@
+from unittest.mock import patch
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APIClient
+from . import TEST_CACHES
+from ..auth import api_key_store
+from ..models import APIKey
+from ..throttling import request_cost
+
+
+@override_settings(API_RATE_LIMIT_COST_DAYS=30)
+class RequestCostTest(TestCase):
+    def test_narrow_window_costs_one_unit(self):
+        params = {'date[gt]': '2024-04-01', 'date[lt]': '2024-04-10'}
+        self.assertEqual(request_cost(params, max_cost=20), 1)
+
+    def test_wide_window_costs_more(self):
+        params = {'date[gt]': '2024-01-01', 'date[lt]': '2024-12-31'}
+        self.assertEqual(request_cost(params, max_cost=20), 13)
+        self.assertEqual(request_cost(params, max_cost=5), 5)
+
+    def test_unbounded_window_costs_the_maximum(self):
+        self.assertEqual(request_cost({}, max_cost=20), 20)
+        self.assertEqual(request_cost({'date[lt]': '2024-04-10'}, max_cost=20), 20)
+
+    def test_mixes_naive_and_offset_dates(self):
+        params = {'date[gt]': '2024-01-01T00:00:00+00:00', 'date[lt]': '2024-03-01T00:00:00'}
+        self.assertEqual(request_cost(params, max_cost=20), 3)
+
+    def test_later_pages_and_invalid_dates_cost_one_unit(self):
+        self.assertEqual(request_cost({'limit': '100', 'cursor': 'abc'}, max_cost=20), 1)
+        self.assertEqual(request_cost({'date[gt]': 'yesterday'}, max_cost=20), 1)
+
+    def test_window_totals_cost_the_window(self):
+        # The first page and totalsOnly compute totals over the whole window
+        self.assertEqual(request_cost({'limit': '100'}, max_cost=20), 20)
+        self.assertEqual(request_cost({'limit': '100', 'cursor': 'abc', 'totalsOnly': 'true'}, max_cost=20), 20)
+
+
+@override_settings(
+    EXTERNAL_API_KEY='test-api-key-123',
+    CACHES=TEST_CACHES,
+    API_RATE_LIMIT=60,
+    API_RATE_LIMIT_MAX_COST=20,
+)
+class APIKeyRateThrottleTest(TestCase):
+    def setUp(self):
+        api_key_store.clear()
+        self.addCleanup(api_key_store.clear)
+        self.client = APIClient()
+        self.url = '/bookings/?currency=EUR&date[gt]=2024-01-01&date[lt]=2024-12-31'
+
+    def test_limits_each_key_with_its_own_rate_and_cost(self):
+        api_key = APIKey.objects.create(name='partner', key_hash=APIKey.hash_key('partner-key'), rate_limit=300)
+        self.client.credentials(HTTP_X_API_KEY='partner-key')
+
+        with patch('bookings.throttling.GCRA.acquire', return_value=0.0) as acquire, \
+                patch('bookings.throttling.GCRA.__init__', return_value=None) as init:
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        init.assert_called_once_with(f'bookings:throttle:key:{api_key.pk}', 5.0, 300)
+        acquire.assert_called_once_with(13)
+
+    def test_rejects_with_retry_after(self):
+        self.client.credentials(HTTP_X_API_KEY='test-api-key-123')
+
+        with patch('bookings.throttling.GCRA.acquire', return_value=2.5):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '3')
+
+    def test_unlimited_key_is_not_throttled(self):
+        APIKey.objects.create(name='internal', key_hash=APIKey.hash_key('internal-key'), rate_limit=0)
+        self.client.credentials(HTTP_X_API_KEY='internal-key')
+
+        with patch('bookings.throttling.GCRA.acquire') as acquire:
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        acquire.assert_not_called()
+
+    def test_fails_open_without_redis(self):
+        # The test cache is not Redis, so the limiter cannot run its script
+        self.client.credentials(HTTP_X_API_KEY='test-api-key-123')
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
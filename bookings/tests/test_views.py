@@ -1,17 +1,28 @@
+import json
+from datetime import datetime, timezone as dt_timezone
 from decimal import Decimal
 from django.test import TestCase, RequestFactory
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIClient
 from django.test import override_settings
+from django.core.cache import cache
+from . import TEST_CACHES
+from ..cache import invalidate_bookings_cache
 from ..models import Booking
-from ..views import fetch, get_filtered_bookings, convert_booking, sum_bookings
+from unittest.mock import patch
+from ..views import fetch, get_filtered_bookings, get_booking_totals, get_response_data, sum_bookings
+from ..conversion import convert_booking, convert_bookings
+from ..rates import RateTable, get_rate_table
+from ..rollups import rebuild_rollups
 from ..request import Request
 
 
-@override_settings(EXTERNAL_API_KEY='test-api-key-123')
+# Totals straight from Booking rows; rollup-backed totals are covered in test_rollups
+@override_settings(EXTERNAL_API_KEY='test-api-key-123', CACHES=TEST_CACHES)
 class BookingViewsTest(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
         self.client.credentials(HTTP_X_API_KEY='test-api-key-123')
         self.url = '/bookings/'
@@ -46,9 +57,11 @@ class BookingViewsTest(TestCase):
         })
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         data = response.json()
+        # Totals convert each currency's subtotal, not the rounded booking prices
+        expected = (Decimal('250.00') * get_rate_table().cross_rate('USD', 'EUR')).quantize(Decimal('0.01'))
         self.assertEqual(len(data['bookings']), 2)
         self.assertEqual(Decimal(data['totalPriceOriginalCurrency']), Decimal('250.00'))
-        self.assertEqual(Decimal(data['totalPriceRequestedCurrency']), Decimal('250.00'))
+        self.assertEqual(Decimal(str(data['totalPriceRequestedCurrency'])), expected)
 
     def test_fetch_with_date_filter(self):
         response = self.client.get(self.url, {
@@ -61,6 +74,17 @@ class BookingViewsTest(TestCase):
         self.assertEqual(len(data['bookings']), 1)
         self.assertEqual(data['bookings'][0]['code'], 'BOOK1')
 
+    def test_fetch_with_naive_and_offset_dates(self):
+        params = {
+            'currency': 'EUR',
+            'date[gt]': (self.now - timezone.timedelta(hours=1)).isoformat(),
+            'date[lt]': timezone.localtime(self.now + timezone.timedelta(hours=1)).replace(tzinfo=None).isoformat(),
+        }
+        for url in (self.url, '/async/bookings/'):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual([b['code'] for b in response.json()['bookings']], ['BOOK1'])
+
     def test_fetch_with_invalid_parameters(self):
         response = self.client.get(self.url, {
             'currency': 'XYZ'
@@ -85,11 +109,33 @@ class BookingViewsTest(TestCase):
             start_time=None,
             end_time=None
         )
-        converted = convert_booking(self.booking1, req)
+        converted = convert_booking(self.booking1, req, Decimal('1.2'))
         self.assertEqual(converted['code'], 'BOOK1')
         self.assertEqual(converted['requestedCurrency'], 'EUR')
         self.assertEqual(converted['priceRequestedCurrency'], Decimal('120.00'))
 
+    def test_convert_bookings_uses_original_currency(self):
+        self.booking2.original_currency = 'GBP'
+        req = Request(
+            requested_currency='EUR',
+            coefficient=Decimal('1'),
+            start_time=None,
+            end_time=None
+        )
+        table = get_rate_table()
+        with patch.object(table, 'cross_rate', wraps=table.cross_rate) as cross_rate:
+            converted = convert_bookings([self.booking1, self.booking2, self.booking1], req)
+        self.assertEqual(cross_rate.call_count, 2)
+        self.assertEqual([b['code'] for b in converted], ['BOOK1', 'BOOK2', 'BOOK1'])
+        self.assertEqual(
+            converted[0]['priceRequestedCurrency'],
+            (Decimal('100.00') * table.cross_rate('USD', 'EUR')).quantize(Decimal('0.01'))
+        )
+        self.assertEqual(
+            converted[1]['priceRequestedCurrency'],
+            (Decimal('150.00') * table.cross_rate('GBP', 'EUR')).quantize(Decimal('0.01'))
+        )
+
     def test_sum_bookings(self):
         bookings_list = [
             {
@@ -107,6 +153,389 @@ class BookingViewsTest(TestCase):
         self.assertEqual(result['totalPriceOriginalCurrency'], Decimal('250.00'))
         self.assertEqual(result['totalPriceRequestedCurrency'], Decimal('300.00'))
 
+    def test_fetch_without_matching_bookings(self):
+        response = self.client.get(self.url, {
+            'currency': 'EUR',
+            'date[gt]': (self.now + timezone.timedelta(days=1)).isoformat()
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['bookings'], [])
+        self.assertEqual(Decimal(data['totalPriceRequestedCurrency']), Decimal('0.00'))
+
+    def test_fetch_totals_only(self):
+        full = self.client.get(self.url, {'currency': 'GBP'}).json()
+        response = self.client.get(self.url, {'currency': 'GBP', 'totalsOnly': 'true'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertNotIn('bookings', data)
+        self.assertEqual(data['totalPriceOriginalCurrency'], full['totalPriceOriginalCurrency'])
+        self.assertEqual(data['totalPriceRequestedCurrency'], full['totalPriceRequestedCurrency'])
+
+    def test_fetch_with_invalid_totals_only(self):
+        response = self.client.get(self.url, {'currency': 'EUR', 'totalsOnly': 'maybe'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_get_booking_totals_groups_by_currency(self):
+        self.booking2.original_currency = 'GBP'
+        self.booking2.save()
+        req = Request(requested_currency='EUR', coefficient=Decimal('1'), start_time=None, end_time=None)
+        table = get_rate_table()
+        with self.assertNumQueries(1):
+            totals = get_booking_totals(req)
+        expected = (
+            (Decimal('100.00') * table.cross_rate('USD', 'EUR')).quantize(Decimal('0.01')) +
+            (Decimal('150.00') * table.cross_rate('GBP', 'EUR')).quantize(Decimal('0.01'))
+        )
+        self.assertEqual(totals['totalPriceOriginalCurrency'], Decimal('250.00'))
+        self.assertEqual(totals['totalPriceRequestedCurrency'], expected)
+
+    def test_fetch_paginated(self):
+        Booking.objects.create(
+            id='test3', code='BOOK3', status='PENDING', experience='Test Experience 3', rate='Standard',
+            booking_created=self.now, participants=1, original_currency='USD',
+            price_original_currency=Decimal('50.00')
+        )
+        codes = []
+        params = {'currency': 'EUR', 'limit': 2}
+        while True:
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            data = response.json()
+            # Only the first page carries the window totals
+            if 'cursor' in params:
+                self.assertNotIn('totalPriceOriginalCurrency', data)
+            else:
+                self.assertEqual(Decimal(str(data['totalPriceOriginalCurrency'])), Decimal('300.00'))
+            codes.extend(b['code'] for b in data['bookings'])
+            if not data['nextCursor']:
+                break
+            params['cursor'] = data['nextCursor']
+        self.assertEqual(codes, ['BOOK3', 'BOOK1', 'BOOK2'])
+
+    def test_fetch_with_invalid_pagination(self):
+        for params in ({'limit': 0}, {'limit': 'ten'}, {'cursor': 'not-a-cursor'}, {'limit': 2, 'stream': 'true'}):
+            response = self.client.get(self.url, {'currency': 'EUR', **params})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(BOOKINGS_STREAM_CHUNK_SIZE=1)
+    def test_fetch_streaming_matches_regular_response(self):
+        regular = self.client.get(self.url, {'currency': 'GBP'})
+        streamed = self.client.get(self.url, {'currency': 'GBP', 'stream': 'true'})
+        self.assertEqual(streamed.status_code, status.HTTP_200_OK)
+        self.assertTrue(streamed.streaming)
+        self.assertEqual(b''.join(streamed.streaming_content), regular.content)
+
+    @override_settings(BOOKINGS_STREAM_CHUNK_SIZE=1)
+    def test_fetch_streaming_ends_with_error_when_it_fails(self):
+        with patch('bookings.views.convert_rows', side_effect=[[], RuntimeError('boom')]):
+            streamed = self.client.get(self.url, {'currency': 'GBP', 'stream': 'true'})
+            data = json.loads(b''.join(streamed.streaming_content))
+        self.assertEqual(streamed.status_code, status.HTTP_200_OK)
+        self.assertEqual(data['error'], 'An unexpected error occurred while streaming bookings')
+        self.assertNotIn('totalPriceOriginalCurrency', data)
+
+    def test_fetch_served_from_cache(self):
+        params = {'currency': 'EUR', 'totalsOnly': 'true'}
+        first = self.client.get(self.url, params)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url, params)
+        self.assertEqual(first.content, second.content)
+
+    def test_fetch_cache_invalidated_after_sync(self):
+        params = {'currency': 'EUR'}
+        self.assertEqual(len(self.client.get(self.url, params).json()['bookings']), 2)
+        self.booking2.delete()
+        self.assertEqual(len(self.client.get(self.url, params).json()['bookings']), 2)
+
+        invalidate_bookings_cache()
+        self.assertEqual(len(self.client.get(self.url, params).json()['bookings']), 1)
+
+    def test_sync_during_request_does_not_cache_stale_response(self):
+        params = {'currency': 'EUR'}
+        stale = get_response_data(Request.from_params(params))
+
+        # A sync deletes a booking and invalidates while the response is being computed
+        def computed_during_sync(req):
+            self.booking2.delete()
+            invalidate_bookings_cache()
+            return stale
+
+        with patch('bookings.views.get_response_data', side_effect=computed_during_sync):
+            self.assertEqual(len(self.client.get(self.url, params).json()['bookings']), 2)
+        self.assertEqual(len(self.client.get(self.url, params).json()['bookings']), 1)
+
+    def test_totals_summed_exactly(self):
+        for i in range(30):
+            Booking.objects.create(
+                id=f'cent{i}', code=f'CENT{i}', status='PENDING', experience='Small', rate='Standard',
+                booking_created=self.now, participants=1, original_currency='EUR',
+                price_original_currency=Decimal('0.10') + Decimal('0.01') * (i % 3)
+            )
+        full = self.client.get(self.url, {'currency': 'EUR'}).json()
+        totals = self.client.get(self.url, {'currency': 'EUR', 'totalsOnly': 'true'}).json()
+        self.assertEqual(Decimal(str(totals['totalPriceOriginalCurrency'])), Decimal('253.30'))
+        self.assertEqual(totals['totalPriceOriginalCurrency'], full['totalPriceOriginalCurrency'])
+
+    def test_fetch_converts_from_weak_currencies(self):
+        for booking, currency, price in ((self.booking1, 'IDR', '1000000.00'), (self.booking2, 'JPY', '150000.00')):
+            booking.original_currency = currency
+            booking.price_original_currency = Decimal(price)
+            booking.save()
+        table = get_rate_table()
+        for requested in ('EUR', 'USD'):
+            data = self.client.get(self.url, {'currency': requested}).json()
+            prices = {b['code']: Decimal(str(b['priceRequestedCurrency'])) for b in data['bookings']}
+            for code, currency, price in (('BOOK1', 'IDR', 1000000), ('BOOK2', 'JPY', 150000)):
+                expected = Decimal(price) * table.rate(requested) / table.rate(currency)
+                self.assertAlmostEqual(prices[code], expected, delta=Decimal('0.01'))
+            self.assertLess(prices['BOOK1'], Decimal('100'))
+
     def test_fetch_with_missing_required_parameters(self):
         response = self.client.get(self.url, {})
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(BOOKINGS_DAILY_ROLLUPS=False)
+class BookingViewsWithoutRollupsTest(BookingViewsTest):
+    # The same requests, with totals summed from the bookings instead of the daily rollups
+    pass
+
+
+@override_settings(EXTERNAL_API_KEY='test-api-key-123', CACHES=TEST_CACHES)
+class AnalyticsViewTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_X_API_KEY='test-api-key-123')
+        self.url = '/bookings/analytics/'
+        self.day = datetime(2024, 4, 8, 10, tzinfo=dt_timezone.utc)
+        for i, (experience, status_, days, currency, price, participants) in enumerate([
+            ('Tour', 'COMPLETED', 0, 'USD', '100.00', 2),
+            ('Tour', 'COMPLETED', 0, 'GBP', '50.00', 1),
+            ('Tour', 'PENDING', 1, 'USD', '20.00', 4),
+            ('Cruise', 'COMPLETED', 0, 'USD', '300.00', 3),
+            ('Tour', 'COMPLETED', 14, 'USD', '10.00', 1),
+        ]):
+            Booking.objects.create(
+                id=f'test{i}', code=f'BOOK{i}', status=status_, experience=experience, rate='Standard',
+                booking_created=self.day - timezone.timedelta(days=days), participants=participants,
+                original_currency=currency, price_original_currency=Decimal(price)
+            )
+
+    def convert(self, *amounts):
+        table = get_rate_table()
+        return sum(
+            ((Decimal(price) * table.cross_rate(currency, 'EUR')).quantize(Decimal('0.01')) for currency, price in amounts),
+            Decimal(0)
+        )
+
+    def test_group_by_day_and_experience(self):
+        response = self.client.get(self.url, {
+            'currency': 'eur', 'groupBy': 'day,experience', 'date[gt]': '2024-04-01T00:00:00+00:00'
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['groupBy'], ['day', 'experience'])
+        self.assertEqual(data['requestedCurrency'], 'EUR')
+        groups = [
+            (g['day'], g['experience'], Decimal(str(g['totalPriceRequestedCurrency'])), g['participants'], g['bookings'])
+            for g in data['groups']
+        ]
+        self.assertEqual(groups, [
+            ('2024-04-07', 'Tour', self.convert(('USD', '20.00')), 4, 1),
+            ('2024-04-08', 'Cruise', self.convert(('USD', '300.00')), 3, 1),
+            ('2024-04-08', 'Tour', self.convert(('USD', '100.00'), ('GBP', '50.00')), 3, 2),
+        ])
+        self.assertEqual(Decimal(str(data['totalPriceRequestedCurrency'])), sum(g[2] for g in groups))
+
+    def test_group_by_week_status_and_currency(self):
+        data = self.client.get(self.url, {'currency': 'EUR', 'groupBy': 'week,status,originalCurrency'}).json()
+        keys = [(g['week'], g['status'], g['originalCurrency'], g['bookings']) for g in data['groups']]
+        self.assertEqual(keys, [
+            ('2024-03-25', 'COMPLETED', 'USD', 1),
+            # Sunday the 7th belongs to the week starting Monday the 1st
+            ('2024-04-01', 'PENDING', 'USD', 1),
+            ('2024-04-08', 'COMPLETED', 'GBP', 1),
+            ('2024-04-08', 'COMPLETED', 'USD', 2),
+        ])
+
+    def test_grouping_runs_in_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {'currency': 'EUR', 'groupBy': 'month,rate'})
+        self.assertEqual(response.json()['groups'][0]['month'], '2024-03-01')
+
+    def test_invalid_group_by(self):
+        for params in (
+            {}, {'groupBy': 'country'}, {'groupBy': 'day,month'}, {'groupBy': 'status,status'},
+            {'groupBy': 'day', 'totalsOnly': 'true'}, {'groupBy': 'day', 'limit': 5},
+        ):
+            response = self.client.get(self.url, {'currency': 'EUR', **params})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def test_fetch_rejects_group_by(self):
+        response = self.client.get('/bookings/', {'currency': 'EUR', 'groupBy': 'day'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(EXTERNAL_API_KEY='test-api-key-123', CACHES=TEST_CACHES, BOOKINGS_STREAM_CHUNK_SIZE=2)
+class MultiCurrencyTest(TestCase):
+    currencies = ['USD', 'GBP', 'EUR']
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_X_API_KEY='test-api-key-123')
+        now = timezone.now()
+        for i, currency in enumerate(['USD', 'GBP', 'CHF', 'USD', 'EUR']):
+            Booking.objects.create(
+                id=f'test{i}', code=f'BOOK{i}', status='PENDING', experience=f'Experience {i % 2}',
+                rate='Standard', booking_created=now - timezone.timedelta(hours=i), participants=i + 1,
+                original_currency=currency, price_original_currency=Decimal('10.35') * (i + 1)
+            )
+
+    def get(self, url, params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_matches_single_currency_responses(self):
+        for url, params in (
+            ('/bookings/', {}),
+            ('/bookings/', {'totalsOnly': 'true'}),
+            ('/bookings/', {'limit': 3}),
+            ('/bookings/analytics/', {'groupBy': 'experience'}),
+        ):
+            with self.subTest(url=url, params=params):
+                combined = self.get(url, {**params, 'currency': 'usd,GBP,EUR,USD'})
+                singles = {currency: self.get(url, {**params, 'currency': currency}) for currency in self.currencies}
+
+                self.assertEqual(
+                    combined['totalPriceRequestedCurrencies'],
+                    {currency: singles[currency]['totalPriceRequestedCurrency'] for currency in self.currencies}
+                )
+                self.assertNotIn('totalPriceRequestedCurrency', combined)
+                for key, field in (('bookings', 'priceRequestedCurrency'), ('groups', 'totalPriceRequestedCurrency')):
+                    for i, item in enumerate(combined.get(key, [])):
+                        self.assertEqual(
+                            item[field.replace('Currency', 'Currencies')],
+                            {currency: singles[currency][key][i][field] for currency in self.currencies}
+                        )
+
+    def test_streaming_matches_regular_response(self):
+        params = {'currency': 'GBP,CHF'}
+        regular = self.client.get('/bookings/', params)
+        streamed = self.client.get('/bookings/', {**params, 'stream': 'true'})
+        self.assertEqual(b''.join(streamed.streaming_content), regular.content)
+
+    def test_totals_agree_across_modes(self):
+        now = timezone.now()
+        for i in range(8):
+            Booking.objects.create(
+                id=f'extra{i}', code=f'EXTRA{i}', status='PENDING', experience='Small', rate='Standard',
+                booking_created=now - timezone.timedelta(days=i), participants=1,
+                original_currency=['USD', 'GBP'][i % 2], price_original_currency=Decimal('0.35') + Decimal('0.01') * i
+            )
+        fields = ('totalPriceOriginalCurrency', 'totalPriceRequestedCurrency', 'totalPriceRequestedCurrencies')
+        for params in ({'currency': 'CHF'}, {'currency': 'USD,GBP,JPY'}, {'currency': 'EUR,CHF', 'rateDate': 'booking'}):
+            with self.subTest(params=params):
+                full = self.get('/bookings/', params)
+                totals = {field: full[field] for field in fields if field in full}
+                self.assertEqual(len(totals), 2)
+                streamed = self.client.get('/bookings/', {**params, 'stream': 'true'})
+                streamed = json.loads(b''.join(streamed.streaming_content))
+                for other in (streamed, self.get('/bookings/', {**params, 'totalsOnly': 'true'}),
+                              self.get('/bookings/', {**params, 'limit': 2})):
+                    self.assertEqual({field: other[field] for field in totals}, totals)
+
+    def test_rows_are_read_once(self):
+        with self.assertNumQueries(1):
+            data = self.get('/bookings/', {'currency': 'USD,GBP,EUR'})
+        self.assertEqual(len(data['bookings']), 5)
+        self.assertEqual(list(data['bookings'][0]['priceRequestedCurrencies']), self.currencies)
+
+    def test_invalid_currency_in_list(self):
+        for currency in ('USD,XYZ', 'USD,', ','.join(['USD', 'GBP', 'EUR', 'CHF', 'JPY', 'SEK', 'NOK', 'DKK', 'PLN', 'CZK', 'HUF'])):
+            response = self.client.get('/bookings/', {'currency': currency})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, currency)
+
+
+@override_settings(EXTERNAL_API_KEY='test-api-key-123', CACHES=TEST_CACHES, BOOKINGS_STREAM_CHUNK_SIZE=2)
+class BookingDateRatesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_X_API_KEY='test-api-key-123')
+        self.bookings = [
+            # Saturday the 16th converts at Friday's rate
+            ('USD', datetime(2024, 1, 15, 9, tzinfo=dt_timezone.utc), '100.00'),
+            ('USD', datetime(2024, 1, 15, 18, tzinfo=dt_timezone.utc), '40.00'),
+            ('USD', datetime(2024, 3, 16, 12, tzinfo=dt_timezone.utc), '100.00'),
+            ('GBP', datetime(2024, 3, 15, 12, tzinfo=dt_timezone.utc), '80.00'),
+        ]
+        for i, (currency, created, price) in enumerate(self.bookings):
+            Booking.objects.create(
+                id=f'test{i}', code=f'BOOK{i}', status='PENDING', experience='Tour', rate='Standard',
+                booking_created=created, participants=1, original_currency=currency,
+                price_original_currency=Decimal(price)
+            )
+        rebuild_rollups()
+
+    def converted(self, currency, created, price, requested='EUR'):
+        rate = get_rate_table().cross_rate(currency, requested, created.date())
+        return (Decimal(price) * rate).quantize(Decimal('0.01'))
+
+    def test_bookings_convert_at_their_own_day(self):
+        data = self.client.get('/bookings/', {'currency': 'EUR', 'rateDate': 'booking'}).json()
+        prices = {b['code']: Decimal(str(b['priceRequestedCurrency'])) for b in data['bookings']}
+        self.assertEqual(prices, {f'BOOK{i}': self.converted(*booking) for i, booking in enumerate(self.bookings)})
+        self.assertEqual(
+            get_rate_table().cross_rate('USD', 'EUR', datetime(2024, 3, 16).date()),
+            get_rate_table().cross_rate('USD', 'EUR', datetime(2024, 3, 15).date())
+        )
+        latest = self.client.get('/bookings/', {'currency': 'EUR'}).json()['bookings']
+        self.assertNotEqual(prices['BOOK0'], {b['code']: Decimal(str(b['priceRequestedCurrency'])) for b in latest}['BOOK0'])
+
+    def test_totals_are_converted_per_currency_and_day(self):
+        jan = (Decimal('140.00') * get_rate_table().cross_rate('USD', 'EUR', datetime(2024, 1, 15).date())).quantize(
+            Decimal('0.01')
+        )
+        expected = jan + self.converted(*self.bookings[2]) + self.converted(*self.bookings[3])
+        for rollups in (True, False):
+            for params in ({}, {'date[gt]': '2024-01-15T12:00:00+00:00', 'date[lt]': '2024-03-16T13:00:00+00:00'}):
+                with self.subTest(rollups=rollups, params=params), self.settings(BOOKINGS_DAILY_ROLLUPS=rollups):
+                    cache.clear()
+                    data = self.client.get('/bookings/', {
+                        'currency': 'EUR', 'rateDate': 'booking', 'totalsOnly': 'true', **params
+                    }).json()
+                    total = expected if not params else expected - jan + self.converted(*self.bookings[1])
+                    self.assertEqual(Decimal(str(data['totalPriceRequestedCurrency'])), total)
+
+    def test_rates_resolved_once_per_currency_and_day(self):
+        with patch.object(RateTable, 'cross_rate', autospec=True, side_effect=RateTable.cross_rate) as cross_rate:
+            data = self.client.get('/bookings/', {'currency': 'EUR,CHF', 'rateDate': 'booking'}).json()
+        self.assertEqual(len(data['bookings']), 4)
+        # Three distinct (currency, day) pairs, two requested currencies, for the rows and again for the totals
+        self.assertEqual(cross_rate.call_count, 12)
+
+    def test_every_mode_agrees(self):
+        params = {'currency': 'CHF', 'rateDate': 'booking'}
+        regular = self.client.get('/bookings/', params)
+        streamed = self.client.get('/bookings/', {**params, 'stream': 'true'})
+        self.assertEqual(b''.join(streamed.streaming_content), regular.content)
+
+        page = self.client.get('/bookings/', {**params, 'limit': 10}).json()
+        self.assertEqual(page['bookings'], regular.json()['bookings'])
+
+        groups = self.client.get('/bookings/analytics/', {**params, 'groupBy': 'originalCurrency'}).json()['groups']
+        by_currency = {'USD': Decimal(0), 'GBP': Decimal(0)}
+        for booking in regular.json()['bookings']:
+            by_currency[booking['originalCurrency']] += Decimal(str(booking['priceRequestedCurrency']))
+        # Bookings of one day are summed before rounding, so allow a cent per day
+        for group in groups:
+            difference = Decimal(str(group['totalPriceRequestedCurrency'])) - by_currency[group['originalCurrency']]
+            self.assertLessEqual(abs(difference), Decimal('0.02'))
+
+    def test_invalid_rate_date(self):
+        response = self.client.get('/bookings/', {'currency': 'EUR', 'rateDate': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
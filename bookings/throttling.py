@@ -0,0 +1,61 @@
+from typing import Optional
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.throttling import BaseThrottle
+
+from bookings.ratelimit import GCRA
+from bookings.request import Request
+
+
+def request_cost(params, max_cost: int) -> int:
+    # One unit per request plus one per API_RATE_LIMIT_COST_DAYS of date window, so wide
+    # windows drain the allowance faster. Pages after the first are bounded by `limit` and cost a
+    # single unit; the first page and totalsOnly aggregate the whole window and pay for it.
+    if params.get('cursor') and (params.get('totalsOnly') or '').lower() not in ('true', '1'):
+        return 1
+    # Both dates come back timezone-aware, so a window mixing naive and offset dates can be measured
+    try:
+        start_time = Request._parse_datetime(params.get('date[gt]'))
+        end_time = Request._parse_datetime(params.get('date[lt]'))
+    except ValueError:
+        # Rejected by the view without touching the database
+        return 1
+    if start_time is None:
+        return max_cost
+    if end_time is None:
+        end_time = timezone.now()
+
+    days = max((end_time - start_time).days, 0)
+    return min(1 + days // settings.API_RATE_LIMIT_COST_DAYS, max_cost)
+
+
+def get_throttle_delay(api_key, params, ident: str) -> float:
+    """
+    Per API key GCRA limit of API_RATE_LIMIT cost units per minute (or the key's own
+    `rate_limit`), with up to a minute's worth available as a burst. The shared EXTERNAL_API_KEY
+    is limited per client address (`ident`). Returns the seconds to wait, 0 when admitted.
+    """
+    if api_key is None or api_key.rate_limit is None:
+        rate = settings.API_RATE_LIMIT
+    else:
+        rate = api_key.rate_limit
+    if not rate:
+        return 0.0
+
+    key = f'key:{api_key.pk}' if api_key is not None else f'ip:{ident}'
+    max_cost = min(settings.API_RATE_LIMIT_MAX_COST, rate)
+    limiter = GCRA(f'bookings:throttle:{key}', rate / 60, rate)
+    return limiter.acquire(request_cost(params, max_cost))
+
+
+class APIKeyRateThrottle(BaseThrottle):
+    def __init__(self):
+        self.delay: Optional[float] = None
+
+    def allow_request(self, request, view):
+        self.delay = get_throttle_delay(request.auth, request.query_params, self.get_ident(request))
+        return self.delay <= 0
+
+    def wait(self):
+        return self.delay
@@ -1,25 +1,60 @@
 import logging
-from decimal import Decimal, InvalidOperation
-from typing import List, Dict, Any
+from decimal import Decimal
+from itertools import islice
+from typing import Iterator, List, Dict, Any, Optional
 
-from bookings.auth import APIKeyAuthentication
+from bookings.auth import APIKeyAuthentication, is_metrics_scraper
+from bookings.cache import cache_response, get_cached_response, get_version
+from bookings.conversion import (
+    ROW_FIELDS, add_to_subtotals, convert_bookings, convert_groups, convert_rows, convert_totals
+)
+from bookings.export import FORMATS, booking_chunks, export_bookings, parse_format
+from bookings.metrics import REQUEST_STAGE_SECONDS, RESPONSE_CACHE, collect, instrument_view, render
 from bookings.request import Request
+from bookings.rollups import booking_totals, merge_totals, totals_queries as rollup_totals_queries
+from bookings.throttling import APIKeyRateThrottle
 from bookings.models import Booking
+from bookings.pagination import paginate
+from bookings.queries import filter_bookings
+from bookings.renderers import CSVRenderer, ExportRenderer, FastJSONRenderer, NDJSONRenderer, ParquetRenderer, dumps
 
+from django.conf import settings
+from django.db.models import Count, DateField, F, QuerySet, Sum
+from django.db.models.functions import TruncDate, TruncDay, TruncMonth, TruncWeek
+from django.http import HttpResponse, StreamingHttpResponse
 from rest_framework import status
-from rest_framework.decorators import api_view, authentication_classes
+from rest_framework.decorators import api_view, authentication_classes, renderer_classes, throttle_classes
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
 
 logger = logging.getLogger(__name__)
 
+# Ends a stream that failed after its 200 status went out: the document closes with an error, not totals
+STREAM_ERROR = b'],"error":"An unexpected error occurred while streaming bookings"}'
 
+# SQL expressions behind the groupBy dimensions; days, weeks and months start in TIME_ZONE
+GROUP_BY_EXPRESSIONS = {
+    'day': TruncDay('booking_created', output_field=DateField()),
+    'week': TruncWeek('booking_created', output_field=DateField()),
+    'month': TruncMonth('booking_created', output_field=DateField()),
+    'experience': F('experience'),
+    'status': F('status'),
+    'rate': F('rate'),
+    'originalCurrency': F('original_currency'),
+}
+
+
+@instrument_view
 @api_view(['GET'])
 @authentication_classes([APIKeyAuthentication])
+@throttle_classes([APIKeyRateThrottle])
+@renderer_classes([FastJSONRenderer, BrowsableAPIRenderer])
 def fetch(request):
     logger.info(f"Request: {request.query_params}")
     
     try:
-        req = Request.from_params(request.query_params)
+        with REQUEST_STAGE_SECONDS.time(stage='parse'):
+            req = Request.from_params(request.query_params)
     except ValueError as e:
         logger.warning(f"Invalid request parameters: {str(e)}")
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -30,10 +65,22 @@ def fetch(request):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+    if req.group_by:
+        return Response(
+            {'error': 'groupBy is only supported by /bookings/analytics/'}, status=status.HTTP_400_BAD_REQUEST
+        )
+
     try:
-        bookings = get_filtered_bookings(req)
-        converted_bookings = [convert_booking(booking, req) for booking in bookings]
-        return Response(sum_bookings(converted_bookings))
+        if req.stream:
+            return StreamingHttpResponse(stream_bookings(req), content_type='application/json')
+
+        version = get_version()
+        data = get_cached_response(req, version)
+        RESPONSE_CACHE.inc(result='miss' if data is None else 'hit')
+        if data is None:
+            data = get_response_data(req)
+            cache_response(req, data, version)
+        return Response(data)
     except Exception as e:
         logger.error(f"Error processing bookings: {str(e)}", exc_info=True)
         return Response(
@@ -42,41 +89,204 @@ def fetch(request):
         )
 
 
-def get_filtered_bookings(req: Request) -> List[Booking]:
-    query = Booking.objects.all()
-    if req.start_time:
-        query = query.filter(booking_created__gte=req.start_time)
-    if req.end_time:
-        query = query.filter(booking_created__lte=req.end_time)
-    return list(query)
+@instrument_view
+@api_view(['GET'])
+@authentication_classes([APIKeyAuthentication])
+@throttle_classes([APIKeyRateThrottle])
+@renderer_classes([FastJSONRenderer, BrowsableAPIRenderer])
+def analytics(request):
+    # Totals per groupBy bucket (e.g. groupBy=day,experience), with the date and currency parameters of fetch
+    logger.info(f"Analytics request: {request.query_params}")
 
+    try:
+        with REQUEST_STAGE_SECONDS.time(stage='parse'):
+            req = Request.from_params(request.query_params)
+    except ValueError as e:
+        logger.warning(f"Invalid request parameters: {str(e)}")
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.error(f"Unexpected error processing request: {str(e)}", exc_info=True)
+        return Response(
+            {'error': 'An unexpected error occurred while processing your request'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+    if not req.group_by:
+        return Response({'error': 'groupBy parameter is required'}, status=status.HTTP_400_BAD_REQUEST)
 
-def convert_booking(booking: Booking, req: Request) -> Dict[str, Any]:
     try:
-        price_converted = (booking.price_original_currency * req.coefficient).quantize(Decimal('0.01'))
-    except (InvalidOperation, ValueError) as e:
-        logger.error(f"Error converting booking {booking.code}: {str(e)}")
-        raise ValueError(f"Invalid currency conversion: {str(e)}")
-        
-    return {
-        'code': booking.code,
-        'experience': booking.experience,
-        'rate': booking.rate,
-        'bookingCreated': booking.booking_created,
-        'participants': booking.participants,
-        'originalCurrency': booking.original_currency,
-        'priceOriginalCurrency': booking.price_original_currency,
-        'requestedCurrency': req.requested_currency,
-        'priceRequestedCurrency': price_converted
+        version = get_version()
+        data = get_cached_response(req, version)
+        RESPONSE_CACHE.inc(result='miss' if data is None else 'hit')
+        if data is None:
+            data = get_grouped_totals(req)
+            cache_response(req, data, version)
+        return Response(data)
+    except Exception as e:
+        logger.error(f"Error processing bookings: {str(e)}", exc_info=True)
+        return Response(
+            {'error': 'An error occurred while processing the bookings'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@instrument_view
+@api_view(['GET'])
+@authentication_classes([APIKeyAuthentication])
+@throttle_classes([APIKeyRateThrottle])
+@renderer_classes([FastJSONRenderer, BrowsableAPIRenderer, CSVRenderer, NDJSONRenderer, ParquetRenderer])
+def export(request):
+    # Every booking of the window as CSV, NDJSON or Parquet, streamed in chunks. The format comes from
+    # fileFormat (DRF reserves `format` for choosing a renderer), else from the Accept header, else CSV
+    logger.info(f"Export request: {request.query_params}")
+
+    try:
+        with REQUEST_STAGE_SECONDS.time(stage='parse'):
+            req = Request.from_params(request.query_params)
+            renderer = request.accepted_renderer
+            accepted = renderer.format if isinstance(renderer, ExportRenderer) else None
+            file_format = parse_format(request.query_params.get('fileFormat') or accepted)
+    except ValueError as e:
+        logger.warning(f"Invalid request parameters: {str(e)}")
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.error(f"Unexpected error processing request: {str(e)}", exc_info=True)
+        return Response(
+            {'error': 'An unexpected error occurred while processing your request'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+    if req.totals_only or req.limit or req.group_by:
+        return Response(
+            {'error': 'Export cannot be combined with totalsOnly, groupBy or pagination'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    content_type, extension = FORMATS[file_format]
+    return StreamingHttpResponse(
+        export_bookings(booking_chunks(filter_bookings(req), req), req, file_format),
+        content_type=content_type,
+        headers={'Content-Disposition': f'attachment; filename="bookings.{extension}"'},
+    )
+
+
+def metrics(request):
+    # Prometheus scrape endpoint covering every web and worker process that published recently
+    if not is_metrics_scraper(request):
+        return HttpResponse(status=status.HTTP_403_FORBIDDEN)
+    return HttpResponse(render(collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def get_response_data(req: Request) -> Dict[str, Any]:
+    if req.totals_only:
+        return get_booking_totals(req)
+    if req.limit:
+        return get_bookings_page(req)
+
+    with REQUEST_STAGE_SECONDS.time(stage='query'):
+        rows = list(filter_bookings(req).values_list(*ROW_FIELDS))
+    with REQUEST_STAGE_SECONDS.time(stage='convert'):
+        return sum_bookings(convert_rows(rows, req), req)
+
+
+def get_filtered_bookings(req: Request) -> List[Booking]:
+    return list(filter_bookings(req))
+
+
+def get_booking_totals(req: Request) -> Dict[str, Any]:
+    # Grouped SUMs per original currency; no booking rows are loaded
+    with REQUEST_STAGE_SECONDS.time(stage='query'):
+        totals = merge_totals(row for query in totals_queries(req) for row in query)
+    with REQUEST_STAGE_SECONDS.time(stage='convert'):
+        return convert_totals(totals, req)
+
+
+def totals_queries(req: Request) -> List[QuerySet]:
+    if settings.BOOKINGS_DAILY_ROLLUPS:
+        return rollup_totals_queries(req.start_time, req.end_time, by_day=req.rates_by_booking_date)
+    return [booking_totals(filter_bookings(req).order_by(), by_day=req.rates_by_booking_date)]
+
+
+def get_grouped_totals(req: Request) -> Dict[str, Any]:
+    # One GROUP BY over the dimensions and original currency; only the per-currency conversion runs in Python
+    aliases = [f'group_{name}' for name in req.group_by]
+    expressions = {alias: GROUP_BY_EXPRESSIONS[name] for alias, name in zip(aliases, req.group_by)}
+    # With rateDate=booking each currency's sum is also split by day, to be converted at that day's rates
+    rate_key = ['original_currency', 'rate_day'] if req.rates_by_booking_date else ['original_currency']
+    if req.rates_by_booking_date:
+        expressions['rate_day'] = TruncDate('booking_created')
+    with REQUEST_STAGE_SECONDS.time(stage='query'):
+        rows = list(
+            filter_bookings(req)
+            .values('original_currency', **expressions)
+            .annotate(total_minor=Sum('price_minor'), total_participants=Sum('participants'), count=Count('id'))
+            .order_by(*aliases, *rate_key)
+            .values_list(*aliases, *rate_key, 'total_minor', 'total_participants', 'count')
+        )
+    with REQUEST_STAGE_SECONDS.time(stage='convert'):
+        groups = convert_groups(rows, req)
+    requested = {'requestedCurrencies': list(req.currencies)} if req.multi_currency else {
+        'requestedCurrency': req.requested_currency
     }
+    return {'groupBy': list(req.group_by), **requested, **groups}
+
 
+def sum_bookings(bookings_list: List[Dict[str, Any]], req: Optional[Request] = None) -> Dict[str, Any]:
+    if req is not None:
+        subtotals = {}
+        add_to_subtotals(subtotals, bookings_list, req)
+        return {'bookings': bookings_list, **convert_totals(subtotals, req)}
 
-def sum_bookings(bookings_list: List[Dict[str, Any]]) -> Dict[str, Any]:
-    total_original = sum(b['priceOriginalCurrency'] for b in bookings_list)
-    total_converted = sum(b['priceRequestedCurrency'] for b in bookings_list)
+    total_original = sum((b['priceOriginalCurrency'] for b in bookings_list), Decimal(0))
+    total_converted = sum((b['priceRequestedCurrency'] for b in bookings_list), Decimal(0))
     
     return {
         'bookings': bookings_list,
         'totalPriceOriginalCurrency': total_original.quantize(Decimal('0.01')),
         'totalPriceRequestedCurrency': total_converted.quantize(Decimal('0.01'))
     }
+
+
+def get_bookings_page(req: Request) -> Dict[str, Any]:
+    with REQUEST_STAGE_SECONDS.time(stage='query'):
+        bookings, next_cursor = paginate(filter_bookings(req), req.cursor, req.limit)
+    with REQUEST_STAGE_SECONDS.time(stage='convert'):
+        bookings = convert_bookings(bookings, req)
+    # Totals cover the whole window, so only the first page carries them
+    return {
+        'bookings': bookings,
+        **(get_booking_totals(req) if req.cursor is None else {}),
+        'nextCursor': next_cursor
+    }
+
+
+def stream_bookings(req: Request) -> Iterator[bytes]:
+    # Same document as sum_bookings, written one chunk of rows at a time
+    chunk_size = settings.BOOKINGS_STREAM_CHUNK_SIZE
+    rows = filter_bookings(req).values_list(*ROW_FIELDS).iterator(chunk_size=chunk_size)
+    subtotals = {}
+    first = True
+
+    yield b'{"bookings":['
+    try:
+        while chunk := list(islice(rows, chunk_size)):
+            yield encode_chunk(chunk, req, subtotals, first)
+            first = False
+        yield encode_totals(subtotals, req)
+    except Exception as e:
+        logger.error(f"Error streaming bookings: {str(e)}", exc_info=True)
+        yield STREAM_ERROR
+
+
+def encode_chunk(chunk: List[tuple], req: Request, subtotals: Dict[Any, Decimal], first: bool) -> bytes:
+    # Adds the chunk to the running subtotals, which are converted once at the end
+    with REQUEST_STAGE_SECONDS.time(stage='convert'):
+        bookings = convert_rows(chunk, req)
+        add_to_subtotals(subtotals, bookings, req)
+    with REQUEST_STAGE_SECONDS.time(stage='serialize'):
+        encoded = dumps(bookings)[1:-1]
+    return encoded if first or not encoded else b',' + encoded
+
+
+def encode_totals(subtotals: Dict[Any, Decimal], req: Request) -> bytes:
+    with REQUEST_STAGE_SECONDS.time(stage='convert'):
+        totals = convert_totals(subtotals, req)
+    return b'],' + dumps(totals)[1:]